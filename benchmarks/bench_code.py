@@ -0,0 +1,107 @@
+"""Benchmark of moving node code between graphs, nodes and scripts
+
+Generates a graph with large python nodes, and measures the time of
+reading nodes from the graph, generating scripts, reading back the scripts
+and updating the graph.
+
+Usage:
+    python benchmarks/bench_code.py [line count] [node count]
+"""
+from __future__ import annotations
+import sys
+import pathlib
+import tempfile
+import timeit
+
+import simplejson as json
+
+import dyn2py
+
+INPUT_DIR = pathlib.Path(__file__).parent.parent.joinpath("tests/input_files")
+
+
+def generate_graph(folder: pathlib.Path, line_count: int, node_count: int) -> pathlib.Path:
+    """Generate a graph with large python nodes from single_node.dyn
+
+    Args:
+        folder (pathlib.Path): Folder to save the graph to
+        line_count (int): Number of lines in each node
+        node_count (int): Number of python nodes
+
+    Returns:
+        pathlib.Path: Path to the generated graph
+    """
+    with open(INPUT_DIR.joinpath("single_node.dyn"), encoding="utf-8") as input_json:
+        full_dict = json.load(input_json, use_decimal=True)
+
+    node = next(n for n in full_dict["Nodes"]
+                if n["NodeType"] == "PythonScriptNode")
+    view = next(v for v in full_dict["View"]["NodeViews"]
+                if v["Id"] == node["Id"])
+
+    code = "\r\n".join(
+        f"value_{i} = IN[0] * {i}  # some comment on line {i}" for i in range(line_count))
+
+    full_dict["Nodes"] = []
+    full_dict["View"]["NodeViews"] = []
+    for i in range(node_count):
+        node_id = f"{i:032x}"
+        full_dict["Nodes"].append(dict(node, Id=node_id, Code=code))
+        full_dict["View"]["NodeViews"].append(dict(view, Id=node_id))
+
+    graph_path = folder.joinpath("large_nodes.dyn")
+    with open(graph_path, "w", encoding="utf-8", newline="") as output_json:
+        json.dump(full_dict, output_json, indent=2, use_decimal=True)
+    return graph_path
+
+
+def main(line_count: int, node_count: int) -> None:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = pathlib.Path(temp_dir)
+        graph_path = generate_graph(folder, line_count, node_count)
+        dynamo_file = dyn2py.DynamoFile(graph_path)
+        node_dicts = [n for n in dynamo_file.full_dict["Nodes"]
+                      if n["NodeType"] == "PythonScriptNode"]
+
+        def nodes_from_graph():
+            return [dyn2py.PythonNode(node_dict_from_dyn=n, dynamo_file=dynamo_file)
+                    for n in node_dicts]
+
+        def scripts_from_nodes():
+            return [dyn2py.PythonFile(n.filepath, dynamo_file=dynamo_file, python_node=n)
+                    for n in dynamo_file.python_nodes]
+
+        for python_file in scripts_from_nodes():
+            python_file.write()
+
+        def read_scripts():
+            python_files = [dyn2py.PythonFile(n.filepath, read_from_disk=False)
+                            for n in dynamo_file.python_nodes]
+            for python_file in python_files:
+                python_file.read_file(reread=True)
+            return python_files
+
+        python_files = read_scripts()
+
+        def update_graph():
+            for python_file in python_files:
+                dynamo_file.update_python_node(
+                    dyn2py.PythonNode(python_file=python_file))
+
+        cases = [
+            ("nodes from graph", nodes_from_graph),
+            ("scripts from nodes", scripts_from_nodes),
+            ("read scripts", read_scripts),
+            ("update graph", update_graph),
+        ]
+
+        print(f"{node_count} nodes, {line_count} lines each")
+        for name, function in cases:
+            best = min(timeit.repeat(function, number=5, repeat=5)) / 5
+            print(f"{name:<24}{best * 1000:>10.2f} ms")
+            dyn2py.File.open_files.clear()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 20)
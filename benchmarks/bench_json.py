@@ -0,0 +1,109 @@
+"""Benchmark of the json codecs and number modes of reading and writing graphs
+
+Measures parse time, serialize time and memory of the graph dict with
+every codec and number mode, and checks if the written graph is the same as the input.
+The decimal mode only keeps the values of numbers, its output differs where numbers are
+written in exponent form.
+Runs on a generated geometry heavy graph, or on the given graphs.
+
+Usage:
+    python benchmarks/bench_json.py [graph node count | graph paths]
+"""
+from __future__ import annotations
+import sys
+import pathlib
+import random
+import tempfile
+import timeit
+import tracemalloc
+
+import simplejson as json
+
+from dyn2py import json_codecs
+from dyn2py.options import NUMBER_MODES
+
+INPUT_DIR = pathlib.Path(__file__).parent.parent.joinpath("tests/input_files")
+
+
+def generate_graph(folder: pathlib.Path, node_count: int) -> pathlib.Path:
+    """Generate a graph with many number inputs and node views from single_node.dyn
+
+    Args:
+        folder (pathlib.Path): Folder to save the graph to
+        node_count (int): Number of nodes
+
+    Returns:
+        pathlib.Path: Path to the generated graph
+    """
+    with open(INPUT_DIR.joinpath("single_node.dyn"), encoding="utf-8") as input_json:
+        full_dict = json.load(input_json, use_decimal=True)
+
+    view = full_dict["View"]["NodeViews"][0]
+    random.seed(0)
+
+    for i in range(node_count):
+        node_id = f"{i:032x}"
+        full_dict["Nodes"].append({
+            "ConcreteType": "CoreNodeModels.Input.DoubleInput, CoreNodeModels",
+            "NumberType": "Double",
+            "InputValue": random.uniform(-1e4, 1e4),
+            "Points": [[random.uniform(-1e4, 1e4), random.uniform(0, 1e-4), 0.0]
+                       for _ in range(5)],
+            "Id": node_id,
+            "NodeType": "NumberInputNode"
+        })
+        full_dict["View"]["NodeViews"].append(dict(
+            view, Id=node_id, X=random.uniform(-1e4, 1e4), Y=random.uniform(-1e4, 1e4)))
+
+    graph_path = folder.joinpath("numbers.dyn")
+    with open(graph_path, "w", encoding="utf-8", newline="") as output_json:
+        json.dump(full_dict, output_json, indent=2)
+    return graph_path
+
+
+def bench_graph(graph_path: pathlib.Path) -> None:
+    """Print the results of every codec and number mode on a graph
+
+    Args:
+        graph_path (pathlib.Path): The graph
+    """
+    with open(graph_path, "r", encoding="utf-8", newline="") as input_json:
+        text = input_json.read()
+
+    print(f"{graph_path.name}: {len(text) / 1e6:.2f} MB")
+    print(f"{'codec':<12}{'mode':<10}{'parse ms':>12}{'serialize ms':>14}{'dict MB':>10}  same output")
+    for codec in json_codecs.CODECS.values():
+        if not codec.available():
+            print(f"{codec.name:<12}not installed")
+            continue
+
+        for number_mode in NUMBER_MODES:
+            parse = min(timeit.repeat(
+                lambda: codec.loads(text, number_mode), number=1, repeat=5))
+
+            tracemalloc.start()
+            full_dict = codec.loads(text, number_mode)
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            serialize = min(timeit.repeat(
+                lambda: codec.dumps(full_dict), number=1, repeat=5))
+            same = codec.dumps(full_dict) == text
+
+            print(f"{codec.name:<12}{number_mode:<10}{parse * 1000:>12.1f}{serialize * 1000:>14.1f}"
+                  f"{memory / 1e6:>10.1f}  {same}")
+
+
+def main(args: list[str]) -> None:
+    if args and not args[0].isdigit():
+        for arg in args:
+            bench_graph(pathlib.Path(arg))
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        bench_graph(generate_graph(pathlib.Path(temp_dir),
+                                   int(args[0]) if args else 20000))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
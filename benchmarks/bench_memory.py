@@ -0,0 +1,105 @@
+"""Memory benchmark of File, PythonFile and PythonNode objects
+
+Compares the memory used by one object with the layout before slots,
+where every object had a __dict__ with the derived paths and timestamps
+stored eagerly.
+
+Usage:
+    python benchmarks/bench_memory.py [count]
+"""
+from __future__ import annotations
+import sys
+import pathlib
+import tracemalloc
+from typing import Callable
+
+import dyn2py
+
+INPUT_DIR = pathlib.Path(__file__).parent.parent.joinpath("tests/input_files")
+DYNAMO_FILE = INPUT_DIR.joinpath("python_nodes.dyn")
+
+
+class DictDynamoFile(dyn2py.DynamoFile):
+    """DynamoFile with a __dict__ and eagerly stored derived values, like before slots"""
+
+    def __init__(self, filepath: pathlib.Path | str, read_from_disk: bool = True) -> None:
+        super().__init__(filepath, read_from_disk)
+        self.__dict__.update(
+            basename=self.filepath.stem,
+            dirpath=self.filepath.parent,
+            realpath=self.filepath.resolve(),
+            mtimeiso=dyn2py.File.mtimeiso.fget(self),  # type: ignore
+            extension=self.filepath.suffix
+        )
+
+
+class DictPythonFile(dyn2py.PythonFile):
+    """PythonFile with a __dict__ and eagerly stored derived values, like before slots"""
+
+    def __init__(self, filepath: pathlib.Path | str, read_from_disk: bool = True) -> None:
+        super().__init__(filepath, read_from_disk=read_from_disk)
+        self.__dict__.update(
+            basename=self.filepath.stem,
+            dirpath=self.filepath.parent,
+            realpath=self.filepath.resolve(),
+            mtimeiso=dyn2py.File.mtimeiso.fget(self),  # type: ignore
+            extension=self.filepath.suffix
+        )
+
+
+class DictPythonNode(dyn2py.PythonNode):
+    """PythonNode with a __dict__ and an eagerly stored filename, like before slots"""
+
+    def __init__(self, node_dict_from_dyn: dict, dynamo_file: dyn2py.DynamoFile) -> None:
+        super().__init__(node_dict_from_dyn=node_dict_from_dyn, dynamo_file=dynamo_file)
+        self.__dict__["filename"] = str(self.filepath.name)
+
+
+def measure(factory: Callable[[int], object], count: int) -> float:
+    """Measure the average memory of objects created by the factory
+
+    Args:
+        factory (Callable[[int], object]): Creates one object from its index
+        count (int): Number of objects to create
+
+    Returns:
+        float: Average size of one object in bytes
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    dyn2py.File.open_files.clear()
+    del objects
+    return (after - before) / count
+
+
+def main(count: int) -> None:
+    dynamo_file = dyn2py.DynamoFile(DYNAMO_FILE)
+    node_dict = next(n for n in dynamo_file.full_dict["Nodes"]
+                     if n["NodeType"] == "PythonScriptNode")
+    dyn2py.File.open_files.clear()
+
+    cases = [
+        ("DynamoFile, metadata only",
+         lambda i: dyn2py.DynamoFile(DYNAMO_FILE, read_from_disk=False),
+         lambda i: DictDynamoFile(DYNAMO_FILE, read_from_disk=False)),
+        ("PythonFile, virtual",
+         lambda i: dyn2py.PythonFile(INPUT_DIR.joinpath(f"script_{i}.py")),
+         lambda i: DictPythonFile(INPUT_DIR.joinpath(f"script_{i}.py"))),
+        ("PythonNode",
+         lambda i: dyn2py.PythonNode(node_dict_from_dyn=node_dict, dynamo_file=dynamo_file),
+         lambda i: DictPythonNode(node_dict, dynamo_file)),
+    ]
+
+    print(f"{'object':<28}{'slots':>10}{'dict':>10}{'saved':>10}")
+    for name, slotted_factory, dict_factory in cases:
+        slotted = measure(slotted_factory, count)
+        with_dict = measure(dict_factory, count)
+        print(f"{name:<28}{slotted:>9.0f}B{with_dict:>9.0f}B"
+              f"{(1 - slotted / with_dict):>10.0%}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -10,8 +10,26 @@ import textwrap
 import logging
 import inspect
 import sys
+import json
+from datetime import datetime
+from typing import Callable, Iterator
 from dyn2py.files import *
 from dyn2py.options import *
+from dyn2py.stats import STATS
+from dyn2py.profiling import PROFILER, DEFAULT_PROFILE_OUTPUT
+from dyn2py.events import Event, RunResult
+from dyn2py.backup import BackupStore, DEFAULT_BACKUP_STORE
+from dyn2py.archives import Archive, is_archive, member_path, split_member_path
+from dyn2py.manifest import Manifest
+from dyn2py.syncstate import SyncState, SYNC_STATE_FILENAME
+from dyn2py.locking import FolderLock, DEFAULT_LOCK_TIMEOUT
+from dyn2py.sharding import select_shard, merge_shard_folder
+from dyn2py.cleanup import find_orphans, find_stale_scripts, remove_orphan
+from dyn2py.history import GitHistory
+from dyn2py.bundle import Bundle
+from dyn2py.search import SearchIndex
+from dyn2py.fscache import FS_CACHE, DEFAULT_IO_THREADS
+from dyn2py import events
 
 
 METADATA = metadata("dyn2py")
@@ -22,7 +40,9 @@ __all__ = [
     "File",
     "DynamoFile",
     "PythonFile",
-    "PythonNode"
+    "PythonNode",
+    "RunResult",
+    "Event"
 ]
 
 
@@ -39,8 +59,10 @@ def __command_line() -> None:
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog=textwrap.dedent("""\
             The script by default overwrites older files with newer files.
-            Do not move the source Dynamo graphs, or update won't work with them later.
+            If the source Dynamo graphs were moved, update finds them with --graph-root,
+            and --relink fixes the paths in the python scripts.
             Multiple sources are supported, separate them by spaces.
+            Graphs in zip and tar archives are read without unpacking, they are never updated.
             HEADLESS loglevel only prints modified filenames.
             """)
     )
@@ -69,11 +91,63 @@ def __command_line() -> None:
                         help="create a backup for updated files",
                         action="store_true")
 
+    parser.add_argument("--backup-store",
+                        metavar="path/to/folder",
+                        help=f"keep backups in this store, every content only once, implies --backup. " +
+                        f"Relative to the folder of the file, like {DEFAULT_BACKUP_STORE}",
+                        type=pathlib.Path)
+
+    parser.add_argument("--backup-compress",
+                        help="gzip compress new content in the backup store",
+                        action="store_true")
+
+    parser.add_argument("--backup-keep",
+                        metavar="N",
+                        help="keep only the N newest backups of every file in the backup store",
+                        type=int,
+                        default=0)
+
+    parser.add_argument("--backup-days",
+                        metavar="DAYS",
+                        help="keep only the backups of the last DAYS days in the backup store",
+                        type=float,
+                        default=0)
+
+    parser.add_argument("--restore",
+                        help=f"restore the sources from their newest backup in --backup-store, defaults to {DEFAULT_BACKUP_STORE}",
+                        action="store_true")
+
     parser.add_argument("-f", "--filter",
                         choices=FILTERS,
                         help="only check python or Dynamo graphs, skip the others, useful for folders"
                         )
 
+    parser.add_argument("--stats",
+                        choices=STATS_FORMATS,
+                        help="report timings and counters of the run at the end, to stderr or to --stats-output")
+
+    parser.add_argument("--stats-output",
+                        metavar="path/to/file",
+                        help="save the --stats report to this file",
+                        type=pathlib.Path)
+
+    parser.add_argument("--output",
+                        choices=OUTPUT_FORMATS,
+                        help="print written, skipped, backed up, failed and removed files to stdout as they happen, as json lines")
+
+    parser.add_argument("--profile",
+                        help="run under cProfile, save a .pstats file and a .collapsed file for flame graphs",
+                        action="store_true")
+
+    parser.add_argument("--profile-output",
+                        metavar="path/to/file.pstats",
+                        help=f"save the profile to this file, implies --profile. Defaults to {DEFAULT_PROFILE_OUTPUT}",
+                        type=pathlib.Path)
+
+    parser.add_argument("--profile-per-file",
+                        help="with --profile, also save the time spent on every source file to a .files.tsv file",
+                        action="store_true")
+
     dynamo_options = parser.add_argument_group(
         title="dynamo options, only for processing Dynamo graphs")
 
@@ -86,26 +160,200 @@ def __command_line() -> None:
                                 help="extract python scripts to this folder, read python scripts from here with --update",
                                 type=pathlib.Path)
 
+    python_options = parser.add_argument_group(
+        title="python options, only for processing python scripts")
+
+    python_options.add_argument("-g", "--graph-root",
+                                metavar="path/to/folder",
+                                help="search moved source graphs in this folder by their uuid, can be used multiple times",
+                                action="append",
+                                type=pathlib.Path)
+
+    python_options.add_argument("--relink",
+                                help="only rewrite the path of the source graph in python scripts, if it was moved",
+                                action="store_true")
+
+    parser.add_argument("--high-latency",
+                        help=f"mode for network shares: cache file metadata for the run, and read files ahead on {DEFAULT_IO_THREADS} threads",
+                        action="store_const",
+                        const=DEFAULT_IO_THREADS,
+                        dest="io_threads",
+                        default=0)
+
+    parser.add_argument("--io-threads",
+                        metavar="THREADS",
+                        help="like --high-latency, but read files on THREADS threads",
+                        dest="io_threads",
+                        type=int)
+
+    parser.add_argument("-s", "--stream",
+                        help="process graphs one by one and write the results immediately",
+                        action="store_const",
+                        const=1,
+                        default=0)
+
+    parser.add_argument("--stream-window",
+                        metavar="WINDOW",
+                        help="like --stream, but keep at most WINDOW graphs in memory",
+                        dest="stream",
+                        type=int)
+
+    dynamo_options.add_argument("-d", "--deterministic",
+                                help="leave out volatile header fields, only write python scripts if their content changed",
+                                action="store_true")
+
+    dynamo_options.add_argument("--dedup",
+                                help="extract every unique code once, list the nodes using it in dyn2py_manifest.json. Updating a shared script updates every node using it",
+                                action="store_true")
+
+    dynamo_options.add_argument("--numbers",
+                                help="raw keeps the original text of numbers in graphs, decimal parses them to Decimal objects, keeping their values, but not always their text. Defaults to raw",
+                                choices=NUMBER_MODES,
+                                default=DEFAULT_NUMBER_MODE)
+
+    dynamo_options.add_argument("--json-codec",
+                                help="json library to read and write graphs with, every one writes the same output. Defaults to auto, the fastest one for reading and for writing",
+                                choices=JSON_CODECS,
+                                default=DEFAULT_JSON_CODEC)
+
+    parser.add_argument("--node-id",
+                        metavar="ID",
+                        help="only extract and update the python node with this id, can be used multiple times",
+                        action="append")
+
+    parser.add_argument("--node-name",
+                        metavar="PATTERN",
+                        help="only extract and update the python nodes with a name matching this glob pattern, can be used multiple times",
+                        action="append")
+
+    parser.add_argument("--engine",
+                        help="only extract and update the python nodes of this engine, can be used multiple times",
+                        choices=PYTHON_ENGINES,
+                        action="append")
+
+    parser.add_argument("--layout",
+                        help="folder layout of the python scripts: flat, a subfolder for every graph, subfolders by the beginning of the graph uuid (hash), or the folders of the graphs relative to the working directory (mirror, with -f). Source folders are read recursively in other layouts than flat. Defaults to flat",
+                        choices=LAYOUTS,
+                        default=DEFAULT_LAYOUT)
+
+    parser.add_argument("--bundle",
+                        metavar="path/to/bundle",
+                        help="write the python nodes of the source graphs to a single .jsonl file, or to one module per engine in this folder, with a source map, instead of extracting",
+                        type=pathlib.Path)
+
+    parser.add_argument("--bundle-import",
+                        help="the sources are bundles written with --bundle, update the graphs from their changed nodes",
+                        action="store_true")
+
+    parser.add_argument("--index",
+                        metavar="path/to/index.sqlite",
+                        help="update this full-text search index of the python nodes with the graphs extracted and written by the run, they are not read again for it",
+                        type=pathlib.Path)
+
+    parser.add_argument("--index-only",
+                        help="only update the --index with the source graphs, instead of extracting. Only changed graphs are read",
+                        action="store_true")
+
+    parser.add_argument("--search",
+                        metavar="QUERY",
+                        help="the sources are search indexes, print the python nodes matching this SQLite FTS5 query as json lines",
+                        default="")
+
+    parser.add_argument("--search-limit",
+                        metavar="RESULTS",
+                        help="maximum number of search results of every index. Defaults to 100",
+                        type=int,
+                        default=100)
+
+    parser.add_argument("--lock-timeout",
+                        metavar="SECONDS",
+                        help="seconds to wait for a folder locked by an other dyn2py process. Defaults to 10",
+                        type=float,
+                        default=DEFAULT_LOCK_TIMEOUT)
+
+    parser.add_argument("--sync-state",
+                        help=f"record the synchronized code of scripts in {SYNC_STATE_FILENAME} in their folder, only the side that changed since is copied. Existing files are always updated",
+                        action="store_true")
+
+    parser.add_argument("--shard",
+                        metavar="INDEX/COUNT",
+                        help="process only this share of the source graphs, like 2/4 for the second of four machines. Python files are in the shard of their graph",
+                        default="")
+
+    parser.add_argument("--shard-by",
+                        help="split the graphs to shards by the hash of their path relative to the working directory, or balance their size. Defaults to hash",
+                        choices=SHARD_MODES,
+                        default="hash")
+
+    parser.add_argument("--merge",
+                        help="the sources are python folders and --stats json reports of shards, merge the scripts, manifests and sync states to the python folder, and the stats to the stats of this run",
+                        action="store_true")
+
+    parser.add_argument("--gc",
+                        help="the sources are python folders, remove the scripts of deleted nodes, and the old scripts of renamed nodes. Scripts with edits not in their node are kept without --gc-archive or --force. Nodes are read from the --index search index, or every graph is read once",
+                        action="store_true")
+
+    parser.add_argument("--auto-gc",
+                        help="remove the old scripts of the deleted and renamed nodes of the extracted graphs",
+                        action="store_true")
+
+    parser.add_argument("--gc-missing-graphs",
+                        help="also remove the scripts of graphs that are not found with --gc. Scripts of moved graphs, of graphs on unmounted shares and with wrong paths are removed too, use --graph-root to find moved graphs",
+                        action="store_true")
+
+    parser.add_argument("--gc-archive",
+                        metavar="path/to/archive",
+                        help="move the scripts removed by --gc and --auto-gc to this folder, instead of deleting them",
+                        type=pathlib.Path)
+
+    parser.add_argument("--history",
+                        metavar="REVISION",
+                        help="print every version of the python nodes of the sources in this git revision or range as json lines, instead of extracting")
+
+    parser.add_argument("--history-output",
+                        metavar="path/to/file.jsonl",
+                        help="save the node versions of --history to this file instead of stdout",
+                        type=pathlib.Path)
+
+    parser.add_argument("--config",
+                        metavar="path/to/dyn2py.toml",
+                        help="run every root of this workspace config, a dyn2py.toml or the [tool.dyn2py] table of a pyproject.toml, instead of the sources. Other options override the config",
+                        type=pathlib.Path)
+
     parser.add_argument("source",
                         type=pathlib.Path,
-                        help="path to a Dynamo graph, a python script or a folder containing them",
-                        nargs="+"
+                        help="path to a Dynamo graph, a python script, a zip or tar archive of graphs or a folder containing them",
+                        nargs="*"
                         )
 
     options = parser.parse_args(namespace=Options())
+    if bool(options.source) == bool(options.config):
+        parser.error("give the sources or a --config")
+    if options.shard:
+        try:
+            Options.parse_shard(options.shard)
+        except ValueError:
+            parser.error(f"invalid --shard: {options.shard}, use INDEX/COUNT, like 2/4")
+    if options.index_only and not options.index:
+        parser.error("--index-only needs an --index")
 
     run(options)
 
 
-def run(options: Options) -> None:
+def run(options: Options, on_event: Callable[[Event], None] | None = None) -> RunResult:
     """Run an extraction as from the command line
 
     Args:
         options (Options): Options as from the command line.
+        on_event (Callable[[Event], None] | None, optional): Called on every written, skipped, backed up, failed or removed file, as they happen. Defaults to None.
+
+    Returns:
+        RunResult: Written, skipped, backed up, failed and removed files
 
     Raises:
         TypeError: options is not an Options object
-        FileNotFoundError: If the source file does not exist
+        FileNotFoundError: If the source file or the config does not exist
+        ValueError: Invalid config, or sources given with a config
     """
 
     if not isinstance(options, Options):
@@ -113,6 +361,22 @@ def run(options: Options) -> None:
 
     from_command_line = bool(inspect.stack()[1].function == "__command_line")
 
+    # Every root of a workspace runs with the same caches:
+    if options.config:
+        if options.source:
+            raise ValueError("Sources of a workspace are in the config!")
+        try:
+            roots = Options.from_config(options.config, **options.get_changed())
+        except (FileNotFoundError, ValueError) as e:
+            if from_command_line:
+                logging.error(f"Cannot read config: {options.config} {e}")
+                sys.exit(1)
+            raise
+        # Workspace options are the same in every root:
+        options = roots[0]
+    else:
+        roots = [options]
+
     # Set up logging:
     if options.loglevel == "HEADLESS":
         loglevel = "CRITICAL"
@@ -123,11 +387,180 @@ def run(options: Options) -> None:
                         level=loglevel)
     logging.debug(f"Run options: {vars(options)}")
 
-    # Set up sources:
+    STATS.reset(enabled=bool(options.stats))
+    BackupStore.stores.clear()
+    Manifest.manifests.clear()
+    SyncState.states.clear()
+    FolderLock.timeout = options.lock_timeout
+
+    # Set up event listeners:
+    result = RunResult()
+    listeners = [result.handle_event]
+    if options.stats:
+        listeners.append(STATS.handle_event)
+    if options.output == "jsonl":
+        listeners.append(__print_event_jsonl)
+    if on_event:
+        listeners.append(on_event)
+    for listener in listeners:
+        events.add_listener(listener)
+
+    # Profile output also turns on profiling:
+    profile = options.profile or bool(options.profile_output)
+    if profile:
+        PROFILER.start(per_file=options.profile_per_file)
+
+    if options.io_threads:
+        FS_CACHE.start(options.io_threads)
+
+    try:
+        with STATS.timer("total"):
+            processed = False
+            for root in roots:
+                if len(roots) > 1:
+                    logging.info(f"Workspace root: {', '.join(map(str, root.source))}")
+                processed = __run_root(root, from_command_line) or processed
+                if len(roots) > 1:
+                    # Only the caches are shared by the roots, not the files:
+                    File.close_open_files()
+
+            __write_manifests(options)
+            if not options.dry_run:
+                __save_sync_states(options)
+
+    finally:
+        File.release_read_locks()
+        File.lock_reads = False
+        FS_CACHE.stop()
+        Archive.close_all()
+        for listener in listeners:
+            events.remove_listener(listener)
+
+        if profile:
+            PROFILER.stop()
+            profile_output = options.profile_output or \
+                pathlib.Path(DEFAULT_PROFILE_OUTPUT)
+            for saved in PROFILER.save(profile_output):
+                logging.info(f"Profile saved to {saved}")
+
+    result.finish()
+
+    if options.stats:
+        result.stats = STATS.to_dict()
+        report = STATS.report(options.stats, options.stats_output)
+        if not options.stats_output:
+            print(report, file=sys.stderr)
+
+    if options.output == "jsonl":
+        print(json.dumps({
+            "event": "finished",
+            "written": len(result.written),
+            "skipped": len(result.skipped),
+            "backed_up": len(result.backed_up),
+            "failed": len(result.failed),
+            "removed": len(result.removed),
+            "elapsed": result.elapsed
+        }), flush=True)
+
+    if not processed and from_command_line:
+        logging.error("No files to process! See previous warnings!")
+        sys.exit(1)
+
+    return result
+
+
+def __run_root(options: Options, from_command_line: bool) -> bool:
+    """Process the sources of the options, or of a root of a workspace
+
+    Args:
+        options (Options): Run options
+        from_command_line (bool): Called from the command line, exit instead of raising errors
+
+    Returns:
+        bool: True if there were files to process
+    """
+    DynamoFile.number_mode = options.numbers
+    DynamoFile.json_codec = options.json_codec
+    # Folders are locked from reading the files until writing them, only in the modes updating files:
+    File.lock_reads = not (options.dry_run or options.merge or options.gc or options.history
+                           or options.search or options.index_only or options.bundle or options.restore)
+
+    with STATS.timer("scan"):
+        if options.history or options.bundle_import or options.search or options.merge:
+            # Graphs deleted from the working tree are in the history too, bundles can be folders:
+            source_files = options.source
+        else:
+            source_files = __get_source_files(options, from_command_line)
+            if options.shard:
+                source_files = select_shard(source_files, options)
+        if options.relink:
+            source_files = [f for f in source_files
+                            if f.suffix == PYTHON_EXTENSION]
+
+    if options.io_threads and not (options.history or options.restore or options.bundle_import
+                                   or options.search or options.merge):
+        __prefetch_source_files(source_files, options)
+
+    if options.merge:
+        processed = __run_merge(source_files, options)
+    elif options.gc:
+        processed = __run_gc(source_files, options)
+    elif options.history:
+        processed = __run_history(source_files, options)
+    elif options.search:
+        processed = __run_search(source_files, options)
+    elif options.index_only:
+        processed = __run_index(source_files, options)
+    elif options.bundle:
+        processed = __run_bundle_export(source_files, options)
+    elif options.bundle_import:
+        processed = __run_bundle_import(source_files, options)
+    elif options.restore:
+        processed = __run_restore(source_files, options)
+    else:
+        processed = __run_extract(source_files, options)
+
+    if options.backup_keep or options.backup_days:
+        for backup_store in BackupStore.stores.values():
+            try:
+                backup_store.prune(options.backup_keep, options.backup_days)
+            except FolderLock.Error as e:
+                logging.error(f"{e}, not pruning: {backup_store.root}")
+
+    return processed
+
+
+def __print_event_jsonl(event: Event) -> None:
+    """Print an event as a json line to stdout
+
+    Args:
+        event (Event): The event
+    """
+    print(json.dumps(event.to_dict()), flush=True)
+
+
+def __get_source_files(options: Options, from_command_line: bool) -> list[pathlib.Path]:
+    """Collect the files from the sources
+
+    Args:
+        options (Options): Run options
+        from_command_line (bool): Called from the command line, exit instead of raising errors
+
+    Raises:
+        FileNotFoundError: If the source file does not exist
+
+    Returns:
+        list[pathlib.Path]: Paths of the files, Dynamo graphs first
+    """
     source_files = []
     for source in options.source:
 
-        if not source.exists():
+        # A single graph in an archive:
+        archive_member = split_member_path(source)
+        if archive_member and archive_member[0].is_file():
+            source_files.append(source)
+
+        elif not source.exists():
             if from_command_line:
                 # log only if it was called from command line:
                 logging.error(f"File does not exist: {source}")
@@ -139,29 +572,130 @@ def run(options: Options) -> None:
         elif source.is_dir():
             logging.debug(f"Source is a folder")
 
-            for f in source.iterdir():
-                source_files.append(f)
+            for f in __list_source_folder(source, recursive=options.layout != "flat"):
+                if is_archive(f):
+                    source_files.extend(__get_archive_members(f))
+                else:
+                    source_files.append(f)
+
+        # Graphs from an archive:
+        elif is_archive(source):
+            source_files.extend(__get_archive_members(source))
 
         # It's a single file:
         else:
             source_files.append(source)
 
-    # Create file objects
+    # Dynamo files come first, sort sources:
+    source_files.sort(key=lambda f: f.suffix)
+    return source_files
+
+
+def __list_source_folder(folder: pathlib.Path, recursive: bool) -> list[pathlib.Path]:
+    """List the files of a source folder
+
+    Args:
+        folder (pathlib.Path): The folder
+        recursive (bool): Also list the subfolders, except hidden ones
+
+    Returns:
+        list[pathlib.Path]: Paths of the files, and of the subfolders if not recursive
+    """
+    if not recursive:
+        return FS_CACHE.list_folder(folder)
+
     files = []
-    for f in source_files:
+    for f in FS_CACHE.list_folder(folder):
+        if not f.is_dir():
+            files.append(f)
+        elif not f.name.startswith("."):
+            files.extend(__list_source_folder(f, recursive))
+    return files
+
+
+def __get_archive_members(archive_path: pathlib.Path) -> list[pathlib.Path]:
+    """Get the graphs in an archive, log if it cannot be opened
+
+    Args:
+        archive_path (pathlib.Path): Path to the archive
+
+    Returns:
+        list[pathlib.Path]: Member paths of the graphs, in the order of the archive
+    """
+    try:
+        archive = Archive.open(archive_path)
+    except Archive.Error as e:
+        logging.warning(f"{e} {archive_path}")
+        events.emit("skipped", archive_path, "invalid_archive")
+        return []
+    return [member_path(archive_path, m) for m in archive.get_member_names(DYNAMO_EXTENSIONS)]
+
+
+def __prefetch_source_files(source_files: list[pathlib.Path], options: Options) -> None:
+    """Read ahead the sources that will be read, in the order of processing
+
+    Args:
+        source_files (list[pathlib.Path]): Paths to the sources, Dynamo graphs first
+        options (Options): Run options
+    """
+    read_dynamo = options.filter != "py"
+    # In update mode the python scripts are found from the graphs:
+    read_python = options.filter != "dyn" and not (options.update and not options.filter)
+    FS_CACHE.prefetch([
+        f for f in source_files if not split_member_path(f) and
+        ((read_dynamo and f.suffix in DYNAMO_EXTENSIONS) or (read_python and f.suffix == PYTHON_EXTENSION))])
+
+
+def __run_extract(source_files: list[pathlib.Path], options: Options) -> bool:
+    """Extract or update the sources, in batch or in streaming mode. The graphs extracted and written
+        are added to the search index of options.index from memory, deleted graphs are kept in it
+
+    Args:
+        source_files (list[pathlib.Path]): Paths to the sources, Dynamo graphs first
+        options (Options): Run options
+
+    Returns:
+        bool: True if there were files to process
+    """
+    search_index = None
+    if options.index and options.dry_run:
+        logging.info(f"Should update search index, but it's a dry-run: {options.index}")
+        events.emit("skipped", options.index, "dry_run")
+    elif options.index:
         try:
-            files.append(File(f))
-        except DynamoFile.Error as e:
-            # It's a dynamo1 file
-            logging.warning(f"This is a Dynamo 1 file! {e.file.filepath}")
-            continue
-        except DynamoFile.PythonNodeNotFound as e:
-            # No python nodes in this file
-            logging.warning(f"This file has no Python nodes! {e.file.filepath} ")
-            continue
+            search_index = SearchIndex(options.index)
+        except SearchIndex.Error as e:
+            logging.error(f"{options.index} {e}")
+            events.emit("failed", options.index, "invalid_index")
 
-    # Dynamo files come first, sort sources:
-    files.sort(key=lambda f: f.extension)
+    DynamoFile.search_index = search_index
+    try:
+        if options.stream:
+            processed = __run_streaming(source_files, options)
+        else:
+            processed = __run_batch(source_files, options)
+    finally:
+        DynamoFile.search_index = None
+        if search_index:
+            search_index.close()
+            __report_index(search_index, options)
+
+    return processed
+
+
+def __run_batch(source_files: list[pathlib.Path], options: Options) -> bool:
+    """Open every file first, and write them at the end
+
+    Args:
+        source_files (list[pathlib.Path]): Paths to the sources, Dynamo graphs first
+        options (Options): Run options
+
+    Returns:
+        bool: True if there were files to process
+    """
+
+    # Create file objects
+    files = [f for f in map(__open_file, source_files) if f]
 
     # Filters:
     if options.filter == "py":
@@ -171,37 +705,498 @@ def run(options: Options) -> None:
 
     # Update mode:
     elif options.update:
-        dynamo_files = [DynamoFile(f.filepath)
-                        for f in files if f.is_dynamo_file()]
         python_files = set()
 
-        for dynamo_file in dynamo_files:
-            p = dynamo_file.get_related_python_files(options)
-            if p:
-                python_files.update(p)
+        for dynamo_file in files:
+            if dynamo_file.is_dynamo_file():
+                python_files.update(
+                    dynamo_file.get_related_python_files(options))
 
         files = list(python_files)
 
-    if not files and from_command_line:
-        logging.error("No files to process! See previous warnings!")
-        sys.exit(1)
+    if not files:
+        return False
 
     # Cycle through files:
     for f in files:
+        __process_file(f, options)
+
+    # Write files at the end:
+    __write_open_files(options)
+    return True
+
+
+def __run_streaming(source_files: list[pathlib.Path], options: Options) -> bool:
+    """Process graphs one by one, write and close them after every options.stream graph
+
+    Args:
+        source_files (list[pathlib.Path]): Paths to the sources, Dynamo graphs first
+        options (Options): Run options
+
+    Returns:
+        bool: True if there were files to process
+    """
+
+    processed = False
+    in_flight = 0
+
+    for files in __iter_stream_units(source_files, options):
+        for f in files:
+            __process_file(f, options)
+            processed = True
+
+        in_flight += 1
+        if in_flight >= options.stream:
+            __write_open_files(options)
+            File.close_open_files()
+            in_flight = 0
+
+    __write_open_files(options)
+    File.close_open_files()
+    return processed
+
+
+def __run_restore(source_files: list[pathlib.Path], options: Options) -> bool:
+    """Restore files from their newest backup in the backup store
+
+    Args:
+        source_files (list[pathlib.Path]): Paths to the files
+        options (Options): Run options
+
+    Returns:
+        bool: True if there were files to process
+    """
+    store_path = options.backup_store or pathlib.Path(DEFAULT_BACKUP_STORE)
+    # Graphs in archives are never written:
+    source_files = [f for f in source_files
+                    if (f.suffix in DYNAMO_EXTENSIONS or f.suffix == PYTHON_EXTENSION)
+                    and not split_member_path(f)]
+
+    for source_file in source_files:
+        backup_store = BackupStore.for_file(
+            source_file, store_path, options.backup_compress)
+        if options.dry_run:
+            if backup_store.entries(source_file):
+                logging.info(f"Should restore file, but it's a dry-run: {source_file}")
+                events.emit("skipped", source_file, "dry_run")
+            continue
+
+        try:
+            with FolderLock(source_file.parent):
+                entry = backup_store.restore(source_file)
+        except FolderLock.Error as e:
+            logging.error(f"{e}, not restoring: {source_file}")
+            events.emit("failed", source_file, "locked")
+            continue
+        if entry:
+            logging.info(
+                f"Restored {source_file} from the backup of {datetime.fromtimestamp(entry.time).isoformat()}")
+            events.emit("written", source_file)
+        else:
+            logging.warning(f"No backup of this file: {source_file}")
+            events.emit("skipped", source_file, "no_backup")
+
+    return bool(source_files)
+
+
+def __run_history(source_files: list[pathlib.Path], options: Options) -> bool:
+    """Print every version of the python nodes of the sources in the git history, as json lines
+
+    Args:
+        source_files (list[pathlib.Path]): Graphs or folders in the same git repository
+        options (Options): Run options
+
+    Returns:
+        bool: True if there were node versions
+    """
+    git_history = GitHistory(source_files, options.history)
+    if options.history_output:
+        output_file = open(options.history_output, "w", encoding="utf-8", newline="\n")
+    else:
+        output_file = sys.stdout
+
+    versions = 0
+    try:
+        for node_version in git_history.iter_node_versions():
+            output_file.write(json.dumps(node_version.to_dict()) + "\n")
+            versions += 1
+    finally:
+        if options.history_output:
+            output_file.close()
+
+    logging.info(f"Found {versions} node versions in {git_history.repo}")
+    return bool(versions)
 
+
+def __run_index(source_files: list[pathlib.Path], options: Options) -> bool:
+    """Update the search index with the source graphs
+
+    Args:
+        source_files (list[pathlib.Path]): Paths to the sources, only graphs are read
+        options (Options): Run options
+
+    Returns:
+        bool: True if there were graphs
+    """
+    graph_paths = [f for f in source_files if f.suffix in DYNAMO_EXTENSIONS]
+    if options.dry_run:
+        logging.info(f"Should update search index, but it's a dry-run: {options.index}")
+        events.emit("skipped", options.index, "dry_run")
+        return bool(graph_paths)
+
+    try:
+        search_index = SearchIndex(options.index)
+    except SearchIndex.Error as e:
+        logging.error(f"{options.index} {e}")
+        events.emit("failed", options.index, "invalid_index")
+        return False
+
+    updated = 0
+    with search_index:
+        for graph_path in graph_paths:
+            try:
+                with PROFILER.file(graph_path):
+                    updated += search_index.update_graph(graph_path)
+            except DynamoFile.Error as e:
+                logging.warning(f"This is a Dynamo 1 file! {e.file.filepath}")
+                events.emit("skipped", graph_path, "dynamo1")
+        # Forget the deleted graphs of the source folders:
+        folders = [s for s in options.source if s.is_dir() or is_archive(s)]
+        removed = search_index.remove_missing(folders, graph_paths)
+
+    logging.info(f"Search index updated, read {updated} graphs, removed {removed}: {options.index}")
+    __report_index(search_index, options)
+    return bool(graph_paths)
+
+
+def __report_index(search_index: SearchIndex, options: Options) -> None:
+    """Report the search index as written, if it changed
+
+    Args:
+        search_index (SearchIndex): The updated index
+        options (Options): Run options
+    """
+    if search_index.modified:
+        events.emit("written", options.index)
+        if options.loglevel == "HEADLESS" and not options.output:
+            print(options.index, flush=True)
+
+
+def __run_search(source_files: list[pathlib.Path], options: Options) -> bool:
+    """Print the python nodes matching the query from the search indexes, as json lines
+
+    Args:
+        source_files (list[pathlib.Path]): Paths to the search indexes
+        options (Options): Run options
+
+    Returns:
+        bool: True if there were results
+    """
+    results = 0
+    for index_path in source_files:
+        if not index_path.is_file():
+            logging.error(f"Search index does not exist: {index_path}")
+            events.emit("failed", index_path, "invalid_index")
+            continue
+        try:
+            with SearchIndex(index_path) as search_index:
+                search_results = search_index.search(options.search, options.search_limit)
+        except SearchIndex.Error as e:
+            logging.error(f"{index_path} {e}")
+            events.emit("failed", index_path, "invalid_index")
+            continue
+        except ValueError as e:
+            logging.error(f"{index_path} {e}")
+            events.emit("failed", index_path, "invalid_query")
+            continue
+
+        for search_result in search_results:
+            if options.selects_node(search_result.py_id, search_result.py_engine, search_result.py_name):
+                print(json.dumps(search_result.to_dict()), flush=True)
+                results += 1
+
+    logging.info(f"Found {results} python nodes")
+    return bool(results)
+
+
+def __run_bundle_export(source_files: list[pathlib.Path], options: Options) -> bool:
+    """Write the python nodes of the source graphs to a bundle
+
+    Args:
+        source_files (list[pathlib.Path]): Paths to the sources, only graphs are read
+        options (Options): Run options
+
+    Returns:
+        bool: True if there were python nodes
+    """
+    bundle = Bundle(options.bundle)
+    for source_file in source_files:
+        if source_file.suffix not in DYNAMO_EXTENSIONS:
+            continue
+        f = __open_file(source_file)
+        if not f:
+            continue
+        for python_node in f.python_nodes:
+            if options.selects_node(python_node.id, python_node.engine, python_node.name):
+                bundle.add(f, python_node)
+            else:
+                STATS.count("nodes_not_selected")
+        # Only the nodes are kept:
+        File.open_files.discard(f)
+
+    if options.dry_run:
+        logging.info(f"Should write bundle, but it's a dry-run: {bundle.path}")
+        events.emit("skipped", bundle.path, "dry_run")
+    else:
+        for written in bundle.save():
+            logging.info(f"Written bundle: {written}")
+            events.emit("written", written)
+            if options.loglevel == "HEADLESS" and not options.output:
+                print(written, flush=True)
+
+    logging.info(f"Bundled {len(bundle.entries)} python nodes")
+    return bool(bundle.entries)
+
+
+def __run_bundle_import(source_files: list[pathlib.Path], options: Options) -> bool:
+    """Update the graphs from the changed nodes of bundles
+
+    Args:
+        source_files (list[pathlib.Path]): Paths to the bundles
+        options (Options): Run options
+
+    Returns:
+        bool: True if there were bundles
+    """
+    processed = False
+    for bundle_path in source_files:
+        try:
+            bundle = Bundle.load(bundle_path)
+        except Bundle.Error as e:
+            logging.error(f"{bundle_path} {e}")
+            events.emit("failed", bundle_path, "invalid_bundle")
+            continue
+        bundle.apply(options)
+        processed = True
+
+    __write_open_files(options)
+    return processed
+
+
+def __run_gc(source_files: list[pathlib.Path], options: Options) -> bool:
+    """Remove the orphan scripts of the sources
+
+    Args:
+        source_files (list[pathlib.Path]): Paths to the sources
+        options (Options): Run options
+
+    Returns:
+        bool: True if there were scripts to check
+    """
+    python_files = [f for f in source_files if f.suffix == PYTHON_EXTENSION]
+    for orphan in find_orphans(python_files, options):
+        remove_orphan(orphan, options)
+
+    logging.info(f"Checked {len(python_files)} scripts")
+    return bool(python_files)
+
+
+def __run_merge(source_files: list[pathlib.Path], options: Options) -> bool:
+    """Merge the results of shards: python folders to options.python_folder, stats reports to the stats of this run
+
+    Args:
+        source_files (list[pathlib.Path]): Python folders and json stats reports of the shards
+        options (Options): Run options
+
+    Returns:
+        bool: True if there was anything to merge
+    """
+    processed = False
+    for source in source_files:
+        if source.is_dir():
+            if not options.python_folder:
+                logging.error(f"Give a python folder to merge to: {source}")
+                events.emit("failed", source, "no_python_folder")
+                continue
+            merge_shard_folder(source, options)
+
+        elif source.suffix == ".json" and source.is_file():
+            if not options.stats:
+                logging.warning(f"Stats report is not merged without --stats: {source}")
+                events.emit("skipped", source, "no_stats")
+                continue
+            try:
+                with open(source, "r", encoding="utf-8") as stats_file:
+                    STATS.merge(json.load(stats_file))
+            except (ValueError, AttributeError) as e:
+                logging.error(f"Not a json stats report: {source} {e}")
+                events.emit("failed", source, "invalid_stats")
+                continue
+
+        else:
+            logging.error(f"Not a python folder or a stats report: {source}")
+            events.emit("failed", source, "invalid_merge_source")
+            continue
+
+        processed = True
+
+    return processed
+
+
+def __iter_stream_units(source_files: list[pathlib.Path], options: Options) -> Iterator[list[File]]:
+    """Open the files of one graph at once, only when the previous graph is processed.
+        Python files are grouped by the header only, and opened with their group
+
+    Args:
+        source_files (list[pathlib.Path]): Paths to the sources, Dynamo graphs first
+        options (Options): Run options
+
+    Yields:
+        list[File]: Files belonging to the same graph
+    """
+    update_from_dynamo = options.update and not options.filter
+    python_path_groups: dict[str, list[pathlib.Path]] = {}
+
+    for source_file in source_files:
+        if source_file.suffix in DYNAMO_EXTENSIONS:
+            if options.filter == "py":
+                continue
+
+            f = __open_file(source_file)
+            if not f:
+                continue
+
+            if update_from_dynamo:
+                # Scripts are selected by their header, only this graph is open:
+                yield f.get_related_python_files(options)
+            else:
+                yield [f]
+
+        elif source_file.suffix == PYTHON_EXTENSION:
+            if options.filter == "dyn" or update_from_dynamo:
+                continue
+
+            # Scripts of the same graph should update it together:
+            python_path_groups.setdefault(
+                scan_header(source_file).get("dyn_uuid", ""), []).append(source_file)
+
+    for python_paths in python_path_groups.values():
+        files = [__open_file(p) for p in python_paths]
+        yield [f for f in files if f]
+
+
+def __open_file(source_file: pathlib.Path) -> File | None:
+    """Create a file object, log if it cannot be processed
+
+    Args:
+        source_file (pathlib.Path): Path to the file
+
+    Returns:
+        File | None: The file object, None if it's not a valid file
+    """
+    try:
+        with PROFILER.file(source_file):
+            return File(source_file)
+    except DynamoFile.Error as e:
+        # It's a dynamo1 file
+        logging.warning(f"This is a Dynamo 1 file! {e.file.filepath}")
+        events.emit("skipped", source_file, "dynamo1")
+    except DynamoFile.PythonNodeNotFound as e:
+        # No python nodes in this file
+        logging.warning(f"This file has no Python nodes! {e.file.filepath} ")
+        events.emit("skipped", source_file, "no_python_nodes")
+        # Indexed too, so it's not read again:
+        if DynamoFile.search_index:
+            DynamoFile.search_index.add_graph(e.file)
+    return None
+
+
+def __process_file(f: File, options: Options) -> None:
+    """Extract python from a Dynamo file, or update the Dynamo file from a python file
+
+    Args:
+        f (File): The file to process
+        options (Options): Run options
+    """
+    with PROFILER.file(f.filepath):
         if f.is_dynamo_file():
             logging.debug("Source is a Dynamo file")
             f.extract_python(options)
+            if options.auto_gc and not options.dedup:
+                for orphan in find_stale_scripts(f, options):
+                    remove_orphan(orphan, options)
 
         elif f.is_python_file():
             logging.debug("Source is a Python file")
             try:
-                f.update_dynamo(options)
+                if options.relink:
+                    if not f.relink(options):
+                        events.emit("skipped", f.filepath, "unchanged")
+                else:
+                    f.update_dynamo(options)
             except FileNotFoundError:
                 logging.error(f"{f.filepath} Source Dynamo file not found! ")
+                events.emit("failed", f.filepath, "source_not_found")
+            except PythonFile.Error as e:
+                logging.error(f"{f.filepath} {e}")
+                events.emit("failed", f.filepath, "invalid_header")
 
-    # Write files at the end:
+
+def __write_manifests(options: Options) -> None:
+    """Save the modified manifests of deduplicated extraction
+
+    Args:
+        options (Options): Run options
+    """
+    for manifest in Manifest.manifests.values():
+        if not manifest.modified:
+            continue
+        if options.dry_run:
+            logging.info(
+                f"Should write manifest, but it's a dry-run: {manifest.filepath}")
+            events.emit("skipped", manifest.filepath, "dry_run")
+            continue
+        try:
+            if not manifest.save():
+                logging.debug(f"Manifest not changed: {manifest.filepath}")
+                continue
+        except FolderLock.Error as e:
+            logging.error(f"{e}, not writing: {manifest.filepath}")
+            events.emit("failed", manifest.filepath, "locked")
+            continue
+        logging.info(f"Written manifest: {manifest.filepath}")
+        events.emit("written", manifest.filepath)
+        if options.loglevel == "HEADLESS" and not options.output:
+            print(manifest.filepath, flush=True)
+
+
+def __save_sync_states(options: Options) -> None:
+    """Save the modified sync states of the script folders. New files are only created
+        with options.sync_state, or when merging shards
+
+    Args:
+        options (Options): Run options
+    """
+    for sync_state in SyncState.states.values():
+        if not sync_state.modified:
+            continue
+        if not (options.sync_state or options.merge) and not sync_state.filepath.exists():
+            continue
+        if sync_state.save():
+            logging.debug(f"Saved sync state: {sync_state.filepath}")
+            # For the pre-commit hook:
+            if options.loglevel == "HEADLESS" and not options.output:
+                print(sync_state.filepath, flush=True)
+
+
+def __write_open_files(options: Options) -> None:
+    """Write open files, log if it was not possible
+
+    Args:
+        options (Options): Run options
+    """
     try:
         File.write_open_files(options)
     except File.Error as e:
         logging.error(f"Cannot save file! {e.file.filepath}")
+        events.emit("failed", e.file.filepath, "write_error")
@@ -0,0 +1,213 @@
+from __future__ import annotations
+import logging
+import pathlib
+import tarfile
+import time
+import zipfile
+
+from dyn2py.stats import STATS
+
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+"""Extensions of archives, graphs are read from them without unpacking"""
+ARCHIVE_MEMBER_SEPARATOR = "!"
+"""Marks the end of the archive path in member paths, like: deliveries.zip!/graphs/graph.dyn"""
+
+
+def is_archive(filepath: pathlib.Path | str) -> bool:
+    """Check if a file is an archive, by its extension
+
+    Args:
+        filepath (pathlib.Path | str): Path to the file
+
+    Returns:
+        bool: True if it's an archive
+    """
+    return str(filepath).lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def member_path(archive_path: pathlib.Path, member: str) -> pathlib.Path:
+    """Get the path of a member of an archive
+
+    Args:
+        archive_path (pathlib.Path): Path to the archive
+        member (str): Name of the member in the archive
+
+    Returns:
+        pathlib.Path: The path, like: deliveries.zip!/graphs/graph.dyn
+    """
+    return pathlib.Path(archive_path.parent,
+                        archive_path.name + ARCHIVE_MEMBER_SEPARATOR, *member.split("/"))
+
+
+def split_member_path(filepath: pathlib.Path | str) -> tuple[pathlib.Path, str] | None:
+    """Split a member path to the path of the archive and the name of the member
+
+    Args:
+        filepath (pathlib.Path | str): Path to check
+
+    Returns:
+        tuple[pathlib.Path, str] | None: Path to the archive and name of the member. None, if it's not a member path
+    """
+    if ARCHIVE_MEMBER_SEPARATOR not in str(filepath):
+        return None
+
+    parts = pathlib.PurePath(filepath).parts
+    for i, part in enumerate(parts[:-1]):
+        if part.endswith(ARCHIVE_MEMBER_SEPARATOR) and is_archive(part[:-len(ARCHIVE_MEMBER_SEPARATOR)]):
+            archive_path = pathlib.Path(*parts[:i], part[:-len(ARCHIVE_MEMBER_SEPARATOR)])
+            return archive_path, "/".join(parts[i+1:])
+    return None
+
+
+class Archive():
+    """A zip or tar archive, open for reading members. Zip members are read directly,
+        compressed tar members should be read in the order of the archive, to not decompress it again"""
+
+    open_archives: dict[pathlib.Path, Archive] = {}
+    """Archives open in this process, by their resolved path. Close them with close_all()"""
+
+    def __init__(self, filepath: pathlib.Path) -> None:
+        """Open an archive and read the list of its members
+
+        Args:
+            filepath (pathlib.Path): Path to the archive
+
+        Raises:
+            FileNotFoundError: The archive does not exist
+            Archive.Error: Not a valid archive
+        """
+        self.filepath: pathlib.Path = filepath
+        """Path to the archive"""
+        self.members: dict[str, zipfile.ZipInfo | tarfile.TarInfo] = {}
+        """Members of the archive by their normalized name, folders are left out"""
+        self._zip_file: zipfile.ZipFile | None = None
+        self._tar_file: tarfile.TarFile | None = None
+
+        logging.debug(f"Opening archive: {filepath}")
+        try:
+            if zipfile.is_zipfile(filepath):
+                self._zip_file = zipfile.ZipFile(filepath)
+                for zip_info in self._zip_file.infolist():
+                    if not zip_info.is_dir():
+                        self.members[self._normalize(zip_info.filename)] = zip_info
+            else:
+                self._tar_file = tarfile.open(filepath)
+                for tar_info in self._tar_file.getmembers():
+                    if tar_info.isfile():
+                        self.members[self._normalize(tar_info.name)] = tar_info
+        except (zipfile.BadZipFile, tarfile.TarError) as e:
+            raise self.Error(f"Cannot open archive! {e}", filepath)
+
+    @classmethod
+    def open(cls, filepath: pathlib.Path) -> Archive:
+        """Get an open archive, open it if it's the first time
+
+        Args:
+            filepath (pathlib.Path): Path to the archive
+
+        Returns:
+            Archive: The archive
+        """
+        key = filepath.resolve()
+        if key not in cls.open_archives:
+            cls.open_archives[key] = cls(filepath)
+        return cls.open_archives[key]
+
+    @classmethod
+    def close_all(cls) -> None:
+        """Close every open archive"""
+        for archive in cls.open_archives.values():
+            archive.close()
+        cls.open_archives.clear()
+
+    def close(self) -> None:
+        """Close the archive file"""
+        if self._zip_file:
+            self._zip_file.close()
+        if self._tar_file:
+            self._tar_file.close()
+
+    @staticmethod
+    def _normalize(name: str) -> str:
+        """Normalize a member name, like pathlib does with member paths
+
+        Args:
+            name (str): Name of the member in the archive
+
+        Returns:
+            str: The name with forward slashes, without ./ and leading slashes
+        """
+        return "/".join(p for p in name.replace("\\", "/").split("/") if p and p != ".")
+
+    def get_member_names(self, extensions: list[str]) -> list[str]:
+        """Get the members with the given extensions, in the order of the archive
+
+        Args:
+            extensions (list[str]): Extensions of the files to list
+
+        Returns:
+            list[str]: Normalized names of the members
+        """
+        return [m for m in self.members if pathlib.PurePosixPath(m).suffix in extensions]
+
+    def get_mtime(self, member: str) -> float:
+        """Get the modification time of a member
+
+        Args:
+            member (str): Name of the member
+
+        Raises:
+            FileNotFoundError: No member with this name
+
+        Returns:
+            float: Modification time as a timestamp
+        """
+        info = self.members.get(self._normalize(member))
+        if info is None:
+            raise FileNotFoundError(f"No such member in {self.filepath}: {member}")
+        elif isinstance(info, zipfile.ZipInfo):
+            # Zip files store local time:
+            return time.mktime(info.date_time + (0, 0, -1))
+        else:
+            return float(info.mtime)
+
+    def read(self, member: str) -> bytes:
+        """Read the content of a member, without extracting it to the disk
+
+        Args:
+            member (str): Name of the member
+
+        Raises:
+            FileNotFoundError: No member with this name
+
+        Returns:
+            bytes: The content
+        """
+        info = self.members.get(self._normalize(member))
+        if info is None:
+            raise FileNotFoundError(f"No such member in {self.filepath}: {member}")
+
+        data = b""
+        if isinstance(info, zipfile.ZipInfo) and self._zip_file:
+            with self._zip_file.open(info) as member_file:
+                data = member_file.read()
+        elif isinstance(info, tarfile.TarInfo) and self._tar_file:
+            member_file = self._tar_file.extractfile(info)
+            if member_file:
+                with member_file:
+                    data = member_file.read()
+
+        STATS.count("bytes_read", len(data))
+        return data
+
+    class Error(Exception):
+        def __init__(self, message: str, filepath: pathlib.Path) -> None:
+            """There is some problem with this archive
+
+            Args:
+                message (str): The message to display
+                filepath (pathlib.Path): Path to the archive
+            """
+            super().__init__(message)
+            self.filepath = filepath
@@ -0,0 +1,314 @@
+from __future__ import annotations
+import gzip
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import shutil
+import time
+from datetime import datetime
+
+from dyn2py.locking import FolderLock
+from dyn2py.stats import STATS
+
+
+DEFAULT_BACKUP_STORE = ".dyn2py-backups"
+"""Default backup store, relative to the folder of the backed up file"""
+BACKUP_INDEX_FILENAME = "index.jsonl"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class BackupEntry():
+    """A backup of a file in the store"""
+
+    __slots__ = ("path", "time", "mtime", "sha256", "size", "compressed")
+
+    def __init__(self,
+                 path: str,
+                 time: float,
+                 mtime: float,
+                 sha256: str,
+                 size: int,
+                 compressed: bool = False
+                 ) -> None:
+        """Generate a backup entry
+
+        Args:
+            path (str): Resolved path of the original file
+            time (float): When was the backup created, as a timestamp
+            mtime (float): Modification time of the original file
+            sha256 (str): Hash of the content, the name of the object in the store
+            size (int): Size of the content
+            compressed (bool, optional): The object is gzip compressed. Defaults to False.
+        """
+        self.path: str = path
+        """Resolved path of the original file"""
+        self.time: float = time
+        """When was the backup created, as a timestamp"""
+        self.mtime: float = mtime
+        """Modification time of the original file"""
+        self.sha256: str = sha256
+        """Hash of the content, the name of the object in the store"""
+        self.size: int = size
+        """Size of the content"""
+        self.compressed: bool = compressed
+        """The object is gzip compressed"""
+
+    def to_dict(self) -> dict:
+        """Get the entry as a dict, for the index
+
+        Returns:
+            dict: The entry
+        """
+        return {
+            "path": self.path,
+            "time": self.time,
+            "mtime": self.mtime,
+            "sha256": self.sha256,
+            "size": self.size,
+            "compressed": self.compressed
+        }
+
+    @classmethod
+    def from_dict(cls, entry_dict: dict) -> BackupEntry:
+        """Generate an entry from a line of the index
+
+        Args:
+            entry_dict (dict): The entry
+
+        Returns:
+            BackupEntry: The entry
+        """
+        return cls(entry_dict["path"], entry_dict["time"], entry_dict["mtime"],
+                   entry_dict["sha256"], entry_dict["size"], entry_dict.get("compressed", False))
+
+
+class BackupStore():
+    """Content addressed backup store. Every unique content is stored once, by its hash"""
+
+    stores: dict[pathlib.Path, BackupStore] = {}
+    """Stores used in this process, by their root"""
+
+    def __init__(self, root: pathlib.Path, compress: bool = False) -> None:
+        """Generate a backup store. The folder is created on the first backup
+
+        Args:
+            root (pathlib.Path): The folder of the store
+            compress (bool, optional): Gzip compress new objects. Defaults to False.
+        """
+        self.root: pathlib.Path = root
+        """The folder of the store"""
+        self.compress: bool = compress
+        """Gzip compress new objects"""
+
+    @classmethod
+    def for_file(cls, filepath: pathlib.Path, store_path: pathlib.Path, compress: bool = False) -> BackupStore:
+        """Get the store of a file
+
+        Args:
+            filepath (pathlib.Path): The file to back up or restore
+            store_path (pathlib.Path): Path of the store. Relative paths are relative to the folder of the file
+            compress (bool, optional): Gzip compress new objects. Defaults to False.
+
+        Returns:
+            BackupStore: The store
+        """
+        root = filepath.parent.joinpath(store_path).resolve()
+        if root not in cls.stores:
+            cls.stores[root] = cls(root, compress)
+        cls.stores[root].compress = compress
+        return cls.stores[root]
+
+    @property
+    def index_path(self) -> pathlib.Path:
+        """Path to the index of the store"""
+        return self.root.joinpath(BACKUP_INDEX_FILENAME)
+
+    def object_path(self, sha256: str, compressed: bool) -> pathlib.Path:
+        """Path to an object of the store
+
+        Args:
+            sha256 (str): Hash of the content
+            compressed (bool): The object is compressed
+
+        Returns:
+            pathlib.Path: The path
+        """
+        return self.root.joinpath("objects", sha256[:2], sha256 + (".gz" if compressed else ""))
+
+    def backup(self, filepath: pathlib.Path, mtime: float) -> pathlib.Path:
+        """Move a file into the store, before it gets overwritten.
+            New content is renamed into the store if it's on the same filesystem, copied otherwise.
+            Known content is not stored again.
+
+        Args:
+            filepath (pathlib.Path): The file, it will not exist after the backup
+            mtime (float): Modification time of the file
+
+        Raises:
+            FolderLock.Error: The store is locked by an other process
+
+        Returns:
+            pathlib.Path: Path to the object in the store
+        """
+        # Other processes should not prune objects before they are in the index:
+        with FolderLock(self.root), STATS.timer("backup"):
+            sha256, size = file_hash(filepath)
+
+            object_path = next((p for p in [self.object_path(sha256, False), self.object_path(sha256, True)]
+                                if p.exists()), None)
+            if object_path:
+                logging.debug(f"Content already in the backup store: {object_path}")
+                STATS.count("backups_deduplicated")
+                filepath.unlink()
+            else:
+                object_path = self.object_path(sha256, self.compress)
+                object_path.parent.mkdir(parents=True, exist_ok=True)
+                temp_path = object_path.with_name(f".{object_path.name}.tmp")
+                if self.compress:
+                    with open(filepath, "rb") as input_file, gzip.open(temp_path, "wb") as output_file:
+                        shutil.copyfileobj(input_file, output_file, HASH_CHUNK_SIZE)
+                    filepath.unlink()
+                else:
+                    try:
+                        # No copying on the same filesystem:
+                        os.replace(filepath, temp_path)
+                    except OSError:
+                        shutil.copyfile(filepath, temp_path)
+                        filepath.unlink()
+                os.replace(temp_path, object_path)
+                STATS.count("backup_bytes", size)
+
+            entry = BackupEntry(str(filepath.resolve()), time.time(), mtime, sha256, size,
+                                object_path.suffix == ".gz")
+            with open(self.index_path, "a", encoding="utf-8", newline="\n") as index_file:
+                index_file.write(json.dumps(entry.to_dict()) + "\n")
+
+        return object_path
+
+    def entries(self, filepath: pathlib.Path | None = None) -> list[BackupEntry]:
+        """Get the backups in the store, the oldest first
+
+        Args:
+            filepath (pathlib.Path | None, optional): Only the backups of this file. Defaults to None.
+
+        Returns:
+            list[BackupEntry]: The backups
+        """
+        entries = []
+        path = str(filepath.resolve()) if filepath else None
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as index_file:
+                for line in index_file:
+                    if not line.strip():
+                        continue
+                    entry = BackupEntry.from_dict(json.loads(line))
+                    if path is None or entry.path == path:
+                        entries.append(entry)
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def restore(self, filepath: pathlib.Path, before: datetime | None = None) -> BackupEntry | None:
+        """Restore a file from its newest backup. The current file is backed up first
+
+        Args:
+            filepath (pathlib.Path): The file to restore
+            before (datetime | None, optional): Restore the newest backup created before this time. Defaults to None.
+
+        Returns:
+            BackupEntry | None: The restored backup. None if there is no backup of the file
+        """
+        entries = self.entries(filepath)
+        if before:
+            entries = [e for e in entries if e.time < before.timestamp()]
+        if not entries:
+            return None
+        entry = entries[-1]
+
+        object_path = self.object_path(entry.sha256, entry.compressed)
+        temp_path = filepath.with_name(f".{filepath.name}.restore.tmp")
+        with STATS.timer("restore"):
+            if entry.compressed:
+                with gzip.open(object_path, "rb") as input_file, open(temp_path, "wb") as output_file:
+                    shutil.copyfileobj(input_file, output_file, HASH_CHUNK_SIZE)
+            else:
+                shutil.copyfile(object_path, temp_path)
+            os.utime(temp_path, (entry.mtime, entry.mtime))
+
+            if filepath.exists():
+                self.backup(filepath, filepath.stat().st_mtime)
+            os.replace(temp_path, filepath)
+
+        return entry
+
+    def prune(self, keep: int = 0, days: float = 0) -> int:
+        """Remove old backups, and the objects not used anymore
+
+        Args:
+            keep (int, optional): Keep this many newest backups of every file. 0 to not limit. Defaults to 0.
+            days (float, optional): Keep backups of the last days. 0 to not limit. Defaults to 0.
+
+        Raises:
+            FolderLock.Error: The store is locked by an other process
+
+        Returns:
+            int: Number of removed backups
+        """
+        # Backups of other processes are added to the index while it's locked:
+        with FolderLock(self.root):
+            entries = self.entries()
+            if not entries or not (keep or days):
+                return 0
+
+            kept = []
+            by_path: dict[str, list[BackupEntry]] = {}
+            for entry in entries:
+                by_path.setdefault(entry.path, []).append(entry)
+            min_time = time.time() - days * 86400
+            for path_entries in by_path.values():
+                if keep:
+                    path_entries = path_entries[-keep:]
+                if days:
+                    path_entries = [e for e in path_entries if e.time >= min_time]
+                kept.extend(path_entries)
+
+            removed = len(entries) - len(kept)
+            if not removed:
+                return 0
+
+            kept.sort(key=lambda e: e.time)
+            temp_path = self.index_path.with_name(f".{self.index_path.name}.tmp")
+            with open(temp_path, "w", encoding="utf-8", newline="\n") as index_file:
+                for entry in kept:
+                    index_file.write(json.dumps(entry.to_dict()) + "\n")
+            os.replace(temp_path, self.index_path)
+
+            used_objects = {self.object_path(e.sha256, e.compressed) for e in kept}
+            for entry in entries:
+                object_path = self.object_path(entry.sha256, entry.compressed)
+                if object_path not in used_objects and object_path.exists():
+                    logging.debug(f"Removing backup object: {object_path}")
+                    object_path.unlink()
+
+        logging.info(f"Removed {removed} old backups from {self.root}")
+        return removed
+
+
+def file_hash(filepath: pathlib.Path) -> tuple[str, int]:
+    """Calculate the sha256 hash of a file
+
+    Args:
+        filepath (pathlib.Path): The file
+
+    Returns:
+        tuple[str, int]: The hash as hex string, and the size of the file
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    with open(filepath, "rb") as input_file:
+        while chunk := input_file.read(HASH_CHUNK_SIZE):
+            sha256.update(chunk)
+            size += len(chunk)
+    return sha256.hexdigest(), size
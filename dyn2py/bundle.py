@@ -0,0 +1,335 @@
+from __future__ import annotations
+import json
+import logging
+import os
+import pathlib
+
+from dyn2py.files import DynamoFile, PythonNode, DYNAMO_NEWLINE, code_checksum, relative_posix_path, \
+    resolve_path, translate_newlines
+from dyn2py.options import Options
+from dyn2py.stats import STATS
+from dyn2py import events
+
+
+JSONL_SUFFIX = ".jsonl"
+"""Bundles with this extension are json lines files, other paths are folders of modules"""
+SOURCE_MAP_FILENAME = "dyn2py_sourcemap.json"
+"""Name of the source map in module bundles"""
+BUNDLE_VERSION = 1
+NODE_START_MARKER = "# dyn2py-node:"
+NODE_END_MARKER = "# dyn2py-end"
+
+
+class BundleEntry():
+    """A python node in a bundle, and its place in it"""
+
+    __slots__ = ("dyn_path", "dyn_uuid", "dyn_name", "py_id", "py_name", "py_engine", "checksum", "code_text",
+                 "module", "start", "end")
+
+    def __init__(self, dyn_path: str, dyn_uuid: str, dyn_name: str, py_id: str, py_name: str, py_engine: str,
+                 checksum: str, code_text: str, module: str = "", start: int = 0, end: int = 0) -> None:
+        """Generate a bundle entry
+
+        Args:
+            dyn_path (str): Path to the graph, relative to the folder of the bundle
+            dyn_uuid (str): Uuid of the graph
+            dyn_name (str): Name of the graph
+            py_id (str): Id of the node
+            py_name (str): Name of the node
+            py_engine (str): Engine of the node
+            checksum (str): Checksum of the code, when it was exported
+            code_text (str): The code, with CRLF line endings, like in Dynamo graphs
+            module (str, optional): Name of the file of the bundle the node is in. Defaults to "".
+            start (int, optional): First line of the code in the file, from 1. Defaults to 0.
+            end (int, optional): Last line of the code in the file. Defaults to 0.
+        """
+        self.dyn_path: str = dyn_path
+        """Path to the graph, relative to the folder of the bundle"""
+        self.dyn_uuid: str = dyn_uuid
+        """Uuid of the graph"""
+        self.dyn_name: str = dyn_name
+        """Name of the graph"""
+        self.py_id: str = py_id
+        """Id of the node"""
+        self.py_name: str = py_name
+        """Name of the node"""
+        self.py_engine: str = py_engine
+        """Engine of the node"""
+        self.checksum: str = checksum
+        """Checksum of the code, when it was exported"""
+        self.code_text: str = code_text
+        """The code, with CRLF line endings, like in Dynamo graphs"""
+        self.module: str = module
+        """Name of the file of the bundle the node is in"""
+        self.start: int = start
+        """First line of the code in the file, from 1"""
+        self.end: int = end
+        """Last line of the code in the file"""
+
+    def to_dict(self, with_code: bool = True) -> dict:
+        """Get the entry as a json serializable dict
+
+        Args:
+            with_code (bool, optional): Add the code, with \\n line endings. Defaults to True.
+
+        Returns:
+            dict: The entry
+        """
+        entry_dict = {
+            "dyn_path": self.dyn_path,
+            "dyn_uuid": self.dyn_uuid,
+            "dyn_name": self.dyn_name,
+            "py_id": self.py_id,
+            "py_name": self.py_name,
+            "py_engine": self.py_engine,
+            "checksum": self.checksum
+        }
+        if with_code:
+            entry_dict["code"] = translate_newlines(self.code_text, DYNAMO_NEWLINE, "\n")
+        else:
+            entry_dict.update(module=self.module, start=self.start, end=self.end)
+        return entry_dict
+
+    @classmethod
+    def from_dict(cls, entry_dict: dict) -> BundleEntry:
+        """Generate an entry from a json lines record, or from the source map
+
+        Args:
+            entry_dict (dict): The entry
+
+        Returns:
+            BundleEntry: The entry
+        """
+        return cls(entry_dict["dyn_path"], entry_dict["dyn_uuid"], entry_dict["dyn_name"],
+                   entry_dict["py_id"], entry_dict["py_name"], entry_dict["py_engine"], entry_dict["checksum"],
+                   translate_newlines(entry_dict.get("code", ""), "\n", DYNAMO_NEWLINE),
+                   entry_dict.get("module", ""), entry_dict.get("start", 0), entry_dict.get("end", 0))
+
+
+class Bundle():
+    """Python nodes of many graphs in a single json lines file, or in one module per engine,
+        for tools processing the whole corpus at once.
+        In json lines bundles every line is a node. Module bundles have a source map of the line ranges of the nodes"""
+
+    def __init__(self, path: pathlib.Path) -> None:
+        """Generate an empty bundle. Call load() to read it
+
+        Args:
+            path (pathlib.Path): A .jsonl file, or a folder for modules
+        """
+        self.path: pathlib.Path = path
+        """A .jsonl file, or a folder for modules"""
+        self.entries: list[BundleEntry] = []
+        """The nodes in the bundle"""
+
+    @property
+    def is_jsonl(self) -> bool:
+        """If it's a json lines bundle"""
+        return self.path.suffix == JSONL_SUFFIX
+
+    @property
+    def folder(self) -> pathlib.Path:
+        """Paths of graphs are relative to this folder"""
+        return self.path.parent if self.is_jsonl else self.path
+
+    def add(self, dynamo_file: DynamoFile, python_node: PythonNode) -> None:
+        """Add a node to the bundle
+
+        Args:
+            dynamo_file (DynamoFile): The graph of the node
+            python_node (PythonNode): The node
+        """
+        self.entries.append(BundleEntry(
+            relative_posix_path(dynamo_file.filepath, self.folder), dynamo_file.uuid, dynamo_file.name,
+            python_node.id, python_node.name, python_node.engine, python_node.checksum, python_node.code_text))
+
+    def save(self) -> list[pathlib.Path]:
+        """Write the bundle. Nodes are sorted by the path of their graph and by their id
+
+        Returns:
+            list[pathlib.Path]: The written files
+        """
+        self.entries.sort(key=lambda e: (e.dyn_path, e.py_id))
+        if self.is_jsonl:
+            return self._save_jsonl()
+        else:
+            return self._save_modules()
+
+    def _save_jsonl(self) -> list[pathlib.Path]:
+        """Write a node on every line"""
+        with open(self.path, "w", encoding="utf-8", newline="\n") as bundle_file:
+            for line, entry in enumerate(self.entries, start=1):
+                entry.module, entry.start, entry.end = self.path.name, line, line
+                bundle_file.write(json.dumps(entry.to_dict()) + "\n")
+        return [self.path]
+
+    def _save_modules(self) -> list[pathlib.Path]:
+        """Write a module for every engine, and the source map"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        modules: dict[str, list[str]] = {}
+        for entry in self.entries:
+            entry.module = f"{entry.py_engine}.py"
+            lines = modules.setdefault(entry.module, [
+                f"# Python nodes of Dynamo graphs, engine: {entry.py_engine}. Generated with dyn2py.",
+                "# Edit the code between the markers only, import the changes with dyn2py --bundle-import"
+            ])
+            lines.append(f"{NODE_START_MARKER} {entry.py_id} {entry.dyn_path}")
+            entry.start = len(lines) + 1
+            lines.extend(entry.code_text.split(DYNAMO_NEWLINE))
+            entry.end = len(lines)
+            lines.append(NODE_END_MARKER)
+
+        written = []
+        for module, lines in sorted(modules.items()):
+            module_path = self.path.joinpath(module)
+            with open(module_path, "w", encoding="utf-8", newline="\n") as module_file:
+                module_file.write("\n".join(lines) + "\n")
+            written.append(module_path)
+
+        source_map_path = self.path.joinpath(SOURCE_MAP_FILENAME)
+        with open(source_map_path, "w", encoding="utf-8", newline="\n") as source_map_file:
+            json.dump({
+                "version": BUNDLE_VERSION,
+                "nodes": [e.to_dict(with_code=False) for e in self.entries]
+            }, source_map_file, indent=1)
+        written.append(source_map_path)
+        return written
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> Bundle:
+        """Read a bundle, with the current code of the nodes
+
+        Args:
+            path (pathlib.Path): A .jsonl file, or a folder of modules
+
+        Raises:
+            Bundle.Error: Invalid bundle
+
+        Returns:
+            Bundle: The bundle
+        """
+        bundle = cls(path)
+        try:
+            if bundle.is_jsonl:
+                bundle._load_jsonl()
+            else:
+                bundle._load_modules()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            raise cls.Error(f"Cannot read bundle! {e}", path)
+        return bundle
+
+    def _load_jsonl(self) -> None:
+        """Read a json lines bundle"""
+        with open(self.path, "r", encoding="utf-8") as bundle_file:
+            for line, record in enumerate(bundle_file, start=1):
+                if record.strip():
+                    entry = BundleEntry.from_dict(json.loads(record))
+                    entry.module, entry.start, entry.end = self.path.name, line, line
+                    self.entries.append(entry)
+
+    def _load_modules(self) -> None:
+        """Read the source map and the code between the markers of the modules"""
+        with open(self.path.joinpath(SOURCE_MAP_FILENAME), "r", encoding="utf-8") as source_map_file:
+            source_map = json.load(source_map_file)
+        if source_map.get("version") != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported bundle version: {self.path}")
+        entries = {(e.module, e.py_id, e.dyn_path): e
+                   for e in (BundleEntry.from_dict(n) for n in source_map["nodes"])}
+
+        for module in sorted({e.module for e in entries.values()}):
+            with open(self.path.joinpath(module), "r", encoding="utf-8") as module_file:
+                lines = module_file.read().split("\n")
+
+            entry, code_lines = None, []
+            for line_number, line in enumerate(lines, start=1):
+                if entry is None:
+                    if line.startswith(NODE_START_MARKER):
+                        py_id, dyn_path = line[len(NODE_START_MARKER):].strip().split(" ", 1)
+                        entry, code_lines = entries[(module, py_id, dyn_path)], []
+                        # Edits may move the nodes:
+                        entry.start = line_number + 1
+                elif line == NODE_END_MARKER:
+                    entry.code_text = DYNAMO_NEWLINE.join(code_lines)
+                    entry.end = line_number - 1
+                    self.entries.append(entry)
+                    entry = None
+                else:
+                    code_lines.append(line)
+
+            if entry is not None:
+                raise ValueError(f"Missing end marker in {module} after line {entry.start}")
+
+    def lookup(self, module: str, line: int) -> tuple[str, str, str, int] | None:
+        """Map a line of the bundle back to a node, like the location of a diagnostic
+
+        Args:
+            module (str): Name of the file in the bundle
+            line (int): Line in the file, from 1
+
+        Returns:
+            tuple[str, str, str, int] | None: Path to the graph, its uuid, the id of the node and the line in its code.
+                The line is always 1 in json lines bundles. None, if the line is not the code of a node
+        """
+        for entry in self.entries:
+            if entry.module == module and entry.start <= line <= entry.end:
+                return entry.dyn_path, entry.dyn_uuid, entry.py_id, line - entry.start + 1
+        return None
+
+    def apply(self, options: Options) -> None:
+        """Update the graphs with the code of the bundle. A node is only updated if its code in the bundle changed,
+            and it was not changed in the graph since the export, unless options.force is set.
+            The graphs are modified in memory, write them with DynamoFile.write_open_files()
+
+        Args:
+            options (Options): Run options
+        """
+        for entry in self.entries:
+            if not options.selects_node(entry.py_id, entry.py_engine, entry.py_name):
+                STATS.count("nodes_not_selected")
+                continue
+
+            dynpath = resolve_path(os.path.abspath(self.folder), entry.dyn_path)
+            try:
+                dynamo_file = DynamoFile.get_open_file_by_uuid(entry.dyn_uuid, dynpath) or DynamoFile(dynpath)
+                old_python_node = dynamo_file.get_python_node_by_id(entry.py_id)
+            except (FileNotFoundError, DynamoFile.Error, DynamoFile.PythonNodeNotFound):
+                logging.error(f"Node of the bundle not found: {entry.dyn_path} {entry.py_id}")
+                events.emit("failed", dynpath, "source_not_found")
+                continue
+
+            if dynamo_file.uuid != entry.dyn_uuid:
+                logging.error(f"Graph has a different uuid: {dynamo_file.filepath}")
+                events.emit("failed", dynamo_file.filepath, "source_not_found")
+                continue
+
+            checksum = code_checksum(entry.code_text)
+            if checksum == old_python_node.checksum or checksum == entry.checksum:
+                events.emit("skipped", dynamo_file.filepath, "unchanged")
+                continue
+
+            if old_python_node.checksum != entry.checksum and not options.force:
+                logging.warning(
+                    f"Node changed in the graph since the export, skipping: {dynamo_file.filepath} {entry.py_id}")
+                events.emit("failed", dynamo_file.filepath, "conflict")
+                continue
+
+            if dynamo_file.read_only:
+                logging.warning(f"Dynamo graph is read-only, skipping: {dynamo_file.filepath}")
+                events.emit("skipped", dynamo_file.filepath, "read_only")
+                continue
+
+            logging.info(f"Dynamo graph will be updated: {dynamo_file.filepath} {entry.py_id}")
+            dynamo_file.update_python_node(PythonNode(
+                node_dict_from_dyn={"Id": entry.py_id, "Engine": entry.py_engine, "Code": entry.code_text},
+                dynamo_file=dynamo_file))
+
+    class Error(Exception):
+        def __init__(self, message: str, filepath: pathlib.Path) -> None:
+            """There is some problem with this bundle
+
+            Args:
+                message (str): The message to display
+                filepath (pathlib.Path): Path to the bundle
+            """
+            super().__init__(message)
+            self.filepath = filepath
@@ -0,0 +1,302 @@
+from __future__ import annotations
+import glob
+import logging
+import pathlib
+import shutil
+
+from dyn2py.files import File, DynamoFile, PythonFile, PYTHON_EXTENSION, DYNAMO_NEWLINE, \
+    mirror_path, code_checksum, python_node_filename, translate_newlines
+from dyn2py.options import Options
+from dyn2py.archives import split_member_path
+from dyn2py.graph_index import scan_uuid
+from dyn2py.locking import FolderLock
+from dyn2py.manifest import Manifest, MANIFEST_FILENAME, SHARED_SCRIPT_PREFIX
+from dyn2py.search import SearchIndex
+from dyn2py.syncstate import SyncState
+from dyn2py import events
+
+
+ORPHAN_REASONS = ["graph_missing", "node_missing", "renamed", "not_in_manifest"]
+"""graph_missing: the graph is not found, node_missing: the graph has no node with this id,
+renamed: the node is extracted to an other file, not_in_manifest: shared script not used by any node"""
+
+
+class Orphan():
+    """A script without a python node"""
+
+    __slots__ = ("filepath", "reason", "unsynced")
+
+    def __init__(self, filepath: pathlib.Path, reason: str, unsynced: bool) -> None:
+        """Generate an orphan
+
+        Args:
+            filepath (pathlib.Path): Path to the script
+            reason (str): One of ORPHAN_REASONS
+            unsynced (bool): The script may have edits that are not in its node
+        """
+        self.filepath: pathlib.Path = filepath
+        """Path to the script"""
+        self.reason: str = reason
+        """One of ORPHAN_REASONS"""
+        self.unsynced: bool = unsynced
+        """The script may have edits that are not in its node"""
+
+
+class _GraphNodes():
+    """Uuid, node filenames and code checksums of a graph, every graph is read only once"""
+
+    __slots__ = ("uuid", "filenames", "checksums")
+
+    def __init__(self, uuid: str, filenames: dict[str, str], checksums: dict[str, str]) -> None:
+        self.uuid: str = uuid
+        self.filenames: dict[str, str] = filenames
+        """Filename of the script of every node, by the node id"""
+        self.checksums: dict[str, str] = checksums
+        """Checksum of the code of every node, by the node id"""
+
+    @classmethod
+    def read(cls, dynamo_file: DynamoFile) -> _GraphNodes:
+        """Get the nodes of an opened graph
+
+        Args:
+            dynamo_file (DynamoFile): The graph
+
+        Returns:
+            _GraphNodes: The nodes
+        """
+        return cls(dynamo_file.uuid,
+                   {n.id: n.filename for n in dynamo_file.python_nodes},
+                   {n.id: n.checksum for n in dynamo_file.python_nodes})
+
+
+def _get_orphan_reason(python_file: PythonFile, graph_nodes: _GraphNodes | None,
+                       pending_paths: set[pathlib.Path] = set()) -> str:
+    """Check if the node of a script still exists, at the same filename
+
+    Args:
+        python_file (PythonFile): The script, with a header
+        graph_nodes (_GraphNodes | None): Nodes of the graph of the script, None if it's not found
+        pending_paths (set[pathlib.Path], optional): Scripts extracted in this run, not written yet. Defaults to set().
+
+    Returns:
+        str: One of ORPHAN_REASONS, empty string if the script has a node
+    """
+    if not graph_nodes or graph_nodes.uuid != python_file.header_data["dyn_uuid"]:
+        return "graph_missing"
+    filename = graph_nodes.filenames.get(python_file.header_data["py_id"])
+    if not filename:
+        return "node_missing"
+    # Only a duplicate, if the current script exists:
+    current_path = python_file.dirpath.joinpath(filename)
+    if filename != python_file.filepath.name and (current_path in pending_paths or current_path.exists()):
+        return "renamed"
+    return ""
+
+
+def _is_unsynced(python_file: PythonFile, graph_nodes: _GraphNodes | None) -> bool:
+    """Check if a script may have edits that are not in its node. The script is compared with its
+        last synchronized code, or with the code of its node, if it was not recorded
+
+    Args:
+        python_file (PythonFile): The script
+        graph_nodes (_GraphNodes | None): Nodes of the graph of the script, None if it's not found
+
+    Returns:
+        bool: True if it has edits, or it cannot be checked
+    """
+    base = SyncState.get_base(python_file.filepath)
+    if base is None and graph_nodes and "py_id" in python_file.header_data:
+        base = graph_nodes.checksums.get(python_file.header_data["py_id"])
+    return code_checksum(python_file.code_text) != base
+
+
+def find_orphans(source_files: list[pathlib.Path], options: Options) -> list[Orphan]:
+    """Find the scripts whose node or graph does not exist anymore, and the old files of renamed nodes.
+        Moved graphs are found in options.graph_root. Graphs are checked by their uuid first.
+        The nodes are read from the search index of options.index, only changed graphs are read again.
+        Without an index every graph is read once
+
+    Args:
+        source_files (list[pathlib.Path]): The scripts to check. Other files are ignored
+        options (Options): Run options
+
+    Returns:
+        list[Orphan]: The orphans
+    """
+    graphs: dict[pathlib.Path, _GraphNodes | None] = {}
+    unreadable: set[pathlib.Path] = set()
+    orphans = []
+
+    search_index = None
+    if options.index:
+        try:
+            search_index = SearchIndex(options.index)
+        except SearchIndex.Error as e:
+            logging.warning(f"{e}, reading every graph: {options.index}")
+
+    try:
+        for filepath in source_files:
+            if filepath.suffix != PYTHON_EXTENSION:
+                continue
+            try:
+                python_file = PythonFile(filepath)
+            except PythonFile.Error as e:
+                logging.warning(f"Invalid header, keeping the script: {filepath} {e}")
+                continue
+            File.open_files.discard(python_file)
+
+            if "dyn_uuid" not in python_file.header_data:
+                # Shared scripts are listed in the manifest, other files without header are not from dyn2py:
+                if filepath.name.startswith(SHARED_SCRIPT_PREFIX) and \
+                        filepath.parent.joinpath(MANIFEST_FILENAME).exists() and \
+                        filepath.name not in Manifest.for_folder(filepath.parent).scripts:
+                    orphans.append(Orphan(filepath, "not_in_manifest", _is_unsynced(python_file, None)))
+                continue
+
+            dynamo_path = python_file.get_source_dynamo_path(options)
+            if dynamo_path in unreadable:
+                continue
+            if dynamo_path not in graphs:
+                try:
+                    graphs[dynamo_path] = _read_graph(
+                        dynamo_path, python_file.header_data["dyn_uuid"], search_index)
+                except (DynamoFile.Error, ValueError) as e:
+                    logging.warning(f"Cannot read graph, keeping its scripts: {dynamo_path} {e}")
+                    unreadable.add(dynamo_path)
+                    continue
+
+            graph_nodes = graphs[dynamo_path]
+            reason = _get_orphan_reason(python_file, graph_nodes)
+            if reason:
+                orphans.append(Orphan(filepath, reason, _is_unsynced(python_file, graph_nodes)))
+    finally:
+        if search_index:
+            search_index.close()
+
+    return orphans
+
+
+def _read_graph(dynamo_path: pathlib.Path, uuid: str, search_index: SearchIndex | None) -> _GraphNodes | None:
+    """Read the nodes of a graph. Graphs with an other uuid are not read
+
+    Args:
+        dynamo_path (pathlib.Path): Path to the graph
+        uuid (str): Uuid of the graph in the header of the script
+        search_index (SearchIndex | None): Read the nodes from this index, only read the graph if it changed
+
+    Raises:
+        DynamoFile.Error: It's a Dynamo 1 file
+        ValueError: Not a valid graph
+
+    Returns:
+        _GraphNodes | None: The nodes. None, if the graph does not exist, or it's an other graph
+    """
+    # Graphs in archives cannot be scanned:
+    if not split_member_path(dynamo_path):
+        if scan_uuid(dynamo_path) != uuid:
+            return None
+        if search_index:
+            try:
+                search_index.update_graph(dynamo_path)
+            except FileNotFoundError:
+                return None
+            indexed = search_index.get_graph_nodes(dynamo_path)
+            if indexed:
+                graph_uuid, nodes = indexed
+                return _GraphNodes(
+                    graph_uuid,
+                    {py_id: python_node_filename(dynamo_path.stem, py_id, py_name) for py_id, py_name, _ in nodes},
+                    {py_id: code_checksum(translate_newlines(code, "\n", DYNAMO_NEWLINE))
+                     for py_id, _, code in nodes})
+
+    try:
+        dynamo_file = DynamoFile(dynamo_path)
+    except FileNotFoundError:
+        return None
+    except DynamoFile.PythonNodeNotFound as e:
+        File.open_files.discard(e.file)
+        return _GraphNodes(e.file.uuid, {}, {})
+    File.open_files.discard(dynamo_file)
+    return _GraphNodes.read(dynamo_file)
+
+
+def find_stale_scripts(dynamo_file: DynamoFile, options: Options) -> list[Orphan]:
+    """Find the scripts of removed and renamed nodes of a graph, in its python folder.
+        The graph is already read, only the scripts named after the graph are checked
+
+    Args:
+        dynamo_file (DynamoFile): The extracted graph
+        options (Options): Run options
+
+    Returns:
+        list[Orphan]: The orphans
+    """
+    python_folder = dynamo_file.get_python_folder(options)
+    if not python_folder.is_dir():
+        return []
+
+    graph_nodes = _GraphNodes.read(dynamo_file)
+    current_filenames = set(graph_nodes.filenames.values())
+    pending_paths = {f.filepath for f in PythonFile.get_open_files() if f.modified}
+    orphans = []
+    for filepath in sorted(python_folder.glob(f"{glob.escape(dynamo_file.basename)}_*{PYTHON_EXTENSION}")):
+        if filepath.name in current_filenames:
+            continue
+        try:
+            python_file = PythonFile(filepath)
+        except PythonFile.Error:
+            continue
+        File.open_files.discard(python_file)
+        if python_file.header_data.get("dyn_uuid") != dynamo_file.uuid:
+            continue
+        reason = _get_orphan_reason(python_file, graph_nodes, pending_paths)
+        if reason:
+            orphans.append(Orphan(filepath, reason, _is_unsynced(python_file, graph_nodes)))
+    return orphans
+
+
+def remove_orphan(orphan: Orphan, options: Options) -> None:
+    """Delete an orphan, or move it to options.gc_archive. Scripts of missing graphs are only removed
+        with options.gc_missing_graphs, and scripts with edits not in their node are only archived, or
+        deleted with options.force
+
+    Args:
+        orphan (Orphan): The orphan
+        options (Options): Run options
+    """
+    if orphan.reason == "graph_missing" and not options.gc_missing_graphs:
+        logging.warning(f"Graph of the script not found, keeping it: {orphan.filepath}")
+        events.emit("skipped", orphan.filepath, "graph_missing")
+        return
+
+    if orphan.unsynced and not options.gc_archive and not options.force:
+        logging.warning(
+            f"Orphan script ({orphan.reason}) may have edits not in its node, keeping it: {orphan.filepath}")
+        events.emit("skipped", orphan.filepath, "unsynced")
+        return
+
+    if options.dry_run:
+        logging.info(f"Should remove orphan script ({orphan.reason}), but it's a dry-run: {orphan.filepath}")
+        events.emit("skipped", orphan.filepath, "dry_run")
+        return
+
+    try:
+        with FolderLock(orphan.filepath.parent):
+            if options.gc_archive:
+                archive_path = options.gc_archive.joinpath(mirror_path(orphan.filepath))
+                archive_path.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(str(orphan.filepath), archive_path)
+                logging.info(f"Archived orphan script ({orphan.reason}) to {archive_path}")
+            else:
+                archive_path = None
+                orphan.filepath.unlink()
+                logging.info(f"Removed orphan script ({orphan.reason}): {orphan.filepath}")
+    except FolderLock.Error as e:
+        logging.error(f"{e}, not removing: {orphan.filepath}")
+        events.emit("failed", orphan.filepath, "locked")
+        return
+
+    SyncState.forget(orphan.filepath)
+    events.emit("removed", orphan.filepath, orphan.reason, backup_path=archive_path)
+    if options.loglevel == "HEADLESS" and not options.output:
+        print(orphan.filepath, flush=True)
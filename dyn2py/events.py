@@ -0,0 +1,160 @@
+from __future__ import annotations
+import pathlib
+import time
+from typing import Callable
+
+
+EVENT_KINDS = ["written", "skipped", "backed_up", "failed", "removed"]
+
+_listeners: list[Callable[[Event], None]] = []
+
+
+class Event():
+    """Something happened with a file during a run"""
+
+    __slots__ = ("kind", "filepath", "reason", "backup_path", "time")
+
+    def __init__(self,
+                 kind: str,
+                 filepath: pathlib.Path,
+                 reason: str = "",
+                 backup_path: pathlib.Path | None = None
+                 ) -> None:
+        """Generate an event
+
+        Args:
+            kind (str): One of EVENT_KINDS
+            filepath (pathlib.Path): The file
+            reason (str, optional): Why was it skipped, failed or removed. Defaults to "".
+            backup_path (pathlib.Path | None, optional): The backup of the file, for backed_up events,
+                or the archived file for removed events. Defaults to None.
+        """
+        self.kind: str = kind
+        """One of EVENT_KINDS"""
+        self.filepath: pathlib.Path = filepath
+        """The file"""
+        self.reason: str = reason
+        """Why was it skipped, failed or removed"""
+        self.backup_path: pathlib.Path | None = backup_path
+        """The backup of the file"""
+        self.time: float = time.time()
+        """When did it happen, as a timestamp"""
+
+    def to_dict(self) -> dict:
+        """Get the event as a json serializable dict
+
+        Returns:
+            dict: The event
+        """
+        event_dict = {
+            "event": self.kind,
+            "path": str(self.filepath),
+            "time": self.time
+        }
+        if self.reason:
+            event_dict["reason"] = self.reason
+        if self.backup_path:
+            event_dict["backup_path"] = str(self.backup_path)
+        return event_dict
+
+
+class RunResult():
+    """The result of a run: written, skipped, backed up, failed and removed files"""
+
+    def __init__(self) -> None:
+        self.written: list[pathlib.Path] = []
+        """Written files"""
+        self.skipped: list[tuple[pathlib.Path, str]] = []
+        """Skipped files, with the reason"""
+        self.backed_up: list[tuple[pathlib.Path, pathlib.Path]] = []
+        """Backed up files, with the path of the backup"""
+        self.failed: list[tuple[pathlib.Path, str]] = []
+        """Files could not be processed, with the reason"""
+        self.removed: list[tuple[pathlib.Path, str]] = []
+        """Removed or archived orphan scripts, with the reason"""
+        self.events: list[Event] = []
+        """Every event, in order"""
+        self.start: float = time.time()
+        """Start of the run, as a timestamp"""
+        self.elapsed: float = 0.0
+        """Length of the run in seconds"""
+        self.stats: dict = {}
+        """Timings and counters, if stats were enabled"""
+
+    def handle_event(self, event: Event) -> None:
+        """Record an event, use it as a listener
+
+        Args:
+            event (Event): The event
+        """
+        self.events.append(event)
+        if event.kind == "written":
+            self.written.append(event.filepath)
+        elif event.kind == "skipped":
+            self.skipped.append((event.filepath, event.reason))
+        elif event.kind == "backed_up" and event.backup_path:
+            self.backed_up.append((event.filepath, event.backup_path))
+        elif event.kind == "failed":
+            self.failed.append((event.filepath, event.reason))
+        elif event.kind == "removed":
+            self.removed.append((event.filepath, event.reason))
+
+    def finish(self) -> None:
+        """Record the end of the run"""
+        self.elapsed = time.time() - self.start
+
+    def to_dict(self) -> dict:
+        """Get the result as a json serializable dict
+
+        Returns:
+            dict: The result
+        """
+        return {
+            "written": [str(p) for p in self.written],
+            "skipped": [{"path": str(p), "reason": r} for p, r in self.skipped],
+            "backed_up": [{"path": str(p), "backup_path": str(b)} for p, b in self.backed_up],
+            "failed": [{"path": str(p), "reason": r} for p, r in self.failed],
+            "removed": [{"path": str(p), "reason": r} for p, r in self.removed],
+            "elapsed": self.elapsed,
+            "stats": self.stats
+        }
+
+
+def add_listener(listener: Callable[[Event], None]) -> None:
+    """Call a function on every event
+
+    Args:
+        listener (Callable[[Event], None]): The function, called with the Event
+    """
+    _listeners.append(listener)
+
+
+def remove_listener(listener: Callable[[Event], None]) -> None:
+    """Do not call a function on events anymore
+
+    Args:
+        listener (Callable[[Event], None]): The function
+    """
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def emit(kind: str,
+         filepath: pathlib.Path,
+         reason: str = "",
+         backup_path: pathlib.Path | None = None
+         ) -> None:
+    """Send an event to the listeners. Does nothing if there are no listeners
+
+    Args:
+        kind (str): One of EVENT_KINDS
+        filepath (pathlib.Path): The file
+        reason (str, optional): Why was it skipped or failed. Defaults to "".
+        backup_path (pathlib.Path | None, optional): The backup of the file, for backed_up events. Defaults to None.
+    """
+    if not _listeners:
+        return
+
+    event = Event(kind, filepath, reason, backup_path)
+    for listener in list(_listeners):
+        listener(event)
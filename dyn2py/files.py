@@ -4,23 +4,214 @@ import hashlib
 import pathlib
 import logging
 import os
+import functools
 from datetime import datetime
+from typing import TYPE_CHECKING
 from decimal import Decimal
 from pathvalidate import sanitize_filename
 from importlib_metadata import metadata
 
-from dyn2py.options import Options
+from dyn2py.options import Options, DEFAULT_NUMBER_MODE, DEFAULT_JSON_CODEC
+from dyn2py import json_codecs
+from dyn2py.graph_index import GraphIndex, scan_uuid
+from dyn2py.backup import BackupStore
+from dyn2py.archives import Archive, split_member_path
+from dyn2py.manifest import Manifest, NodeReference
+from dyn2py.syncstate import SyncState
+from dyn2py.locking import FolderLock, write_atomic
+from dyn2py.fscache import FS_CACHE, decode_text
+from dyn2py.stats import STATS
+from dyn2py import events
+
+if TYPE_CHECKING:
+    from dyn2py.search import SearchIndex
 
 
 METADATA = metadata("dyn2py")
 HEADER_SEPARATOR = "*" * 60
+VOLATILE_HEADER_KEYS = ["dyn2py_extracted", "dyn_modified"]
+DYNAMO_EXTENSIONS = [".dyn", ".dyf"]
+PYTHON_EXTENSION = ".py"
+DYNAMO_NEWLINE = "\r\n"
+"""Code in Dynamo graphs is always CRLF"""
+LAYOUT_HASH_LENGTH = 2
+"""Length of the uuid prefix of shard folders in the hash layout"""
+
+
+def translate_newlines(text: str, old: str, new: str) -> str:
+    """Change the line endings of a string, only copy it if they are different
+
+    Args:
+        text (str): The string to convert
+        old (str): The current line ending
+        new (str): The new line ending
+
+    Returns:
+        str: The converted string
+    """
+    if old == new:
+        return text
+    else:
+        return text.replace(old, new)
+
+
+def code_checksum(code_text: str) -> str:
+    """Calculate the checksum of python code, for checking changes
+
+    Args:
+        code_text (str): The code with CRLF line endings, like in Dynamo graphs
+
+    Returns:
+        str: The checksum as hex string
+    """
+    return hashlib.md5(code_text.encode()).hexdigest()
+
+
+def content_checksum(text: str) -> str:
+    """Calculate the checksum of the text of a graph, for checking changes of the whole file
+
+    Args:
+        text (str): The text of the file, with \\n line endings
+
+    Returns:
+        str: The checksum as hex string
+    """
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def relative_posix_path(path: pathlib.Path, start: pathlib.Path) -> str:
+    """Get a path relative to a folder, with forward slashes, for headers and manifests
+
+    Args:
+        path (pathlib.Path): The path
+        start (pathlib.Path): The folder
+
+    Returns:
+        str: The relative path
+    """
+    path_string = os.path.relpath(path, start)
+    if "\\" in path_string:
+        path_string = path_string.replace("\\", "/")
+    return path_string
+
+
+def mirror_path(dirpath: pathlib.Path) -> pathlib.Path:
+    """Get the path of a folder for the mirror layout: relative to the working directory,
+        or the absolute path without its root, if it's outside of it
+
+    Args:
+        dirpath (pathlib.Path): The folder
+
+    Returns:
+        pathlib.Path: The relative path
+    """
+    absolute_path = pathlib.Path(os.path.abspath(dirpath))
+    try:
+        return absolute_path.relative_to(os.getcwd())
+    except ValueError:
+        return pathlib.Path(*absolute_path.parts[1:])
+
+
+@functools.lru_cache(maxsize=4096)
+def resolve_path(dirpath: str, relative_path: str) -> pathlib.Path:
+    """Resolve a path relative to a folder, without changing the working directory.
+        The results are cached, clear it with resolve_path.cache_clear(), if symlinks changed
+
+    Args:
+        dirpath (str): Absolute path of the folder
+        relative_path (str): The path to resolve, relative to the folder, or absolute
+
+    Returns:
+        pathlib.Path: The resolved absolute path
+    """
+    return pathlib.Path(os.path.realpath(os.path.join(dirpath, relative_path)))
+
+
+def python_node_filename(graph_basename: str, node_id: str, node_name: str) -> str:
+    """Get the filename of the script of a python node
+
+    Args:
+        graph_basename (str): Name of the graph, without extension
+        node_id (str): Id of the node
+        node_name (str): Name of the node
+
+    Returns:
+        str: The filename, including the .py extension
+    """
+    filename_parts = [graph_basename, node_id]
+
+    # Only add the name of the node if it's changed:
+    if node_name and node_name != "Python Script":
+        filename_parts.append(node_name)
+
+    logging.debug(f"Generating filename from: {filename_parts}")
+    return sanitize_filename("_".join(filename_parts) + PYTHON_EXTENSION)
+
+
+def scan_header(filepath: pathlib.Path) -> dict[str, str]:
+    """Read the header of a python script, without reading the code
+
+    Args:
+        filepath (pathlib.Path): Path to the script
+
+    Returns:
+        dict[str, str]: The header data. Empty, if the script has no valid header
+    """
+    header_data = {}
+    header_separator_count = 0
+    try:
+        with open(filepath, mode="r", encoding="utf-8") as input_py:
+            for line in input_py:
+                line = line.rstrip("\n")
+                if header_separator_count < 2:
+                    if line == HEADER_SEPARATOR:
+                        header_separator_count += 1
+                    continue
+                elif line == HEADER_SEPARATOR:
+                    return header_data
+                sl = line.find(":")
+                if sl == -1:
+                    break
+                header_data[line[0:sl]] = line[sl+1:]
+    except (OSError, UnicodeDecodeError):
+        pass
+    return {}
 
 
 class File():
     """Base class for managing files"""
 
+    __slots__ = ("filepath", "_realpath", "mtime", "exists", "modified", "sync_records")
+
     open_files: set[File] = set()
     """A set of open files."""
+    lock_reads: bool = False
+    """Lock the folder of files before they are read, until they are closed, so other dyn2py processes
+    cannot change them between reading and writing. Set by run(), if files can be written"""
+    read_locks: dict[pathlib.Path, FolderLock] = {}
+    """Folders locked by lock_reads, by their resolved path"""
+
+    def __new__(cls, filepath: pathlib.Path | str, *args, **kwargs) -> File:
+        """Create a DynamoFile or PythonFile object instead of a File object, if the extension is correct
+
+        Args:
+            filepath (pathlib.Path | str): Path to the python file or Dynamo graph
+
+        Returns:
+            File: The new object
+        """
+        if cls is File:
+            extension = pathlib.PurePath(filepath).suffix
+            if extension in DYNAMO_EXTENSIONS:
+                cls = DynamoFile
+            elif extension == PYTHON_EXTENSION:
+                cls = PythonFile
+
+        # Graphs in archives are read from the archive:
+        if cls is DynamoFile and split_member_path(filepath):
+            cls = ArchiveDynamoFile
+
+        return super().__new__(cls)
 
     def __init__(self, filepath: pathlib.Path | str, read_from_disk: bool = True) -> None:
         """Generate a file object. If the path is correct it will become a DynamoFile or PythonFile object.
@@ -37,44 +228,91 @@ class File():
             self.filepath = pathlib.Path(filepath)
         else:
             self.filepath = filepath
+        self._realpath: pathlib.Path | None = None
 
-        self.basename: str = self.filepath.stem
-        """Only the name of the file, without path or extension"""
-        self.dirpath: pathlib.Path = self.filepath.parent
-        """Containing folder"""
-        self.realpath: pathlib.Path = self.filepath.resolve()
-        """Full resolved path to the file"""
         self.mtime: float = 0.0
         """Modification time. 0 if does not exist"""
-        self.mtimeiso: str = ""
-        """Modification time as an iso formatted string"""
-
-        self.exists: bool = self.filepath.exists()
+        self.exists: bool = False
         """If the file exists"""
-        self.extension: str = self.filepath.suffix
-        """File extension as string"""
         self.modified: bool = False
         """If an existing file was modified"""
+        self.sync_records: list[tuple[pathlib.Path, str]] = []
+        """Scripts and checksums to record as synchronized, when this file is written"""
 
-        # Change class if extension is correct:
-        if self.is_dynamo_file():
-            self.__class__ = DynamoFile
+        if self.lock_reads:
+            self._lock_folder()
+        self._read_metadata()
 
+        if self.is_dynamo_file():
             # Read DynamoFiles, they should exist:
             if read_from_disk:
                 self.read_file()
 
         elif self.is_python_file():
-            self.__class__ = PythonFile
-
             # Python files can be virtual:
             if self.exists and read_from_disk:
                 self.read_file()
 
-        if self.exists:
+    @property
+    def basename(self) -> str:
+        """Only the name of the file, without path or extension"""
+        return self.filepath.stem
+
+    @property
+    def realpath(self) -> pathlib.Path:
+        """Full resolved path to the file, resolved only on first access"""
+        if self._realpath is None:
+            self._realpath = self.filepath.resolve()
+        return self._realpath
+
+    @property
+    def dirpath(self) -> pathlib.Path:
+        """Containing folder"""
+        return self.filepath.parent
+
+    @property
+    def extension(self) -> str:
+        """File extension as string"""
+        return self.filepath.suffix
+
+    @property
+    def mtimeiso(self) -> str:
+        """Modification time as an iso formatted string. Empty string if does not exist"""
+        if self.mtime:
+            return datetime.fromtimestamp(self.mtime).isoformat()
+        else:
+            return ""
+
+    def _lock_folder(self) -> None:
+        """Lock the folder of the file until close_open_files(). Called by __init__(), if lock_reads is set.
+            If it's locked by an other process for too long, the file is read without the lock,
+            and it's only checked for changes when it's written"""
+        folder = self.realpath.parent
+        if folder in File.read_locks or not folder.is_dir():
+            return
+        lock = FolderLock(folder)
+        try:
+            lock.acquire()
+        except FolderLock.Error as e:
+            logging.warning(f"{e}, reading without lock: {self.filepath}")
+            return
+        File.read_locks[folder] = lock
+
+    @staticmethod
+    def release_read_locks() -> None:
+        """Unlock the folders locked while reading files"""
+        for lock in File.read_locks.values():
+            lock.release()
+        File.read_locks.clear()
+
+    def _read_metadata(self) -> None:
+        """Set exists and mtime. Called by __init__()"""
+        # Get every metadata with a single call:
+        stat_result = FS_CACHE.stat(self.filepath)
+        if stat_result:
             logging.debug(f"File exists: {self.filepath}")
-            self.mtime = self.filepath.stat().st_mtime
-            self.mtimeiso = datetime.fromtimestamp(self.mtime).isoformat()
+            self.exists = True
+            self.mtime = stat_result.st_mtime
 
     def read_file(self):
         """Should be implemented in subclasses"""
@@ -102,7 +340,7 @@ class File():
         Returns:
             bool: True if it's Dynamo file
         """
-        return bool(self.extension in [".dyn", ".dyf"])
+        return bool(self.extension in DYNAMO_EXTENSIONS)
 
     def is_python_file(self) -> bool:
         """Check if this is a python file
@@ -110,7 +348,7 @@ class File():
         Returns:
             bool: True if it's python file
         """
-        return bool(self.extension == ".py")
+        return bool(self.extension == PYTHON_EXTENSION)
 
     def write(self, options: Options | None = None, **option_args) -> None:
         """Prepare writing file to the disk:
@@ -128,7 +366,7 @@ class File():
         """
 
         if not options:
-            options = Options.from_kwargs(kwargs=option_args)
+            options = Options.from_kwargs(**option_args)
         elif option_args:
             # Should not give both options and arguments:
             raise ValueError("Options object and extra arguments!")
@@ -141,27 +379,78 @@ class File():
             logging.debug("File not modified, not saving")
             return
 
-        # Create backup:
-        if not options.dry_run and self.filepath.exists() and options.backup:
+        # Call filetype specific methods:
+        if options.dry_run:
+            logging.info(
+                f"Should write file, but it's a dry-run: {self.filepath}")
+            events.emit("skipped", self.filepath, "dry_run")
+            return
+
+        if not self.dirpath.exists():
+            raise File.Error("File dir does not exist!", self)
+
+        # Other dyn2py processes wait until the file is written:
+        try:
+            with FolderLock(self.dirpath):
+                if self._changed_on_disk():
+                    logging.error(
+                        f"File changed by an other process since it was read, not overwriting: {self.filepath}")
+                    events.emit("failed", self.filepath, "changed")
+                    return
+
+                # Create backup:
+                if self.filepath.exists() and options.backup:
+                    self._backup(options)
+
+                logging.info(f"Writing file: {self.filepath}")
+                self._write_file()
+                FS_CACHE.invalidate(self.filepath)
+                self._read_metadata()
+        except FolderLock.Error as e:
+            logging.error(f"{e}, not writing: {self.filepath}")
+            events.emit("failed", self.filepath, "locked")
+            return
+
+        for script_path, checksum in self.sync_records:
+            SyncState.record(script_path, checksum)
+        self.sync_records.clear()
+        events.emit("written", self.filepath)
+        if options.loglevel == "HEADLESS" and not options.output:
+            print(self.filepath, flush=True)
+
+    def _backup(self, options: Options) -> None:
+        """Back up the file before it's written. Should be called only from File.write()
+
+        Args:
+            options (Options): Run options
+        """
+        if options.backup_store:
+            backup_store = BackupStore.for_file(
+                self.filepath, options.backup_store, options.backup_compress)
+            backup_path = backup_store.backup(self.filepath, self.mtime)
+            logging.info(f"Backed up to {backup_path}")
+        else:
             backup_filename = sanitize_filename(
                 filename=f"{self.basename}_{self.mtimeiso}{self.extension}")
             backup_path = self.dirpath.joinpath(backup_filename)
             logging.info(f"Creating backup to {backup_path}")
             self.filepath.rename(backup_path)
-            if options.loglevel == "HEADLESS":
-                print(backup_path)
+        events.emit("backed_up", self.filepath, backup_path=backup_path)
+        if options.loglevel == "HEADLESS" and not options.output:
+            print(backup_path, flush=True)
 
-        # Call filetype specific methods:
-        if options.dry_run:
-            logging.info(
-                f"Should write file, but it's a dry-run: {self.filepath}")
-        else:
-            if not self.dirpath.exists():
-                raise File.Error("File dir does not exist!", self)
-            logging.info(f"Writing file: {self.filepath}")
-            self._write_file()
-            if options.loglevel == "HEADLESS":
-                print(self.filepath)
+    def _changed_on_disk(self) -> bool:
+        """Check if an other process created or modified the file since it was read
+
+        Returns:
+            bool: True if the file on the disk is not the one that was read
+        """
+        try:
+            mtime = os.stat(self.filepath).st_mtime
+        except FileNotFoundError:
+            # Deleted files can be written again:
+            return False
+        return not self.exists or mtime != self.mtime
 
     def _write_file(self):
         """Should be implemented in subclasses
@@ -195,7 +484,7 @@ class File():
 
         """
         if not options:
-            options = Options.from_kwargs(kwargs=option_args)
+            options = Options.from_kwargs(**option_args)
         elif option_args:
             # Should not give both options and arguments:
             raise ValueError("Options object and extra arguments!")
@@ -207,6 +496,11 @@ class File():
     def close_open_files(cls) -> None:
         """Close open files of this class and subclasses"""
         File.open_files = File.open_files - cls.get_open_files()
+        # Do not keep closed graphs in memory:
+        PythonFile.source_dynamo_files = {
+            p: d for p, d in PythonFile.source_dynamo_files.items() if d in File.open_files}
+        if not File.open_files:
+            File.release_read_locks()
 
     class Error(Exception):
         def __init__(self, message: str, file: File) -> None:
@@ -223,14 +517,26 @@ class File():
 class DynamoFile(File):
     """A Dynamo file, subclass of File()"""
 
+    __slots__ = ("full_dict", "uuid", "name", "python_nodes", "content_checksum")
+
     full_dict: dict
     """The contents of the Dynamo file, as dict."""
+    content_checksum: str
+    """Checksum of the text of the file, as it was read or last written"""
     uuid: str
     """The uuid of the graph."""
     name: str
     """The name of the graph, read from the file, not the filename"""
     python_nodes: set[PythonNode]
     """Python node objects, read from this file."""
+    number_mode: str = DEFAULT_NUMBER_MODE
+    """How to read numbers: 'raw' keeps their original text, 'decimal' parses them to Decimal objects"""
+    json_codec: str = DEFAULT_JSON_CODEC
+    """Json library to read and write graphs with, one of JSON_CODECS"""
+    read_only: bool = False
+    """The graph cannot be updated"""
+    search_index: SearchIndex | None = None
+    """Add the extracted and the written graphs to this search index. Set by run() with options.index"""
 
     def extract_python(self, options: Options | None = None, **option_args) -> list[PythonFile]:
         """Extract python files from Dynamo graphs, add them to open_files
@@ -247,18 +553,33 @@ class DynamoFile(File):
         """
 
         if not options:
-            options = Options.from_kwargs(kwargs=option_args)
+            options = Options.from_kwargs(**option_args)
         elif option_args:
             # Should not give both options and arguments:
             raise ValueError("Options object and extra arguments!")
 
         logging.info(f"Extracting from file: {self.filepath}")
+
+        # The graph is already parsed, it's not read again for the index:
+        if self.search_index:
+            self.search_index.add_graph(self)
+
+        if options.dedup:
+            return self._extract_shared_python(options)
+
         python_files = []
 
+        python_folder = self.get_python_folder(options)
+
         # Go through nodes in the file:
         for python_node in self.python_nodes:
-            if options.python_folder:
-                python_file_path = options.python_folder.joinpath(
+            if not options.selects_node(python_node.id, python_node.engine, python_node.name):
+                logging.debug(f"Node not selected, skipping: {python_node.id}")
+                STATS.count("nodes_not_selected")
+                continue
+
+            if options.python_folder or options.layout != "flat":
+                python_file_path = python_folder.joinpath(
                     python_node.filename)
             else:
                 python_file_path = python_node.filepath
@@ -266,13 +587,125 @@ class DynamoFile(File):
             python_file = PythonFile(
                 filepath=python_file_path,
                 dynamo_file=self,
-                python_node=python_node
+                python_node=python_node,
+                deterministic=options.deterministic
             )
 
-            if python_file.is_newer(self) and not options.force:
+            if not python_file.modified:
+                PythonFile.open_files.remove(python_file)
+                SyncState.record(python_file.filepath, python_node.checksum)
+                logging.info(
+                    f"Existing file is the same, skipping: {python_file.filepath}")
+                events.emit("skipped", python_file.filepath, "unchanged")
+                continue
+
+            skip_reason = self._get_extract_skip_reason(python_file, python_node, options)
+            if skip_reason:
+                PythonFile.open_files.remove(python_file)
+                if skip_reason == "conflict":
+                    logging.warning(
+                        f"Both the script and the node changed since the last sync, skipping: {python_file.filepath}")
+                    events.emit("failed", python_file.filepath, "conflict")
+                else:
+                    logging.warning(
+                        f"Existing file is newer, skipping: {python_file.filepath}")
+                    events.emit("skipped", python_file.filepath, "newer")
+                continue
+
+            python_file.sync_records.append((python_file.filepath, python_node.checksum))
+
+            # Shards are created for the first script:
+            if not options.dry_run and not python_folder.exists():
+                python_folder.mkdir(parents=True, exist_ok=True)
+
+            python_files.append(python_file)
+
+        return python_files
+
+    def _get_extract_skip_reason(self, python_file: PythonFile, python_node: PythonNode, options: Options) -> str:
+        """Compare an existing script with the node and with the code they last had in common, like a three-way merge.
+            Modification times are only compared if the code is the same, or the script was not synchronized yet
+
+        Args:
+            python_file (PythonFile): The generated script
+            python_node (PythonNode): The node
+            options (Options): Run options
+
+        Returns:
+            str: "newer" or "conflict", if the script should not be written. Empty string if it should
+        """
+        if not python_file.exists:
+            return ""
+
+        base = SyncState.get_base(python_file.filepath)
+        if base is not None and not options.force:
+            # Read the code of the existing script, without replacing the generated one:
+            existing_file = PythonFile(python_file.filepath)
+            PythonFile.open_files.discard(existing_file)
+            script_checksum = code_checksum(existing_file.code_text)
+
+            if script_checksum == python_node.checksum:
+                # Only the header could change:
+                SyncState.record(python_file.filepath, script_checksum)
+            elif script_checksum == base:
+                return ""
+            elif python_node.checksum == base:
+                # Only the script was edited:
+                return "newer"
+            else:
+                return "conflict"
+
+        return "newer" if python_file.is_newer(self) and not options.force else ""
+
+    def _extract_shared_python(self, options: Options) -> list[PythonFile]:
+        """Extract every unique code once, and list the nodes using it in the manifest of the python folder.
+            Shared scripts are always in the python folder, layouts do not apply to them
+
+        Args:
+            options (Options): Run options
+
+        Returns:
+            list[PythonFile]: The new or changed shared scripts
+        """
+        python_folder = options.python_folder or self.dirpath
+        manifest = Manifest.for_folder(python_folder)
+        dyn_path = relative_posix_path(self.filepath, python_folder)
+        manifest.remove_graph(dyn_path)
+        python_files = []
+
+        for python_node in sorted(self.python_nodes, key=lambda n: n.id):
+            shared_script, new_script = manifest.add_node(python_node.checksum, NodeReference(
+                self.uuid, self.name, dyn_path, python_node.id, python_node.engine))
+
+            # Not selected nodes stay in the manifest, their scripts are not checked:
+            if not options.selects_node(python_node.id, python_node.engine, python_node.name):
+                logging.debug(f"Node not selected, skipping: {python_node.id}")
+                STATS.count("nodes_not_selected")
+                continue
+
+            # Every script is only checked once in a run:
+            if shared_script.filename in manifest.checked:
+                STATS.count("nodes_deduplicated")
+                continue
+            manifest.checked.add(shared_script.filename)
+
+            python_file = PythonFile.from_shared_code(
+                python_folder.joinpath(shared_script.filename), python_node)
+
+            if not python_file.modified:
+                PythonFile.open_files.remove(python_file)
+                logging.info(
+                    f"Existing file is the same, skipping: {python_file.filepath}")
+                events.emit("skipped", python_file.filepath, "unchanged")
+                continue
+
+            # The manifest has the code of existing scripts, any difference is an edit:
+            edited = python_file.is_newer(self) if new_script else python_file.exists
+            if edited and not options.force:
                 PythonFile.open_files.remove(python_file)
                 logging.warning(
                     f"Existing file is newer, skipping: {python_file.filepath}")
+                events.emit("skipped", python_file.filepath, "newer")
                 continue
 
             python_files.append(python_file)
@@ -298,35 +731,38 @@ class DynamoFile(File):
         if not self in self.open_files or reread:
 
             logging.debug(f"Reading file: {self.filepath}")
-            # Read the json:
+            with STATS.timer("read"):
+                text = self._read_text()
+            STATS.count("dynamo_files_read")
+            self.content_checksum = content_checksum(text)
+
+            # Parse the json:
             try:
-                with open(self.filepath, "r", encoding="utf-8") as input_json:
-                    self.full_dict = json.load(input_json,
-                                               use_decimal=True)
+                with STATS.timer("parse_json"):
+                    self.full_dict = json_codecs.loads(
+                        text, self.number_mode, self.json_codec)
 
             except json.JSONDecodeError as e:
-                with open(self.filepath, "r", encoding="utf-8") as input_json:
-                    if input_json.readline().startswith("<Workspace Version="):
-                        raise self.Error("This is a Dynamo 1 file!", self)
-                    else:
-                        raise e
+                if text.startswith("<Workspace Version="):
+                    raise self.Error("This is a Dynamo 1 file!", self)
+                else:
+                    raise e
 
             # Parameters:
             self.uuid = self.full_dict["Uuid"]
             self.name = self.full_dict["Name"]
-            self.open_files.add(self)
 
             full_python_nodes = [n for n in self.full_dict["Nodes"]
                                  if n["NodeType"] == "PythonScriptNode"]
             # The name of the node is stored here:
             node_views = self.full_dict["View"]["NodeViews"]
 
+            self.python_nodes = set()
+
             if not full_python_nodes:
                 raise self.PythonNodeNotFound(
                     "No python nodes in this file!", self, "")
 
-            self.python_nodes = set()
-
             # Create PythonNodes from the dict:
             for p_node in full_python_nodes:
                 python_node = PythonNode(
@@ -334,6 +770,27 @@ class DynamoFile(File):
                     dynamo_file=self)
                 self.python_nodes.add(python_node)
 
+            # Only register fully read files:
+            self.open_files.add(self)
+
+        else:
+            STATS.count("cache_hits")
+
+    def _read_text(self) -> str:
+        """Read the json text of the graph. Called by read_file()
+
+        Returns:
+            str: The contents of the file
+        """
+        if FS_CACHE.enabled:
+            return decode_text(FS_CACHE.read_bytes(self.filepath))
+
+        with open(self.filepath, "r", encoding="utf-8") as input_json:
+            text = input_json.read()
+            if STATS.enabled:
+                STATS.count("bytes_read", input_json.buffer.tell())
+        return text
+
     def get_python_node_by_id(self, node_id: str) -> PythonNode:
         """Get a PythonNode object from this Dynamo graph, by its id
 
@@ -378,19 +835,30 @@ class DynamoFile(File):
             raise self.PythonNodeNotFound(
                 "Existing node not found in file", self, python_node.id)
 
+        if not python_node.name:
+            python_node.name = python_node_in_file.name
+
         # Remove the old and add the new:
         self.python_nodes.remove(python_node_in_file)
         self.python_nodes.add(python_node)
 
-        # Update the dict, Dyn files are always CRLF:
-        node_dict["Code"] = "\r\n".join(python_node.code)
+        # Update the dict, the code is already CRLF:
+        node_dict["Code"] = python_node.code_text
 
         self.modified = True
 
     def _write_file(self) -> None:
         """Write this file to the disk. Should be called only from File.write()"""
-        with open(self.filepath, "w", encoding="utf-8", newline="") as output_file:
-            json.dump(self.full_dict, output_file, indent=2,  use_decimal=True)
+        with STATS.timer("serialize"):
+            data = json_codecs.dumps(
+                self.full_dict, self.json_codec).encode("utf-8")
+        with STATS.timer("write"):
+            write_atomic(self.filepath, data)
+        STATS.count("bytes_written", len(data))
+        # The written text has \n line endings, like the text read:
+        self.content_checksum = hashlib.md5(data).hexdigest()
+        if self.search_index:
+            self.search_index.add_graph(self)
 
     def get_related_python_files(self, options: Options | None = None, **option_args) -> list[PythonFile]:
         """Get python files exported from this Dynamo file
@@ -406,37 +874,88 @@ class DynamoFile(File):
             list[PythonFile]: A list of PythonFile objects
         """
         if not options:
-            options = Options.from_kwargs(kwargs=option_args)
+            options = Options.from_kwargs(**option_args)
         elif option_args:
             # Should not give both options and arguments:
             raise ValueError("Options object and extra arguments!")
 
-        # Find the folder of the python files
-        if options.python_folder:
-            python_folder = options.python_folder
+        # Find the folder of the python files, only this shard is listed:
+        python_folder = self.get_python_folder(options)
+        if options.layout != "flat" and not python_folder.exists():
+            python_paths = []
         else:
-            python_folder = self.dirpath
+            # Only the names are checked, metadata is cached from the listing in the high-latency mode:
+            python_paths = [f for f in FS_CACHE.list_folder(python_folder)
+                            if f.suffix == PYTHON_EXTENSION]
+        # Scripts are selected by the uuid in their header, other graphs and their scripts are not opened:
+        related_paths = [f for f in python_paths if scan_header(f).get("dyn_uuid") == self.uuid]
+        FS_CACHE.prefetch(related_paths)
+        python_files_in_folder = {f: PythonFile(f) for f in related_paths}
+        related_python_files = list(python_files_in_folder.values())
+
+        # Shared scripts of deduplicated extraction have no header, they are not in shards:
+        shared_folder = options.python_folder or self.dirpath
+        manifest = Manifest.for_folder(shared_folder, strict=options.dedup)
+        for shared_script in manifest.get_scripts_of_graph(self.uuid):
+            shared_path = shared_folder.joinpath(shared_script.filename)
+            if shared_path in python_files_in_folder:
+                related_python_files.append(python_files_in_folder[shared_path])
+            elif FS_CACHE.stat(shared_path):
+                related_python_files.append(PythonFile(shared_path))
 
-        python_files_in_folder = [PythonFile(f) for f in python_folder.iterdir()
-                                  if File(f, read_from_disk=False).is_python_file()]
+        return related_python_files
 
-        related_python_files = [
-            p for p in python_files_in_folder if p.get_source_dynamo_file().uuid == self.uuid]
+    def get_python_folder(self, options: Options | None = None, **option_args) -> pathlib.Path:
+        """Get the folder of the python scripts of this graph, in the layout of the options
 
-        return related_python_files
+        Args:
+            options (Options | None, optional): Run options. Defaults to None.
+            **option_args: Options() arguments
+
+        Raises:
+            ValueError: Both options and other arguments given
+
+        Returns:
+            pathlib.Path: The folder. It might not exist
+        """
+        if not options:
+            options = Options.from_kwargs(**option_args)
+        elif option_args:
+            # Should not give both options and arguments:
+            raise ValueError("Options object and extra arguments!")
+
+        python_folder = options.python_folder or self.dirpath
+
+        if options.layout == "graph":
+            return python_folder.joinpath(sanitize_filename(self.basename))
+        elif options.layout == "hash":
+            return python_folder.joinpath(self.uuid[:LAYOUT_HASH_LENGTH])
+        elif options.layout == "mirror" and options.python_folder:
+            return python_folder.joinpath(mirror_path(self.dirpath))
+        else:
+            return python_folder
 
     @staticmethod
-    def get_open_file_by_uuid(uuid: str) -> DynamoFile | None:
+    def get_open_file_by_uuid(uuid: str, filepath: pathlib.Path | None = None) -> DynamoFile | None:
         """Get an open Dynamo graph by its uuid
 
         Args:
             uuid (str): Uuid of the file
+            filepath (pathlib.Path | None, optional): Resolved path of the graph. Copies of a graph have the same uuid,
+                the copy at this path is preferred, if it exists. Defaults to None.
         Returns:
             DynamoFile: The file. None if not found
         """
-        f = next((d for d in DynamoFile.get_open_files() if d.uuid == uuid), None)
+        open_files = [d for d in DynamoFile.get_open_files() if d.uuid == uuid]
+        f = open_files[0] if open_files else None
+        if f and filepath and (len(open_files) > 1 or f.realpath != filepath):
+            f = next((d for d in open_files if d.realpath == filepath), None)
+            if not f and scan_uuid(filepath) != uuid:
+                # There is no copy at the path, it was moved:
+                f = open_files[0]
         if f:
             logging.debug(f"Found open file {f.uuid}")
+            STATS.count("cache_hits")
         return f
 
     class PythonNodeNotFound(Exception):
@@ -453,20 +972,85 @@ class DynamoFile(File):
             self.node_id = node_id
 
 
+class ArchiveDynamoFile(DynamoFile):
+    """A Dynamo graph in a zip or tar archive, read without unpacking. Subclass of DynamoFile().
+        Its path is the member path, like: deliveries.zip!/graphs/graph.dyn"""
+
+    __slots__ = ("archive_path", "member")
+
+    read_only = True
+
+    def __init__(self, filepath: pathlib.Path | str, read_from_disk: bool = True) -> None:
+        """Generate a graph from an archive member
+
+        Args:
+            filepath (pathlib.Path | str): The member path, like: deliveries.zip!/graphs/graph.dyn
+            read_from_disk (bool, optional): Read the graph from the archive. False to get only metadata. Defaults to True.
+
+        Raises:
+            ValueError: Not a member path
+        """
+        archive_member = split_member_path(filepath)
+        if not archive_member:
+            raise ValueError(f"Not an archive member path: {filepath}")
+
+        self.archive_path: pathlib.Path
+        """Path to the archive"""
+        self.member: str
+        """Name of the graph in the archive"""
+        self.archive_path, self.member = archive_member
+
+        super().__init__(filepath, read_from_disk=read_from_disk)
+
+    @property
+    def dirpath(self) -> pathlib.Path:
+        """Folder of the archive, scripts are extracted here without a python_folder"""
+        return self.archive_path.parent
+
+    def _read_metadata(self) -> None:
+        try:
+            self.mtime = Archive.open(self.archive_path).get_mtime(self.member)
+        except FileNotFoundError:
+            pass
+        else:
+            logging.debug(f"Archive member exists: {self.filepath}")
+            self.exists = True
+
+    def _read_text(self) -> str:
+        return Archive.open(self.archive_path).read(self.member).decode("utf-8")
+
+    def _lock_folder(self) -> None:
+        # Graphs in archives are never written:
+        pass
+
+    def _changed_on_disk(self) -> bool:
+        return False
+
+    def _write_file(self) -> None:
+        raise self.Error("Graphs in archives cannot be written!", self)
+
+
 class PythonFile(File):
     """A Python file, subclass of File()"""
 
-    code: list[str]
-    """The python code. Lines as list items, without newlines."""
+    __slots__ = ("code_text", "header_data", "text")
+
+    code_text: str
+    """The python code as a single string, with CRLF line endings, like in Dynamo graphs."""
     header_data: dict
     """Parsed dict from the header of a python file."""
     text: str
     """Full contents of the file."""
 
+    source_dynamo_files: dict[pathlib.Path, DynamoFile] = {}
+    """Source graphs by their resolved path. Only valid while the graph is in open_files"""
+
     def __init__(self,
                  filepath: pathlib.Path | str,
                  dynamo_file: DynamoFile | None = None,
-                 python_node: PythonNode | None = None
+                 python_node: PythonNode | None = None,
+                 deterministic: bool = False,
+                 read_from_disk: bool = True
                  ) -> None:
         """Generate a PythonFile. If both dynamo_file and python_node given, generate the text of the file, do not read from disk
 
@@ -474,6 +1058,9 @@ class PythonFile(File):
             filepath (pathlib.Path | str): Path to the python file
             dynamo_file (DynamoFile | None, optional): The source dynamo file. Defaults to None.
             python_node (PythonNode | None, optional): The python node to write. Defaults to None.
+            deterministic (bool, optional): Leave out volatile header fields,
+                and only mark as modified if the text differs from the existing file. Defaults to False.
+            read_from_disk (bool, optional): Read the file from disk. False to get only metadata. Defaults to True.
         """
 
         # Generate the text, if dynamo file and python node were given:
@@ -486,23 +1073,22 @@ class PythonFile(File):
                 "Do not edit this section, if you want to update the Dynamo graph!"
             ])
 
-            # Calculate relative path, change to forward slash
-            dyn_path_string = os.path.relpath(
-                dynamo_file.filepath, self.dirpath)
-            if "\\" in dyn_path_string:
-                dyn_path_string = dyn_path_string.replace("\\", "/")
-
             self.header_data = {
                 "dyn2py_version": METADATA["Version"],
                 "dyn2py_extracted": datetime.now().isoformat(),
                 "dyn_uuid": dynamo_file.uuid,
                 "dyn_name": dynamo_file.name,
-                "dyn_path": dyn_path_string,
+                "dyn_path": self._relative_dyn_path(dynamo_file.filepath),
                 "dyn_modified": dynamo_file.mtimeiso,
                 "py_id": python_node.id,
                 "py_engine": python_node.engine
             }
 
+            if deterministic:
+                # Leave out fields changing on every extraction:
+                for key in VOLATILE_HEADER_KEYS:
+                    del self.header_data[key]
+
             header_string = os.linesep.join(
                 [f"{k}:{self.header_data[k]}" for k in self.header_data])
             header_wrapper = '"""'
@@ -515,18 +1101,56 @@ class PythonFile(File):
                 header_string,
                 HEADER_SEPARATOR,
                 header_wrapper,
-                os.linesep.join(python_node.code)
+                translate_newlines(python_node.code_text,
+                                   DYNAMO_NEWLINE, os.linesep)
             ])
 
-            self.code = python_node.code
-            self.modified = True
+            self.code_text = python_node.code_text
+
+            # Compare with the existing file, only write if it's changed:
+            if deterministic and self.exists:
+                with open(self.filepath, mode="r", newline="", encoding="utf-8") as input_py:
+                    self.modified = input_py.read() != self.text
+            else:
+                self.modified = True
 
         else:
             # Try to read from disk:
-            super().__init__(filepath, read_from_disk=True)
+            super().__init__(filepath, read_from_disk=read_from_disk)
+
+            # Only metadata was requested, do not open:
+            if not read_from_disk:
+                return
 
         self.open_files.add(self)
 
+    @classmethod
+    def from_shared_code(cls, filepath: pathlib.Path, python_node: PythonNode) -> PythonFile:
+        """Generate a shared script of deduplicated extraction, with only the code of the node, without header.
+            It's only marked as modified if the text differs from the existing file
+
+        Args:
+            filepath (pathlib.Path): Path to the python file
+            python_node (PythonNode): The python node to write
+
+        Returns:
+            PythonFile: The new python file
+        """
+        python_file = cls(filepath, read_from_disk=False)
+        python_file.header_data = {}
+        python_file.code_text = python_node.code_text
+        python_file.text = translate_newlines(
+            python_node.code_text, DYNAMO_NEWLINE, os.linesep)
+
+        if python_file.exists:
+            with open(filepath, mode="r", newline="", encoding="utf-8") as input_py:
+                python_file.modified = input_py.read() != python_file.text
+        else:
+            python_file.modified = True
+
+        cls.open_files.add(python_file)
+        return python_file
+
     def read_file(self, reread: bool = False) -> None:
         """Read python script to parameters
 
@@ -544,40 +1168,83 @@ class PythonFile(File):
         if not self in self.open_files or reread:
 
             logging.info(f"Reading file: {self.filepath}")
-            with open(self.filepath, mode="r", newline="", encoding="utf-8") as input_py:
-                python_lines = [line.strip("\r\n")
-                                for line in input_py.readlines()]
-
-            self.text = os.linesep.join(python_lines)
-            self.header_data = {}
-            header_separator_count = 0
-            code_start_line = 0
+            # Universal newlines mode, every line ending is \n after reading:
+            with STATS.timer("read"):
+                if FS_CACHE.enabled:
+                    text = decode_text(FS_CACHE.read_bytes(self.filepath))
+                else:
+                    with open(self.filepath, mode="r", encoding="utf-8") as input_py:
+                        text = input_py.read()
+                        if STATS.enabled:
+                            STATS.count("bytes_read", input_py.buffer.tell())
+            STATS.count("python_files_read")
 
-            for i, line in enumerate(python_lines):
-                logging.debug(f"Reading line: {line}")
+            self.text = translate_newlines(text, "\n", os.linesep)
 
-                # Skip the first lines:
-                if header_separator_count < 2:
-                    if line == HEADER_SEPARATOR:
-                        header_separator_count += 1
-                    continue
-                # It's the last line of the header:
-                elif line == HEADER_SEPARATOR:
-                    code_start_line = i+2
-                    break
+            with STATS.timer("parse_header"):
+                code_start = self._parse_header(text)
 
-                else:
-                    # Find the location of the separator
-                    sl = line.find(":")
-                    if sl == -1:
-                        raise self.Error("Error reading header!", self)
-                    self.header_data[line[0:sl]] = line[sl+1:]
+            code = text[code_start:]
+            # The newline at the end of the last line is not part of the code:
+            if code.endswith("\n"):
+                code = code[:-1]
 
-            self.code = python_lines[code_start_line:]
+            self.code_text = translate_newlines(code, "\n", DYNAMO_NEWLINE)
             self.open_files.add(self)
 
             logging.debug(f"Header data from python file: {self.header_data}")
-            # logging.debug(f"Code from python file: {self.code}")
+
+        else:
+            STATS.count("cache_hits")
+
+    def _parse_header(self, text: str) -> int:
+        """Parse the header of the python script to header_data
+
+        Args:
+            text (str): The contents of the file, with \\n line endings
+
+        Raises:
+            PythonFile.Error: Invalid line in the header
+
+        Returns:
+            int: The position where the code starts in text
+        """
+        self.header_data = {}
+        header_separator_count = 0
+        line_start = 0
+
+        # Only the lines of the header are sliced from the text:
+        while True:
+            line_end = text.find("\n", line_start)
+            if line_end == -1:
+                break
+            line = text[line_start:line_end]
+            line_start = line_end + 1
+
+            # Skip the first lines:
+            if header_separator_count < 2:
+                if line == HEADER_SEPARATOR:
+                    header_separator_count += 1
+                continue
+            # It's the last line of the header, skip the closing quotes too:
+            elif line == HEADER_SEPARATOR:
+                wrapper_end = text.find("\n", line_start)
+                return len(text) if wrapper_end == -1 else wrapper_end + 1
+
+            else:
+                # Find the location of the separator
+                sl = line.find(":")
+                if sl == -1:
+                    raise self.Error("Error reading header!", self)
+                self.header_data[line[0:sl]] = line[sl+1:]
+
+        # No header, everything is code:
+        return 0
+
+    @property
+    def code(self) -> list[str]:
+        """The python code. Lines as list items, without newlines. Generated from code_text on every call."""
+        return self.code_text.split(DYNAMO_NEWLINE)
 
     def update_dynamo(self, options: Options | None = None, **option_args) -> None:
         """Update a the source Dynamo graph from this python script
@@ -588,90 +1255,289 @@ class PythonFile(File):
 
         Raises:
             ValueError: Both options and other arguments given
+            PythonFile.Error: No header, and not a shared script of the manifest
 
         """
 
         if not options:
-            options = Options.from_kwargs(kwargs=option_args)
+            options = Options.from_kwargs(**option_args)
         elif option_args:
             # Should not give both options and arguments:
             raise ValueError("Options object and extra arguments!")
 
-        dynamo_file = self.get_source_dynamo_file()
+        # Shared scripts of deduplicated extraction have no header:
+        if "dyn_uuid" not in self.header_data:
+            self._update_shared_dynamo(options)
+            return
 
-        new_python_node = PythonNode(python_file=self)
+        self._update_node(options, SyncState.get_base(self.filepath), record_sync=True)
 
-        old_python_node = dynamo_file.get_python_node_by_id(
-            self.header_data["py_id"])
+    def _update_node(self, options: Options, base: str | None, record_sync: bool) -> None:
+        """Update the node of the header in the source graph. The script and the node are compared with
+            the code they last had in common, like a three-way merge. Modification times are compared
+            only if it is not known
 
-        # Check checksum:
-        if new_python_node.checksum == old_python_node.checksum:
-            logging.info("Python file not changed, skipping")
+        Args:
+            options (Options): Run options
+            base (str | None): Checksum of the last synchronized code. None if it's not known
+            record_sync (bool): Record the synchronized code in the sync state of the folder
+        """
+        # The name is not in the header, it's checked after the graph is read:
+        if not options.selects_node(self.header_data["py_id"], self.header_data["py_engine"]):
+            logging.info("Node not selected, skipping")
+            events.emit("skipped", self.filepath, "not_selected")
             return
 
-        if dynamo_file.is_newer(self) and not options.force:
-            logging.info("Dynamo graph is newer, skipping")
+        dynamo_file = self.get_source_dynamo_file(options)
+
+        with STATS.timer("update"):
+            new_python_node = PythonNode(python_file=self)
+
+            old_python_node = dynamo_file.get_python_node_by_id(
+                self.header_data["py_id"])
+
+            if not options.selects_node(old_python_node.id, old_python_node.engine, old_python_node.name):
+                logging.info("Node not selected, skipping")
+                events.emit("skipped", self.filepath, "not_selected")
+                return
+
+            # Check checksum:
+            if new_python_node.checksum == old_python_node.checksum:
+                if record_sync:
+                    SyncState.record(self.filepath, new_python_node.checksum)
+                logging.info("Python file not changed, skipping")
+                events.emit("skipped", self.filepath, "unchanged")
+                return
+
+            if base is None:
+                if dynamo_file.is_newer(self) and not options.force:
+                    logging.info("Dynamo graph is newer, skipping")
+                    events.emit("skipped", self.filepath, "newer")
+                    return
+            elif not options.force:
+                if new_python_node.checksum == base:
+                    logging.info("Only the Dynamo graph changed since the last sync, skipping")
+                    events.emit("skipped", self.filepath, "newer")
+                    return
+                elif old_python_node.checksum != base:
+                    logging.warning(
+                        f"Both the script and the node changed since the last sync, skipping: {self.filepath}")
+                    events.emit("failed", self.filepath, "conflict")
+                    return
+
+            if dynamo_file.read_only:
+                logging.warning(
+                    f"Dynamo graph is read-only, skipping: {dynamo_file.filepath}")
+                events.emit("skipped", self.filepath, "read_only")
+                return
+
+            logging.info(
+                f"Dynamo graph will be updated: {dynamo_file.filepath}")
+            dynamo_file.update_python_node(new_python_node)
+            if record_sync:
+                dynamo_file.sync_records.append((self.filepath, new_python_node.checksum))
+
+    def _update_shared_dynamo(self, options: Options) -> None:
+        """Update every node using this shared script, listed in the manifest of the folder
+
+        Args:
+            options (Options): Run options
+
+        Raises:
+            PythonFile.Error: The script is not in the manifest
+        """
+        manifest = Manifest.for_folder(self.dirpath, strict=options.dedup)
+        shared_script = manifest.get_script(self.filepath.name)
+        if not shared_script:
+            raise self.Error("No header and not in the manifest!", self)
+
+        checksum = code_checksum(self.code_text)
+        if checksum == shared_script.checksum:
+            logging.info("Shared python file not changed, skipping")
+            events.emit("skipped", self.filepath, "unchanged")
             return
 
-        logging.info(f"Dynamo graph will be updated: {dynamo_file.filepath}")
-        dynamo_file.update_python_node(new_python_node)
+        synced = True
+        try:
+            for node in shared_script.nodes:
+                self.header_data = node.to_dict()
+                try:
+                    # The manifest has the last synchronized code:
+                    self._update_node(options, shared_script.checksum, record_sync=False)
+                    dynamo_file = self.get_source_dynamo_file(options)
+                    # Skipped graphs are updated again next time:
+                    if dynamo_file.get_python_node_by_id(node.py_id).checksum != checksum:
+                        synced = False
+                except FileNotFoundError:
+                    logging.error(
+                        f"{self.filepath} Source Dynamo file not found: {node.dyn_path}")
+                    events.emit("failed", self.filepath, "source_not_found")
+                    synced = False
+                except DynamoFile.PythonNodeNotFound:
+                    # The other graphs are still updated:
+                    logging.error(
+                        f"{self.filepath} Python node not found: {node.dyn_path} {node.py_id}")
+                    events.emit("failed", self.filepath, "source_not_found")
+                    synced = False
+        finally:
+            self.header_data = {}
+
+        if synced:
+            manifest.set_checksum(shared_script.filename, checksum)
+
+    def _relative_dyn_path(self, dynamo_path: pathlib.Path) -> str:
+        """Get the path of a graph relative to this file, for the header
+
+        Args:
+            dynamo_path (pathlib.Path): Path to the graph
+
+        Returns:
+            str: The relative path, with forward slashes
+        """
+        return relative_posix_path(dynamo_path, self.dirpath)
+
+    def get_source_dynamo_path(self, options: Options | None = None, **option_args) -> pathlib.Path:
+        """Get the current path of the source Dynamo graph. If the graph is not at dyn_path anymore,
+            search for it by its uuid in the graph_root folders
+
+        Args:
+            options (Options | None, optional): Run options. Defaults to None.
+            **option_args: Options() arguments
+
+        Raises:
+            ValueError: Both options and other arguments given
+
+        Returns:
+            pathlib.Path: The resolved path. The graph might not be there, if it was not found
+        """
+        if not options:
+            options = Options.from_kwargs(**option_args)
+        elif option_args:
+            # Should not give both options and arguments:
+            raise ValueError("Options object and extra arguments!")
+
+        dyn_uuid = self.header_data["dyn_uuid"]
+        dynpath = resolve_path(os.path.abspath(self.dirpath),
+                               self.header_data["dyn_path"])
+
+        if options.graph_root and scan_uuid(dynpath) != dyn_uuid:
+            moved_paths = GraphIndex.for_roots(
+                options.graph_root, DYNAMO_EXTENSIONS).find(dyn_uuid)
+            if moved_paths:
+                if len(moved_paths) > 1:
+                    logging.warning(
+                        f"Multiple graphs with the same uuid, using the first one: {', '.join(map(str, moved_paths))}")
+                logging.info(
+                    f"Source graph was moved: {dynpath} -> {moved_paths[0]}")
+                dynpath = moved_paths[0]
 
-    def get_source_dynamo_file(self) -> DynamoFile:
+        return dynpath
+
+    def get_source_dynamo_file(self, options: Options | None = None, **option_args) -> DynamoFile:
         """Get the source Dynamo file of this PythonFile
 
+        Args:
+            options (Options | None, optional): Run options. Defaults to None.
+            **option_args: Options() arguments
+
         Raises:
+            ValueError: Both options and other arguments given
             DynamoFile.Error: The uuid of the dynamo file changed
 
         Returns:
             DynamoFile: The DynamoFile
         """
+        if not options:
+            options = Options.from_kwargs(**option_args)
+        elif option_args:
+            # Should not give both options and arguments:
+            raise ValueError("Options object and extra arguments!")
+
+        dyn_uuid = self.header_data["dyn_uuid"]
+        dynpath = resolve_path(os.path.abspath(self.dirpath),
+                               self.header_data["dyn_path"])
+
+        # Scripts of the same graph share the lookup:
+        dynamo_file = self.source_dynamo_files.get(dynpath)
+        if dynamo_file and dynamo_file.uuid == dyn_uuid and dynamo_file in File.open_files:
+            STATS.count("cache_hits")
+            return dynamo_file
 
         # Check if it was already opened:
-        dynamo_file = DynamoFile.get_open_file_by_uuid(
-            self.header_data["dyn_uuid"])
+        dynamo_file = DynamoFile.get_open_file_by_uuid(dyn_uuid, dynpath)
 
         # Open if it's the first time:
         if not dynamo_file:
-
-            cwd = pathlib.Path(os.getcwd()).resolve()
-            # Change to pythonfiles' dir:
-            os.chdir(self.dirpath)
-
-            dynpath = os.path.realpath(self.header_data["dyn_path"])
             logging.debug(f"Resolved path: {dynpath}")
-
-            # Change back to the original path:
-            os.chdir(cwd)
-            dynamo_file = DynamoFile(pathlib.Path(dynpath))
+            dynamo_file = DynamoFile(self.get_source_dynamo_path(options))
 
             # Check if uuid is ok:
-            if not dynamo_file.uuid == self.header_data["dyn_uuid"]:
+            if not dynamo_file.uuid == dyn_uuid:
                 raise DynamoFile.Error(
                     "Dynamo graph uuid changed!", dynamo_file)
 
+        self.source_dynamo_files[dynpath] = dynamo_file
         return dynamo_file
 
+    def relink(self, options: Options | None = None, **option_args) -> bool:
+        """Point dyn_path in the header to the current path of the source graph, if it was moved.
+            The graph is searched in the graph_root folders, and it is not opened
+
+        Args:
+            options (Options | None, optional): Run options. Defaults to None.
+            **option_args: Options() arguments
+
+        Raises:
+            ValueError: Both options and other arguments given
+            FileNotFoundError: The source graph was not found
+
+        Returns:
+            bool: True if the header was changed
+        """
+        # Shared scripts of deduplicated extraction have no header:
+        if "dyn_uuid" not in self.header_data:
+            return False
+
+        dynpath = self.get_source_dynamo_path(options, **option_args)
+        if scan_uuid(dynpath) != self.header_data["dyn_uuid"]:
+            raise FileNotFoundError(f"Source graph not found: {dynpath}")
+
+        old_dyn_path = self.header_data["dyn_path"]
+        new_dyn_path = self._relative_dyn_path(dynpath)
+        if new_dyn_path == old_dyn_path:
+            return False
+
+        # The header is at the beginning of the text:
+        self.text = self.text.replace(
+            f"dyn_path:{old_dyn_path}", f"dyn_path:{new_dyn_path}", 1)
+        self.header_data["dyn_path"] = new_dyn_path
+        self.modified = True
+        logging.info(f"Relinked {self.filepath}: {new_dyn_path}")
+        return True
+
     def _write_file(self) -> None:
         """Write this file to the disk. Should be called only from File.write()"""
-        with open(self.filepath, "w", encoding="utf-8", newline="") as output_file:
-            output_file.write(self.text)
+        data = self.text.encode("utf-8")
+        with STATS.timer("write"):
+            write_atomic(self.filepath, data)
+        STATS.count("bytes_written", len(data))
 
 
 class PythonNode():
     """A Python node with all data"""
 
+    __slots__ = ("id", "engine", "code_text", "checksum", "name", "filepath")
+
     id: str
     """The id of the node"""
     engine: str
     """The engine of the node, IronPython2 or CPython3"""
-    code: list[str]
-    """The full code. Lines as list items, without newlines."""
+    code_text: str
+    """The full code as a single string, with CRLF line endings, like in Dynamo graphs."""
     checksum: str
     """The checksum of the code, for checking changes"""
     name: str
     """The name of the node"""
-    filename: pathlib.Path | str
-    """The filename the node should be saved as, including the .py extension"""
     filepath: pathlib.Path
     """The full path the node should be saved as"""
 
@@ -701,7 +1567,7 @@ class PythonNode():
                 self.engine = "IronPython2"
 
             # It's read from a dynamo file, so separator is always CRLF
-            self.code = node_dict_from_dyn["Code"].split("\r\n")
+            self.code_text = node_dict_from_dyn["Code"]
 
             # Get the name of the node:
             self.name = next(
@@ -709,24 +1575,17 @@ class PythonNode():
                  if v["Id"] == node_dict_from_dyn["Id"]), "")
 
             # Generate the filename:
-            filename_parts = [dynamo_file.basename, self.id]
-
-            # Only add the name of the node if it's changed:
-            if self.name and self.name != "Python Script":
-                filename_parts.append(self.name)
-
-            logging.debug(f"Generating filename from: {filename_parts}")
-            self.filename = sanitize_filename(
-                "_".join(filename_parts) + ".py")
-            self.filepath = dynamo_file.dirpath.joinpath(self.filename)
+            self.filepath = dynamo_file.dirpath.joinpath(
+                python_node_filename(dynamo_file.basename, self.id, self.name))
 
         # Initialize from a python file:
         elif python_file and not node_dict_from_dyn and not dynamo_file:
             self.id = python_file.header_data["py_id"]
             self.engine = python_file.header_data["py_engine"]
-            self.code = python_file.code
-            self.filename = python_file.basename + ".py"
+            self.code_text = python_file.code_text
             self.filepath = python_file.filepath
+            # The name is not in the header, it's set from the node it replaces:
+            self.name = ""
 
         elif python_file and node_dict_from_dyn and dynamo_file:
             raise self.Error("Too much arguments given!")
@@ -738,8 +1597,18 @@ class PythonNode():
             raise self.Error("Something wrong!")
 
         # Calculate checksum:
-        checksums = [hashlib.md5(l.encode()).hexdigest() for l in self.code]
-        self.checksum = hashlib.md5("".join(checksums).encode()).hexdigest()
+        with STATS.timer("checksum"):
+            self.checksum = code_checksum(self.code_text)
+
+    @property
+    def code(self) -> list[str]:
+        """The full code. Lines as list items, without newlines. Generated from code_text on every call."""
+        return self.code_text.split(DYNAMO_NEWLINE)
+
+    @property
+    def filename(self) -> str:
+        """The filename the node should be saved as, including the .py extension"""
+        return self.filepath.name
 
     class Error(Exception):
         """Something wrong with this node"""
@@ -0,0 +1,189 @@
+from __future__ import annotations
+import collections
+import io
+import os
+import pathlib
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from dyn2py.stats import STATS
+
+
+DEFAULT_IO_THREADS = 8
+"""Reader threads of the high-latency mode"""
+PREFETCH_PER_THREAD = 2
+"""Files read ahead for every reader thread"""
+
+
+def decode_text(data: bytes) -> str:
+    """Decode the content of a text file, like open() in text mode, with universal newlines
+
+    Args:
+        data (bytes): The content of the file
+
+    Returns:
+        str: The text, every line ending is \\n
+    """
+    return io.TextIOWrapper(io.BytesIO(data), encoding="utf-8").read()
+
+
+def read_whole_file(filepath: str) -> bytes:
+    """Read a file with a single large read, without buffering
+
+    Args:
+        filepath (str): Path to the file
+
+    Returns:
+        bytes: The content
+    """
+    with open(filepath, "rb", buffering=0) as input_file:
+        return input_file.readall()
+
+
+class FileSystemCache():
+    """Metadata and contents of files for the length of a run, for high-latency storage, like network shares.
+        Does nothing while disabled"""
+
+    def __init__(self) -> None:
+        self.enabled: bool = False
+        """If metadata is cached and files are read ahead"""
+        self.io_threads: int = 0
+        """Number of reader threads"""
+        self._stats: dict[str, os.stat_result | None] = {}
+        self._pending: collections.deque[str] = collections.deque()
+        self._reads: dict[str, Future[bytes]] = {}
+        self._read_keys: set[str] = set()
+        self._executor: ThreadPoolExecutor | None = None
+
+    def start(self, io_threads: int = DEFAULT_IO_THREADS) -> None:
+        """Enable caching, start the reader threads
+
+        Args:
+            io_threads (int, optional): Number of reader threads. Defaults to DEFAULT_IO_THREADS.
+        """
+        self.stop()
+        self.enabled = True
+        self.io_threads = io_threads
+        self._executor = ThreadPoolExecutor(
+            max_workers=io_threads, thread_name_prefix="dyn2py-reader")
+
+    def stop(self) -> None:
+        """Disable caching, stop the reader threads and forget everything"""
+        if self._executor:
+            for future in self._reads.values():
+                future.cancel()
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.enabled = False
+        self._stats.clear()
+        self._pending.clear()
+        self._reads.clear()
+        self._read_keys.clear()
+
+    def stat(self, filepath: pathlib.Path) -> os.stat_result | None:
+        """Get the metadata of a file, cached in the high-latency mode
+
+        Args:
+            filepath (pathlib.Path): Path to the file
+
+        Returns:
+            os.stat_result | None: The metadata. None, if the file does not exist
+        """
+        key = os.fspath(filepath)
+        if self.enabled and key in self._stats:
+            STATS.count("stat_cache_hits")
+            return self._stats[key]
+
+        STATS.count("stat_calls")
+        try:
+            stat_result = os.stat(key)
+        except (FileNotFoundError, NotADirectoryError):
+            stat_result = None
+        if self.enabled:
+            self._stats[key] = stat_result
+        return stat_result
+
+    def list_folder(self, folder: pathlib.Path) -> list[pathlib.Path]:
+        """List a folder. In the high-latency mode, the metadata of the files is cached from the same scandir call
+
+        Args:
+            folder (pathlib.Path): The folder
+
+        Returns:
+            list[pathlib.Path]: Paths of the entries
+        """
+        paths = []
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                path = folder.joinpath(entry.name)
+                paths.append(path)
+                if self.enabled:
+                    try:
+                        # Free on Windows, a single call elsewhere:
+                        self._stats[os.fspath(path)] = entry.stat()
+                    except OSError:
+                        pass
+        STATS.count("folders_listed")
+        return paths
+
+    def invalidate(self, filepath: pathlib.Path) -> None:
+        """Forget a file, after it was written, renamed or deleted
+
+        Args:
+            filepath (pathlib.Path): Path to the file
+        """
+        key = os.fspath(filepath)
+        self._stats.pop(key, None)
+        future = self._reads.pop(key, None)
+        if future:
+            future.cancel()
+
+    def prefetch(self, filepaths: list[pathlib.Path]) -> None:
+        """Read files ahead on the reader threads, in this order. Only a few files are kept in memory
+
+        Args:
+            filepaths (list[pathlib.Path]): The files to read
+        """
+        if not self.enabled:
+            return
+        self._pending.extend(os.fspath(f) for f in filepaths)
+        self._fill()
+
+    def _fill(self) -> None:
+        """Start reading the next pending files, if there are free slots"""
+        if not self._executor:
+            return
+        while self._pending and len(self._reads) < self.io_threads * PREFETCH_PER_THREAD:
+            key = self._pending.popleft()
+            if key not in self._reads and key not in self._read_keys:
+                self._reads[key] = self._executor.submit(read_whole_file, key)
+
+    def read_bytes(self, filepath: pathlib.Path) -> bytes:
+        """Read a file, from the read ahead files if it's there
+
+        Args:
+            filepath (pathlib.Path): Path to the file
+
+        Raises:
+            OSError: The file cannot be read
+
+        Returns:
+            bytes: The content
+        """
+        key = os.fspath(filepath)
+        if self.enabled:
+            self._read_keys.add(key)
+        future = self._reads.pop(key, None)
+        if future:
+            STATS.count("prefetch_hits")
+            try:
+                data = future.result()
+            finally:
+                self._fill()
+        else:
+            data = read_whole_file(key)
+        STATS.count("bytes_read", len(data))
+        return data
+
+
+FS_CACHE = FileSystemCache()
+"""The shared cache, enabled by run() in the high-latency mode"""
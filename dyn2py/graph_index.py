@@ -0,0 +1,191 @@
+from __future__ import annotations
+import json
+import logging
+import os
+import pathlib
+import re
+
+from dyn2py.stats import STATS
+
+
+GRAPH_INDEX_FILENAME = ".dyn2py_index.json"
+"""Name of the index cache file in every root folder"""
+GRAPH_INDEX_VERSION = 1
+HEAD_SIZE = 4096
+"""Bytes read from the beginning of graphs, the Uuid is the first field in Dynamo 2 graphs"""
+
+_UUID_PATTERN = re.compile(rb'"Uuid"\s*:\s*"([0-9a-fA-F-]{36})"')
+
+
+def scan_uuid(filepath: pathlib.Path) -> str | None:
+    """Read the uuid of a graph from the beginning of the file, without parsing it
+
+    Args:
+        filepath (pathlib.Path): Path to the graph
+
+    Returns:
+        str | None: The uuid. None, if the file does not exist, or it is not a Dynamo 2 graph
+    """
+    try:
+        with open(filepath, "rb") as graph_file:
+            head = graph_file.read(HEAD_SIZE)
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+        return None
+
+    STATS.count("bytes_read", len(head))
+    match = _UUID_PATTERN.search(head)
+    return match.group(1).decode("ascii") if match else None
+
+
+class GraphIndex():
+    """Uuid to path index of the graphs in root folders, cached by modification time"""
+
+    indexes: dict[tuple[pathlib.Path, ...], GraphIndex] = {}
+    """Indexes by their roots, shared in the process"""
+
+    def __init__(self, roots: list[pathlib.Path], extensions: list[str]) -> None:
+        """Generate an index. Call update() to scan the roots
+
+        Args:
+            roots (list[pathlib.Path]): Folders to search graphs in, recursively
+            extensions (list[str]): Extensions of graphs
+        """
+        self.roots: list[pathlib.Path] = [r.resolve() for r in roots]
+        """Folders to search graphs in, recursively"""
+        self.extensions: tuple[str, ...] = tuple(extensions)
+        """Extensions of graphs"""
+        self.entries: dict[pathlib.Path, tuple[float, int, str | None]] = {}
+        """Modification time, size and uuid by the path of every graph"""
+        self.uuids: dict[str, list[pathlib.Path]] = {}
+        """Paths of graphs by their uuid"""
+        self.updated: bool = False
+        """If the roots were scanned"""
+
+    @classmethod
+    def for_roots(cls, roots: list[pathlib.Path], extensions: list[str]) -> GraphIndex:
+        """Get the shared index of the roots, create it if it's the first time
+
+        Args:
+            roots (list[pathlib.Path]): Folders to search graphs in, recursively
+            extensions (list[str]): Extensions of graphs
+
+        Returns:
+            GraphIndex: The index
+        """
+        key = tuple(r.resolve() for r in roots)
+        if key not in cls.indexes:
+            cls.indexes[key] = cls(roots, extensions)
+        return cls.indexes[key]
+
+    def update(self) -> None:
+        """Scan the roots. Only read the graphs that changed since the last scan,
+            or since the cache file was saved"""
+        with STATS.timer("index"):
+            for root in self.roots:
+                self._update_root(root)
+
+            self.uuids = {}
+            for path, (_, _, uuid) in sorted(self.entries.items()):
+                if uuid:
+                    self.uuids.setdefault(uuid, []).append(path)
+            self.updated = True
+
+    def _update_root(self, root: pathlib.Path) -> None:
+        """Scan a root folder, and save its cache file
+
+        Args:
+            root (pathlib.Path): The root folder
+        """
+        cached = self._load_cache(root)
+        if not self.updated:
+            self.entries.update(cached)
+
+        root_entries = {}
+        for dirpath, dirnames, filenames in os.walk(root):
+            # Skip hidden folders, like .git:
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for filename in filenames:
+                if not filename.endswith(self.extensions):
+                    continue
+                path = pathlib.Path(dirpath, filename)
+                try:
+                    stat_result = path.stat()
+                except OSError:
+                    continue
+
+                entry = self.entries.get(path)
+                if not entry or entry[0] != stat_result.st_mtime or entry[1] != stat_result.st_size:
+                    STATS.count("index_scanned")
+                    entry = (stat_result.st_mtime, stat_result.st_size,
+                             scan_uuid(path))
+                else:
+                    STATS.count("index_cache_hits")
+                root_entries[path] = entry
+
+        # Forget the deleted graphs of this root:
+        for path in [p for p in self.entries if root in p.parents]:
+            del self.entries[path]
+        self.entries.update(root_entries)
+
+        if root_entries != cached:
+            self._save_cache(root, root_entries)
+
+    def _load_cache(self, root: pathlib.Path) -> dict[pathlib.Path, tuple[float, int, str | None]]:
+        """Read the cache file of a root
+
+        Args:
+            root (pathlib.Path): The root folder
+
+        Returns:
+            dict[pathlib.Path, tuple[float, int, str | None]]: Entries of the root. Empty, if there is no valid cache
+        """
+        try:
+            with open(root.joinpath(GRAPH_INDEX_FILENAME), "r", encoding="utf-8") as cache_file:
+                cache = json.load(cache_file)
+            if cache.get("version") != GRAPH_INDEX_VERSION:
+                return {}
+            return {root.joinpath(p): (e[0], e[1], e[2]) for p, e in cache["graphs"].items()}
+        except (OSError, ValueError, KeyError, TypeError, IndexError):
+            return {}
+
+    def _save_cache(self, root: pathlib.Path, entries: dict[pathlib.Path, tuple[float, int, str | None]]) -> None:
+        """Save the cache file of a root, if the folder is writable
+
+        Args:
+            root (pathlib.Path): The root folder
+            entries (dict[pathlib.Path, tuple[float, int, str | None]]): Entries of the root
+        """
+        cache = {
+            "version": GRAPH_INDEX_VERSION,
+            "graphs": {p.relative_to(root).as_posix(): list(e) for p, e in entries.items()}
+        }
+        cache_path = root.joinpath(GRAPH_INDEX_FILENAME)
+        temp_path = cache_path.with_name(f".{cache_path.name}.tmp")
+        try:
+            with open(temp_path, "w", encoding="utf-8", newline="\n") as cache_file:
+                json.dump(cache, cache_file, indent=1)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            logging.debug(f"Cannot save graph index: {cache_path} {e}")
+
+    def find(self, uuid: str) -> list[pathlib.Path]:
+        """Get the current paths of a graph. Scans the roots on the first call,
+            and again if the graph was moved since then
+
+        Args:
+            uuid (str): Uuid of the graph
+
+        Returns:
+            list[pathlib.Path]: Paths of the graphs with this uuid, empty if not found
+        """
+        if not self.updated:
+            self.update()
+
+        indexed_paths = self.uuids.get(uuid, [])
+        paths = [p for p in indexed_paths if scan_uuid(p) == uuid]
+        if indexed_paths and not paths:
+            # It was moved again after the last scan:
+            self.update()
+            paths = list(self.uuids.get(uuid, []))
+
+        return paths
@@ -0,0 +1,344 @@
+from __future__ import annotations
+import copy
+import logging
+import os
+import pathlib
+import subprocess
+from datetime import datetime
+from typing import IO, Iterator
+
+from dyn2py.files import DynamoFile, File, PythonNode, DYNAMO_EXTENSIONS, DYNAMO_NEWLINE, translate_newlines
+from dyn2py.stats import STATS
+
+
+class GitObjectReader():
+    """Reads objects of a git repository through a single git cat-file --batch process"""
+
+    def __init__(self, repo: pathlib.Path) -> None:
+        """Start the git process
+
+        Args:
+            repo (pathlib.Path): A folder in the repository
+        """
+        self.repo: pathlib.Path = repo
+        """A folder in the repository"""
+        self._process = subprocess.Popen(
+            ["git", "-C", str(repo), "cat-file", "--batch"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._stdin: IO[bytes] = self._process.stdin  # type: ignore
+        self._stdout: IO[bytes] = self._process.stdout  # type: ignore
+
+    def read(self, object_name: str) -> tuple[str, bytes]:
+        """Read an object
+
+        Args:
+            object_name (str): Hash of the object, or any name git understands
+
+        Raises:
+            KeyError: The object does not exist
+
+        Returns:
+            tuple[str, bytes]: Type and content of the object
+        """
+        self._stdin.write(object_name.encode("utf-8") + b"\n")
+        self._stdin.flush()
+
+        header = self._stdout.readline().decode("utf-8").split()
+        if len(header) != 3:
+            raise KeyError(f"Git object not found: {object_name}")
+        object_type, size = header[1], int(header[2])
+        data = self._stdout.read(size)
+        # Every object ends with a newline:
+        self._stdout.read(1)
+        STATS.count("bytes_read", size)
+        return object_type, data
+
+    def close(self) -> None:
+        """Stop the git process"""
+        self._stdin.close()
+        self._stdout.close()
+        self._process.wait()
+
+    def __enter__(self) -> GitObjectReader:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class GitBlobDynamoFile(DynamoFile):
+    """A Dynamo graph read from a git blob, only in memory. Subclass of DynamoFile()"""
+
+    __slots__ = ("data",)
+
+    read_only = True
+
+    def __init__(self, filepath: pathlib.Path | str, data: bytes, mtime: float = 0.0) -> None:
+        """Parse a graph from the content of a git blob
+
+        Args:
+            filepath (pathlib.Path | str): Path of the graph in the repository
+            data (bytes): Content of the blob
+            mtime (float, optional): Time of the commit. Defaults to 0.0.
+        """
+        self.data: bytes = data
+        """Content of the blob"""
+        super().__init__(filepath)
+        self.mtime = mtime
+
+    def _read_metadata(self) -> None:
+        self.exists = True
+
+    def _read_text(self) -> str:
+        return self.data.decode("utf-8")
+
+    def _write_file(self) -> None:
+        raise self.Error("Graphs in git history cannot be written!", self)
+
+
+class NodeVersion():
+    """The code of a python node at a commit"""
+
+    __slots__ = ("commit", "time", "dyn_uuid", "dyn_name", "dyn_path", "py_id", "py_name", "py_engine",
+                 "checksum", "code_text")
+
+    def __init__(self, commit: str, time: float, dynamo_file: DynamoFile, python_node: PythonNode) -> None:
+        """Generate a node version
+
+        Args:
+            commit (str): Hash of the commit
+            time (float): Time of the commit, as a timestamp
+            dynamo_file (DynamoFile): The graph at this commit
+            python_node (PythonNode): The node
+        """
+        self.commit: str = commit
+        """Hash of the commit"""
+        self.time: float = time
+        """Time of the commit, as a timestamp"""
+        self.dyn_uuid: str = dynamo_file.uuid
+        """Uuid of the graph"""
+        self.dyn_name: str = dynamo_file.name
+        """Name of the graph"""
+        self.dyn_path: str = dynamo_file.filepath.as_posix()
+        """Path of the graph in the repository"""
+        self.py_id: str = python_node.id
+        """Id of the node"""
+        self.py_name: str = python_node.name
+        """Name of the node"""
+        self.py_engine: str = python_node.engine
+        """Engine of the node"""
+        self.checksum: str = python_node.checksum
+        """Checksum of the code"""
+        self.code_text: str = python_node.code_text
+        """The code, with CRLF line endings, like in Dynamo graphs"""
+
+    def at_commit(self, commit: str, time: float, dyn_path: str) -> NodeVersion:
+        """Get the same version at an other commit, for graph blobs that are read only once
+
+        Args:
+            commit (str): Hash of the commit
+            time (float): Time of the commit, as a timestamp
+            dyn_path (str): Path of the graph in the repository
+
+        Returns:
+            NodeVersion: The copy
+        """
+        version = copy.copy(self)
+        version.commit = commit
+        version.time = time
+        version.dyn_path = dyn_path
+        return version
+
+    def to_dict(self) -> dict:
+        """Get the version as a json serializable dict
+
+        Returns:
+            dict: The version, the code with \\n line endings
+        """
+        return {
+            "commit": self.commit,
+            "time": datetime.fromtimestamp(self.time).isoformat(),
+            "dyn_uuid": self.dyn_uuid,
+            "dyn_name": self.dyn_name,
+            "dyn_path": self.dyn_path,
+            "py_id": self.py_id,
+            "py_name": self.py_name,
+            "py_engine": self.py_engine,
+            "checksum": self.checksum,
+            "code": translate_newlines(self.code_text, DYNAMO_NEWLINE, "\n")
+        }
+
+
+class GitHistory():
+    """Versions of python nodes in the history of a git repository"""
+
+    def __init__(self, paths: list[pathlib.Path], revision: str = "HEAD") -> None:
+        """Generate a history reader. Call iter_node_versions() to read it
+
+        Args:
+            paths (list[pathlib.Path]): Graphs or folders in the same repository
+            revision (str, optional): Revision or range to walk, like in git rev-list. Defaults to "HEAD".
+
+        Raises:
+            ValueError: No paths given
+            subprocess.CalledProcessError: Not a git repository
+        """
+        if not paths:
+            raise ValueError("No paths given!")
+
+        first_path = paths[0].resolve()
+        folder = first_path if first_path.is_dir() else first_path.parent
+        self.repo: pathlib.Path = pathlib.Path(self._git(folder, "rev-parse", "--show-toplevel").strip())
+        """Root of the repository"""
+        self.revision: str = revision
+        """Revision or range to walk"""
+        self.pathspecs: list[str] = []
+        """Paths to read, relative to the root of the repository. Empty to read everything"""
+        for path in paths:
+            pathspec = pathlib.Path(os.path.relpath(path.resolve(), self.repo)).as_posix()
+            if pathspec == ".":
+                self.pathspecs = []
+                break
+            self.pathspecs.append(pathspec)
+
+        self._trees: dict[tuple[str, str], list[tuple[str, str]]] = {}
+
+    @staticmethod
+    def _git(folder: pathlib.Path, *args: str) -> str:
+        """Run a git command
+
+        Args:
+            folder (pathlib.Path): A folder in the repository
+            *args (str): Arguments of git
+
+        Returns:
+            str: The output
+        """
+        return subprocess.run(["git", "-C", str(folder), *args],
+                              check=True, capture_output=True, text=True).stdout
+
+    def _in_pathspecs(self, path: str, is_tree: bool) -> bool:
+        """Check if a path should be read
+
+        Args:
+            path (str): Path in the repository
+            is_tree (bool): It's a folder, check if it contains any of the paths
+
+        Returns:
+            bool: True if it should be read
+        """
+        if not self.pathspecs:
+            return True
+        for pathspec in self.pathspecs:
+            if path == pathspec or path.startswith(pathspec + "/"):
+                return True
+            if is_tree and pathspec.startswith(path + "/"):
+                return True
+        return False
+
+    def _list_graphs(self, reader: GitObjectReader, tree: str, prefix: str) -> list[tuple[str, str]]:
+        """List the graphs of a tree. Trees are cached, unchanged folders are read only once
+
+        Args:
+            reader (GitObjectReader): The object reader
+            tree (str): Hash of the tree
+            prefix (str): Path of the tree in the repository, with a trailing slash
+
+        Returns:
+            list[tuple[str, str]]: Paths and blob hashes of the graphs
+        """
+        key = (tree, prefix)
+        if key in self._trees:
+            return self._trees[key]
+
+        _, data = reader.read(tree)
+        hash_length = len(tree) // 2
+        graphs = []
+        position = 0
+        while position < len(data):
+            # Entries are: <mode> <name>\0<binary hash>
+            name_end = data.index(b"\0", position)
+            mode, name = data[position:name_end].split(b" ", 1)
+            object_hash = data[name_end + 1:name_end + 1 + hash_length].hex()
+            position = name_end + 1 + hash_length
+
+            path = prefix + name.decode("utf-8", "surrogateescape")
+            if mode == b"40000":
+                if self._in_pathspecs(path, True):
+                    graphs.extend(self._list_graphs(reader, object_hash, path + "/"))
+            elif os.path.splitext(path)[1] in DYNAMO_EXTENSIONS and self._in_pathspecs(path, False):
+                graphs.append((path, object_hash))
+
+        self._trees[key] = graphs
+        return graphs
+
+    def iter_node_versions(self) -> Iterator[NodeVersion]:
+        """Walk the commits from the oldest, and get the node versions changed in them.
+            Graph blobs are read only once, a node is only yielded if its code changed
+
+        Yields:
+            NodeVersion: The changed nodes, by commit, graph uuid and node id
+        """
+        commits = self._git(self.repo, "rev-list", "--reverse", "--topo-order",
+                            self.revision, "--", *self.pathspecs).split()
+        # Nodes of every read blob, graphs reverted to an earlier blob are compared again:
+        blob_versions: dict[str, list[NodeVersion]] = {}
+        last_checksums: dict[tuple[str, str], str] = {}
+
+        with GitObjectReader(self.repo) as reader:
+            for commit in commits:
+                STATS.count("history_commits")
+                _, commit_data = reader.read(commit)
+                tree, commit_time = "", 0.0
+                for line in commit_data.decode("utf-8", "replace").splitlines():
+                    if line.startswith("tree "):
+                        tree = line[5:]
+                    elif line.startswith("committer "):
+                        commit_time = float(line.rsplit(" ", 2)[1])
+                    elif not line:
+                        break
+
+                for path, blob in self._list_graphs(reader, tree, ""):
+                    versions = blob_versions.get(blob)
+                    if versions is None:
+                        versions = self._read_versions(reader, commit, commit_time, path, blob)
+                        blob_versions[blob] = versions
+                    else:
+                        STATS.count("history_blobs_skipped")
+
+                    for version in versions:
+                        key = (version.dyn_uuid, version.py_id)
+                        if last_checksums.get(key) == version.checksum:
+                            continue
+                        last_checksums[key] = version.checksum
+                        if version.commit != commit or version.dyn_path != path:
+                            version = version.at_commit(commit, commit_time, path)
+                        yield version
+
+    def _read_versions(self, reader: GitObjectReader, commit: str, commit_time: float,
+                       path: str, blob: str) -> list[NodeVersion]:
+        """Parse a graph blob, and get the versions of its nodes
+
+        Args:
+            reader (GitObjectReader): The object reader
+            commit (str): Hash of the commit
+            commit_time (float): Time of the commit, as a timestamp
+            path (str): Path of the graph in the repository
+            blob (str): Hash of the blob
+
+        Returns:
+            list[NodeVersion]: The nodes, sorted by their id. Empty, if it's not a valid graph
+        """
+        STATS.count("history_blobs")
+        _, data = reader.read(blob)
+        try:
+            with STATS.timer("history_parse"):
+                dynamo_file = GitBlobDynamoFile(path, data, commit_time)
+        except (DynamoFile.Error, DynamoFile.PythonNodeNotFound, ValueError, KeyError) as e:
+            logging.debug(f"Skipping {path} at {commit}: {e}")
+            return []
+        # Only the nodes are kept:
+        File.open_files.discard(dynamo_file)
+
+        return [NodeVersion(commit, commit_time, dynamo_file, python_node)
+                for python_node in sorted(dynamo_file.python_nodes, key=lambda n: n.id)]
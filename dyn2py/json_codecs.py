@@ -0,0 +1,188 @@
+from __future__ import annotations
+import decimal
+import json as stdlib_json
+import logging
+from json import encoder as stdlib_encoder
+from json import scanner as stdlib_scanner
+from typing import Any
+
+from dyn2py import rawjson
+from dyn2py.options import JSON_CODECS, DEFAULT_JSON_CODEC
+from dyn2py.rawjson import RawNumber
+
+
+class JsonCodec():
+    """Reads and writes graphs with a json library. Every codec writes
+    byte-identical output, RawNumbers and Decimals included"""
+
+    name: str = ""
+    """Name of the codec, one of JSON_CODECS"""
+
+    def available(self) -> bool:
+        """If the library of this codec is installed, with its C extension
+
+        Returns:
+            bool: True if the codec should be used
+        """
+        return True
+
+    def loads(self, text: str, numbers: str) -> Any:
+        """Parse a graph
+
+        Args:
+            text (str): The json string
+            numbers (str): Number mode, one of NUMBER_MODES
+
+        Raises:
+            ValueError: Invalid json
+
+        Returns:
+            Any: The parsed object
+        """
+        raise NotImplementedError
+
+    def dumps(self, obj: Any) -> str:
+        """Serialize a graph the way Dynamo saves it
+
+        Args:
+            obj (Any): The object
+
+        Returns:
+            str: The json string
+        """
+        raise NotImplementedError
+
+
+class SimplejsonCodec(JsonCodec):
+    """The reference codec, supports everything"""
+
+    name = "simplejson"
+
+    def loads(self, text: str, numbers: str) -> Any:
+        return rawjson.loads(text, numbers)
+
+    def dumps(self, obj: Any) -> str:
+        return rawjson.dumps(obj)
+
+
+class StdlibCodec(JsonCodec):
+    """The json module of the standard library"""
+
+    name = "json"
+
+    def available(self) -> bool:
+        return stdlib_scanner.c_make_scanner is not None
+
+    def loads(self, text: str, numbers: str) -> Any:
+        if numbers == "raw":
+            return stdlib_json.loads(text, parse_float=RawNumber)
+        elif numbers == "decimal":
+            return stdlib_json.loads(text, parse_float=decimal.Decimal)
+        else:
+            raise ValueError("Invalid number mode!")
+
+    def dumps(self, obj: Any) -> str:
+        if not STDLIB_RAW_ENCODER_SUPPORTED:
+            return rawjson.dumps(obj)
+        return "".join(_make_stdlib_iterencode()(obj, 0))
+
+
+def _make_stdlib_iterencode() -> Any:
+    """Make the pure python encoder of json.dumps(indent=2), the C encoder of the standard library cannot indent.
+        Its signature is not public, STDLIB_RAW_ENCODER_SUPPORTED checks if it works with this version
+
+    Returns:
+        Any: The encoder function
+    """
+    return stdlib_encoder._make_iterencode(
+        {}, _stdlib_default, _stdlib_encode_string, "  ", float.__repr__,
+        ": ", ",", False, False, True)
+
+
+def _stdlib_encode_string(value: str, _encode=stdlib_encoder.encode_basestring_ascii) -> str:
+    """Encode strings for the standard library encoder, RawNumbers are written as they are"""
+    if type(value) is RawNumber:
+        return value
+    return _encode(value)
+
+
+def _stdlib_default(o: Any) -> Any:
+    """Encode Decimals for the standard library encoder, like use_decimal=True of simplejson"""
+    if isinstance(o, decimal.Decimal):
+        return RawNumber(str(o))
+    raise TypeError(
+        f"Object of type {o.__class__.__name__} is not JSON serializable")
+
+
+STDLIB_RAW_ENCODER_SUPPORTED = rawjson.check_encoder(
+    lambda o: "".join(_make_stdlib_iterencode()(o, 0)), "json")
+"""If the standard library writes RawNumbers unchanged. Otherwise the reference codec writes the graphs"""
+
+
+CODECS: dict[str, JsonCodec] = {c.name: c for c in [
+    SimplejsonCodec(), StdlibCodec()]}
+"""Every codec by name"""
+AUTO_READ_ORDER = ["json", "simplejson"]
+"""Codecs to use for reading in auto mode, the fastest first. The C scanner of json is a bit faster"""
+AUTO_WRITE_ORDER = ["simplejson", "json"]
+"""Codecs to use for writing in auto mode, the fastest first. json can only indent in pure python"""
+
+
+def _codec_order(json_codec: str, auto_order: list[str]) -> list[JsonCodec]:
+    """Get the codecs to try, the selected first, and the others as fallback
+
+    Args:
+        json_codec (str): The selected codec, one of JSON_CODECS
+        auto_order (list[str]): Order of the codecs in auto mode
+
+    Raises:
+        ValueError: Invalid codec
+
+    Returns:
+        list[JsonCodec]: The available codecs, ends with the reference codec if it is not in the order
+    """
+    if json_codec not in JSON_CODECS:
+        raise ValueError("Invalid json codec!")
+
+    names = auto_order if json_codec == "auto" else [json_codec]
+    codecs = [CODECS[n] for n in names if CODECS[n].available()]
+    if CODECS["simplejson"] not in codecs:
+        codecs.append(CODECS["simplejson"])
+    return codecs
+
+
+def loads(text: str, numbers: str, json_codec: str = DEFAULT_JSON_CODEC) -> Any:
+    """Parse a graph with the selected codec, fall back to the reference codec
+
+    Args:
+        text (str): The json string
+        numbers (str): Number mode, one of NUMBER_MODES
+        json_codec (str, optional): The codec, one of JSON_CODECS. Defaults to DEFAULT_JSON_CODEC.
+
+    Raises:
+        ValueError: Invalid json
+
+    Returns:
+        Any: The parsed object
+    """
+    codecs = _codec_order(json_codec, AUTO_READ_ORDER)
+    for codec in codecs[:-1]:
+        try:
+            return codec.loads(text, numbers)
+        except ValueError as e:
+            # The reference codec raises the error of invalid files:
+            logging.debug(f"Cannot read with {codec.name}, falling back: {e}")
+    return codecs[-1].loads(text, numbers)
+
+
+def dumps(obj: Any, json_codec: str = DEFAULT_JSON_CODEC) -> str:
+    """Serialize a graph with the selected codec, fall back to the reference codec
+
+    Args:
+        obj (Any): The object
+        json_codec (str, optional): The codec, one of JSON_CODECS. Defaults to DEFAULT_JSON_CODEC.
+
+    Returns:
+        str: The json string
+    """
+    return _codec_order(json_codec, AUTO_WRITE_ORDER)[0].dumps(obj)
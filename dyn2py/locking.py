@@ -0,0 +1,143 @@
+from __future__ import annotations
+import hashlib
+import logging
+import os
+import pathlib
+import shutil
+import tempfile
+import time
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+LOCK_FOLDER = pathlib.Path(tempfile.gettempdir(), "dyn2py_locks")
+"""Lock files of the folders are here, shared by every user of the computer"""
+DEFAULT_LOCK_TIMEOUT = 10.0
+"""Seconds to wait for a lock held by an other process"""
+LOCK_POLL_INTERVAL = 0.05
+
+
+def write_atomic(filepath: pathlib.Path, data: bytes) -> None:
+    """Write a file through a temporary file in the same folder, so readers never see it half-written.
+        The permissions of an existing file are kept
+
+    Args:
+        filepath (pathlib.Path): Path to the file
+        data (bytes): The new content
+    """
+    temp_path = filepath.with_name(f".{filepath.name}.dyn2py-tmp")
+    try:
+        with open(temp_path, "wb") as output_file:
+            output_file.write(data)
+        try:
+            shutil.copymode(filepath, temp_path)
+        except FileNotFoundError:
+            pass
+        os.replace(temp_path, filepath)
+    except BaseException:
+        if temp_path.exists():
+            temp_path.unlink()
+        raise
+
+
+class FolderLock():
+    """Advisory lock of a folder, held while dyn2py writes files in it. Other dyn2py processes wait for it.
+        Reentrant in the process. The lock files are not in the folder, so processes on other computers
+        are not locked out"""
+
+    timeout: float = DEFAULT_LOCK_TIMEOUT
+    """Seconds to wait for a lock, set by run()"""
+    held: dict[pathlib.Path, int] = {}
+    """Folders locked by this process, and their lock count"""
+    _descriptors: dict[pathlib.Path, int] = {}
+
+    def __init__(self, folder: pathlib.Path) -> None:
+        """Generate a lock. Use it as a context manager
+
+        Args:
+            folder (pathlib.Path): The folder
+        """
+        self.folder: pathlib.Path = folder
+        """The folder"""
+        self._key: pathlib.Path = pathlib.Path(os.path.realpath(folder))
+
+    @property
+    def lock_path(self) -> pathlib.Path:
+        """Path to the lock file of the folder"""
+        if not LOCK_FOLDER.exists():
+            LOCK_FOLDER.mkdir(exist_ok=True)
+            # Other users should lock the same folders:
+            os.chmod(LOCK_FOLDER, 0o1777)
+        key = os.path.normcase(str(self._key))
+        return LOCK_FOLDER.joinpath(hashlib.md5(key.encode("utf-8")).hexdigest() + ".lock")
+
+    def acquire(self) -> None:
+        """Lock the folder, wait if it's locked by an other process
+
+        Raises:
+            FolderLock.Error: Not locked in time
+        """
+        if self._key in self.held:
+            self.held[self._key] += 1
+            return
+
+        try:
+            descriptor = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+        except OSError as e:
+            logging.warning(f"Cannot create lock file, writing without lock: {self.lock_path} {e}")
+            descriptor = -1
+
+        deadline = time.monotonic() + self.timeout
+        while descriptor != -1:
+            try:
+                if os.name == "nt":
+                    msvcrt.locking(descriptor, msvcrt.LK_NBLCK, 1)
+                else:
+                    fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    os.close(descriptor)
+                    raise self.Error(f"Folder is locked by an other process: {self.folder}", self.folder)
+                time.sleep(LOCK_POLL_INTERVAL)
+
+        self.held[self._key] = 1
+        self._descriptors[self._key] = descriptor
+
+    def release(self) -> None:
+        """Unlock the folder"""
+        self.held[self._key] -= 1
+        if self.held[self._key]:
+            return
+
+        del self.held[self._key]
+        descriptor = self._descriptors.pop(self._key)
+        if descriptor == -1:
+            return
+        if os.name == "nt":
+            os.lseek(descriptor, 0, os.SEEK_SET)
+            msvcrt.locking(descriptor, msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(descriptor, fcntl.LOCK_UN)
+        os.close(descriptor)
+
+    def __enter__(self) -> FolderLock:
+        self.acquire()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.release()
+
+    class Error(Exception):
+        def __init__(self, message: str, folder: pathlib.Path) -> None:
+            """The folder could not be locked
+
+            Args:
+                message (str): The message to display
+                folder (pathlib.Path): The folder
+            """
+            super().__init__(message)
+            self.folder = folder
@@ -0,0 +1,326 @@
+from __future__ import annotations
+import json
+import logging
+import os
+import pathlib
+
+from dyn2py.locking import FolderLock
+
+
+MANIFEST_FILENAME = "dyn2py_manifest.json"
+"""Name of the manifest of deduplicated scripts, in the python folder"""
+MANIFEST_VERSION = 1
+SHARED_SCRIPT_PREFIX = "code_"
+SHARED_SCRIPT_HASH_LENGTH = 12
+"""Length of the checksum prefix in the filename of new shared scripts"""
+
+
+class NodeReference():
+    """A python node using a shared script"""
+
+    __slots__ = ("dyn_uuid", "dyn_name", "dyn_path", "py_id", "py_engine")
+
+    def __init__(self, dyn_uuid: str, dyn_name: str, dyn_path: str, py_id: str, py_engine: str) -> None:
+        """Generate a node reference
+
+        Args:
+            dyn_uuid (str): Uuid of the graph
+            dyn_name (str): Name of the graph
+            dyn_path (str): Path to the graph, relative to the manifest
+            py_id (str): Id of the node
+            py_engine (str): Engine of the node
+        """
+        self.dyn_uuid: str = dyn_uuid
+        """Uuid of the graph"""
+        self.dyn_name: str = dyn_name
+        """Name of the graph"""
+        self.dyn_path: str = dyn_path
+        """Path to the graph, relative to the manifest"""
+        self.py_id: str = py_id
+        """Id of the node"""
+        self.py_engine: str = py_engine
+        """Engine of the node"""
+
+    def to_dict(self) -> dict:
+        """Get the reference as a dict, with the same keys as the header of python files
+
+        Returns:
+            dict: The reference
+        """
+        return {
+            "dyn_uuid": self.dyn_uuid,
+            "dyn_name": self.dyn_name,
+            "dyn_path": self.dyn_path,
+            "py_id": self.py_id,
+            "py_engine": self.py_engine
+        }
+
+    @classmethod
+    def from_dict(cls, reference_dict: dict) -> NodeReference:
+        """Generate a reference from the manifest
+
+        Args:
+            reference_dict (dict): The reference
+
+        Returns:
+            NodeReference: The reference
+        """
+        return cls(reference_dict["dyn_uuid"], reference_dict["dyn_name"], reference_dict["dyn_path"],
+                   reference_dict["py_id"], reference_dict["py_engine"])
+
+
+class SharedScript():
+    """A script file with a unique code body, used by one or more python nodes"""
+
+    __slots__ = ("filename", "checksum", "nodes")
+
+    def __init__(self, filename: str, checksum: str, nodes: list[NodeReference] | None = None) -> None:
+        """Generate a shared script entry
+
+        Args:
+            filename (str): Name of the script in the folder of the manifest
+            checksum (str): Checksum of the code, when it was last synchronized with the graphs
+            nodes (list[NodeReference] | None, optional): The nodes using this code. Defaults to None.
+        """
+        self.filename: str = filename
+        """Name of the script in the folder of the manifest"""
+        self.checksum: str = checksum
+        """Checksum of the code, when it was last synchronized with the graphs"""
+        self.nodes: list[NodeReference] = nodes or []
+        """The nodes using this code"""
+
+
+class Manifest():
+    """Shared scripts of a python folder, and the nodes using them"""
+
+    manifests: dict[pathlib.Path, Manifest] = {}
+    """Manifests used in this process, by their folder"""
+
+    def __init__(self, folder: pathlib.Path) -> None:
+        """Generate an empty manifest. Call load() to read it from the folder
+
+        Args:
+            folder (pathlib.Path): The python folder
+        """
+        self.folder: pathlib.Path = folder
+        """The python folder"""
+        self.scripts: dict[str, SharedScript] = {}
+        """Shared scripts by their filename"""
+        self.modified: bool = False
+        """If the manifest should be saved"""
+        self.checked: set[str] = set()
+        """Scripts already compared with the extracted code in this run"""
+        self._by_checksum: dict[str, SharedScript] = {}
+        self._loaded_text: str | None = None
+
+    @classmethod
+    def for_folder(cls, folder: pathlib.Path, strict: bool = True) -> Manifest:
+        """Get the manifest of a folder, read it if it's the first time
+
+        Args:
+            folder (pathlib.Path): The python folder
+            strict (bool, optional): Raise the error of an invalid manifest file.
+                False to log a warning, and get an empty manifest, that is not saved. Defaults to True.
+
+        Raises:
+            ValueError: Invalid manifest file, only if strict
+
+        Returns:
+            Manifest: The manifest
+        """
+        key = folder.resolve()
+        if key not in cls.manifests:
+            manifest = cls(folder)
+            try:
+                manifest.load()
+            except ValueError as e:
+                if strict:
+                    raise
+                logging.warning(f"Cannot read manifest, ignoring it: {e}")
+                return cls(folder)
+            cls.manifests[key] = manifest
+        return cls.manifests[key]
+
+    @property
+    def filepath(self) -> pathlib.Path:
+        """Path to the manifest file"""
+        return self.folder.joinpath(MANIFEST_FILENAME)
+
+    def load(self) -> None:
+        """Read the manifest file, if it exists
+
+        Raises:
+            ValueError: Invalid manifest file
+        """
+        self._loaded_text = self._read_text()
+        if self._loaded_text is None:
+            return
+
+        manifest = json.loads(self._loaded_text)
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest version: {self.filepath}")
+
+        for filename, script_dict in manifest["scripts"].items():
+            self._add_script(SharedScript(
+                filename, script_dict["checksum"],
+                [NodeReference.from_dict(n) for n in script_dict["nodes"]]))
+
+    def _read_text(self) -> str | None:
+        """Read the manifest file as text
+
+        Returns:
+            str | None: The text, None if the file does not exist
+        """
+        try:
+            with open(self.filepath, "r", encoding="utf-8") as manifest_file:
+                return manifest_file.read()
+        except FileNotFoundError:
+            return None
+
+    def save(self) -> bool:
+        """Write the manifest file, if its content changed. Scripts not used by any node are left out.
+            Nodes added by an other process since the manifest was read are kept
+
+        Raises:
+            FolderLock.Error: The folder is locked by an other process
+
+        Returns:
+            bool: True if the file was written
+        """
+        with FolderLock(self.folder):
+            current_text = self._read_text()
+            if current_text is not None and current_text != self._loaded_text:
+                self.merge(json.loads(current_text))
+
+            for script in [s for s in self.scripts.values() if not s.nodes]:
+                logging.info(f"Shared script is not used anymore: {script.filename}")
+                del self.scripts[script.filename]
+                if self._by_checksum.get(script.checksum) is script:
+                    del self._by_checksum[script.checksum]
+
+            manifest = {
+                "version": MANIFEST_VERSION,
+                "scripts": {
+                    s.filename: {
+                        "checksum": s.checksum,
+                        "nodes": [n.to_dict() for n in sorted(s.nodes, key=lambda n: (n.dyn_path, n.py_id))]
+                    } for s in sorted(self.scripts.values(), key=lambda s: s.filename)
+                }
+            }
+            text = json.dumps(manifest, indent=1) + "\n"
+            self.modified = False
+            if current_text == text:
+                self._loaded_text = text
+                return False
+
+            temp_path = self.filepath.with_name(f".{self.filepath.name}.tmp")
+            with open(temp_path, "w", encoding="utf-8", newline="\n") as manifest_file:
+                manifest_file.write(text)
+            os.replace(temp_path, self.filepath)
+            self._loaded_text = text
+        return True
+
+    def merge(self, manifest: dict) -> None:
+        """Add the nodes of an other manifest, written by an other process or shard, that are not known by this one
+
+        Args:
+            manifest (dict): The other manifest
+        """
+        if manifest.get("version") != MANIFEST_VERSION:
+            logging.warning(f"Unsupported manifest version, not merging: {self.filepath}")
+            return
+
+        known = {(n.dyn_path, n.py_id) for s in self.scripts.values() for n in s.nodes}
+        for filename, script_dict in manifest["scripts"].items():
+            nodes = [NodeReference.from_dict(n) for n in script_dict["nodes"]
+                     if (n["dyn_path"], n["py_id"]) not in known]
+            if not nodes:
+                continue
+            logging.info(f"Merging {len(nodes)} nodes of an other process: {filename}")
+            if filename in self.scripts:
+                self.scripts[filename].nodes.extend(nodes)
+            else:
+                self._add_script(SharedScript(filename, script_dict["checksum"], nodes))
+
+    def _add_script(self, script: SharedScript) -> None:
+        """Register a script by its filename and checksum"""
+        self.scripts[script.filename] = script
+        self._by_checksum[script.checksum] = script
+
+    def get_script(self, filename: str) -> SharedScript | None:
+        """Get a shared script by its filename
+
+        Args:
+            filename (str): Name of the script
+
+        Returns:
+            SharedScript | None: The script. None if it's not in the manifest
+        """
+        return self.scripts.get(filename)
+
+    def get_scripts_of_graph(self, dyn_uuid: str) -> list[SharedScript]:
+        """Get the shared scripts used by a graph
+
+        Args:
+            dyn_uuid (str): Uuid of the graph
+
+        Returns:
+            list[SharedScript]: The scripts
+        """
+        return [s for s in self.scripts.values()
+                if any(n.dyn_uuid == dyn_uuid for n in s.nodes)]
+
+    def remove_graph(self, dyn_path: str) -> None:
+        """Remove the nodes of a graph, before it's extracted again. Copies of a graph have the same uuid,
+            so graphs are identified by their path. Scripts not used by any node are removed
+            from the manifest when it's saved, their files are kept
+
+        Args:
+            dyn_path (str): Path to the graph, relative to the manifest
+        """
+        for script in self.scripts.values():
+            nodes = [n for n in script.nodes if n.dyn_path != dyn_path]
+            if len(nodes) != len(script.nodes):
+                script.nodes = nodes
+                self.modified = True
+
+    def add_node(self, checksum: str, node: NodeReference) -> tuple[SharedScript, bool]:
+        """Add a node to the script of its code. Creates a new script entry for new code
+
+        Args:
+            checksum (str): Checksum of the code of the node
+            node (NodeReference): The node
+
+        Returns:
+            tuple[SharedScript, bool]: The script, and True if it's new
+        """
+        self.modified = True
+        script = self._by_checksum.get(checksum)
+        if script:
+            script.nodes.append(node)
+            return script, False
+
+        # Use a longer prefix if the filename is taken:
+        length = SHARED_SCRIPT_HASH_LENGTH
+        filename = f"{SHARED_SCRIPT_PREFIX}{checksum[:length]}.py"
+        while filename in self.scripts and length < len(checksum):
+            length += 4
+            filename = f"{SHARED_SCRIPT_PREFIX}{checksum[:length]}.py"
+
+        script = SharedScript(filename, checksum, [node])
+        self._add_script(script)
+        return script, True
+
+    def set_checksum(self, filename: str, checksum: str) -> None:
+        """Record that the code of a script was synchronized with its graphs
+
+        Args:
+            filename (str): Name of the script
+            checksum (str): The new checksum of the code
+        """
+        script = self.scripts[filename]
+        if self._by_checksum.get(script.checksum) is script:
+            del self._by_checksum[script.checksum]
+        script.checksum = checksum
+        self._by_checksum.setdefault(checksum, script)
+        self.modified = True
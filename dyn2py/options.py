@@ -1,11 +1,46 @@
 from __future__ import annotations
 import argparse
+import fnmatch
+import inspect
 import pathlib
+import sys
+
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+from dyn2py.locking import DEFAULT_LOCK_TIMEOUT
 
 
 LOGLEVELS = ["HEADLESS", "CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"]
 DEFAULT_LOGLEVEL = "INFO"
 FILTERS = ["py", "dyn"]
+STATS_FORMATS = ["text", "json", "prometheus"]
+OUTPUT_FORMATS = ["jsonl"]
+NUMBER_MODES = ["raw", "decimal"]
+"""raw: keep the original text of numbers in graphs, decimal: parse them to Decimal objects.
+Decimals keep the value of numbers, but not always their text: 1E-05 is written as 0.00001"""
+DEFAULT_NUMBER_MODE = "raw"
+JSON_CODECS = ["auto", "simplejson", "json"]
+"""Json libraries to read and write graphs with, auto selects the fastest one for reading and for writing"""
+DEFAULT_JSON_CODEC = "auto"
+LAYOUTS = ["flat", "graph", "hash", "mirror"]
+"""flat: every script in the python folder, graph: a subfolder for every graph,
+hash: subfolders by the beginning of the graph uuid, mirror: the folders of the graphs, relative to the working directory"""
+DEFAULT_LAYOUT = "flat"
+PYTHON_ENGINES = ["IronPython2", "CPython3"]
+CONFIG_FILENAME = "dyn2py.toml"
+"""Workspace config file, or use the [tool.dyn2py] table of pyproject.toml"""
+PYPROJECT_FILENAME = "pyproject.toml"
+WORKSPACE_OPTIONS = ["loglevel", "dry_run", "stats", "stats_output", "profile", "profile_output",
+                     "profile_per_file", "output", "io_threads", "lock_timeout", "sync_state"]
+"""Options of the whole run, they cannot be set for a single root of a workspace"""
+PATH_OPTIONS = ["source", "python_folder", "stats_output", "profile_output", "graph_root", "backup_store",
+                "history_output", "bundle", "index", "gc_archive"]
+"""Options with paths, relative to the config file in a workspace"""
+SHARD_MODES = ["hash", "size"]
+"""hash: by the hash of the path of the graphs, size: balance the size of the graphs in every shard"""
 
 
 class Options(argparse.Namespace):
@@ -20,7 +55,48 @@ class Options(argparse.Namespace):
         backup: bool = False,
         filter: str = "",
         update: bool = False,
-        python_folder: pathlib.Path | str | None = None
+        python_folder: pathlib.Path | str | None = None,
+        deterministic: bool = False,
+        stream: int = 0,
+        stats: str = "",
+        stats_output: pathlib.Path | str | None = None,
+        profile: bool = False,
+        profile_output: pathlib.Path | str | None = None,
+        profile_per_file: bool = False,
+        output: str = "",
+        numbers: str = DEFAULT_NUMBER_MODE,
+        json_codec: str = DEFAULT_JSON_CODEC,
+        graph_root: list[pathlib.Path | str] = [],
+        relink: bool = False,
+        backup_store: pathlib.Path | str | None = None,
+        backup_compress: bool = False,
+        backup_keep: int = 0,
+        backup_days: float = 0,
+        restore: bool = False,
+        dedup: bool = False,
+        history: str = "",
+        history_output: pathlib.Path | str | None = None,
+        io_threads: int = 0,
+        layout: str = DEFAULT_LAYOUT,
+        node_id: list[str] = [],
+        node_name: list[str] = [],
+        engine: list[str] = [],
+        bundle: pathlib.Path | str | None = None,
+        bundle_import: bool = False,
+        index: pathlib.Path | str | None = None,
+        search: str = "",
+        search_limit: int = 100,
+        lock_timeout: float = DEFAULT_LOCK_TIMEOUT,
+        shard: str = "",
+        shard_by: str = "hash",
+        merge: bool = False,
+        gc: bool = False,
+        gc_archive: pathlib.Path | str | None = None,
+        auto_gc: bool = False,
+        config: pathlib.Path | str | None = None,
+        sync_state: bool = False,
+        gc_missing_graphs: bool = False,
+        index_only: bool = False
     ) -> None:
         """Generate an option object for running it like from the command line
 
@@ -33,6 +109,68 @@ class Options(argparse.Namespace):
             filter (str, optional): 'dyn' or 'py' file filter for running on folders. Defaults to "".
             update (bool, optional): Update mode, like inverse on Dynamo files. Defaults to False.
             python_folder (pathlib.Path | str | None, optional): Path to export python files to, or import from there. Defaults to None.
+            deterministic (bool, optional): Leave out volatile header fields, only write changed python files. Defaults to False.
+            stream (int, optional): Process graphs one by one, write them after this many graphs. 0 to write everything at the end. Defaults to 0.
+            stats (str, optional): Report timings and counters in this format: 'text', 'json' or 'prometheus'. Defaults to "".
+            stats_output (pathlib.Path | str | None, optional): Save the stats report to this file instead of stderr. Defaults to None.
+            profile (bool, optional): Run under cProfile, save a .pstats and a .collapsed file. Defaults to False.
+            profile_output (pathlib.Path | str | None, optional): Path of the .pstats file, implies profile. Defaults to None.
+            profile_per_file (bool, optional): Also save the time spent on every source file. Defaults to False.
+            output (str, optional): 'jsonl' to print events to stdout as json lines. Defaults to "".
+            numbers (str, optional): How to read numbers in graphs: 'raw' or 'decimal'. decimal keeps only the values of numbers, not their text. Defaults to DEFAULT_NUMBER_MODE.
+            json_codec (str, optional): Json library to read and write graphs with, one of JSON_CODECS. Falls back to simplejson if it is not available. Defaults to DEFAULT_JSON_CODEC.
+            graph_root (list[pathlib.Path | str], optional): Folders to search moved source graphs in by their uuid. Defaults to [].
+            relink (bool, optional): Only rewrite dyn_path in the header of python scripts, if their graph was moved. Defaults to False.
+            backup_store (pathlib.Path | str | None, optional): Back up to this deduplicated store instead of renaming, implies backup.
+                Relative paths are relative to the folder of the file. Defaults to None.
+            backup_compress (bool, optional): Gzip compress new content in the backup store. Defaults to False.
+            backup_keep (int, optional): Keep this many newest backups of every file in the store. 0 to keep all. Defaults to 0.
+            backup_days (float, optional): Keep the backups of this many last days in the store. 0 to keep all. Defaults to 0.
+            restore (bool, optional): Restore the sources from their newest backup in the store. Defaults to False.
+            dedup (bool, optional): Extract every unique code once, list the nodes using it in a manifest. Defaults to False.
+            history (str, optional): Read the sources from this git revision or range, and print every version
+                of their python nodes as json lines, instead of extracting. Defaults to "".
+            history_output (pathlib.Path | str | None, optional): Save the node versions to this file instead of stdout. Defaults to None.
+            io_threads (int, optional): High-latency storage mode: cache file metadata for the run,
+                and read files ahead on this many threads. 0 to turn it off. Defaults to 0.
+            layout (str, optional): Folder layout of the python scripts, one of LAYOUTS.
+                Source folders are read recursively in other layouts than flat. Defaults to DEFAULT_LAYOUT.
+            node_id (list[str], optional): Only extract and update the python nodes with these ids. Defaults to [].
+            node_name (list[str], optional): Only extract and update the python nodes with a name matching
+                one of these glob patterns. Defaults to [].
+            engine (list[str], optional): Only extract and update the python nodes of these engines,
+                from PYTHON_ENGINES. Defaults to [].
+            bundle (pathlib.Path | str | None, optional): Write the python nodes of the source graphs to this bundle
+                instead of extracting them: a .jsonl file, or a folder for one module per engine. Defaults to None.
+            bundle_import (bool, optional): The sources are bundles, update the graphs from them. Defaults to False.
+            index (pathlib.Path | str | None, optional): Update this full-text search index with the graphs
+                extracted and written by the run, they are not read again for it. Defaults to None.
+            search (str, optional): The sources are search indexes, print the python nodes matching this query. Defaults to "".
+            search_limit (int, optional): Maximum number of search results of every index. Defaults to 100.
+            lock_timeout (float, optional): Seconds to wait for a folder locked by an other dyn2py process.
+                Defaults to 10.0.
+            shard (str, optional): Process only this share of the graphs, as INDEX/COUNT, like 2/4.
+                The index starts from 1. Defaults to "".
+            shard_by (str, optional): Split the graphs to shards by 'hash' of their path, or balance their 'size'.
+                Defaults to "hash".
+            merge (bool, optional): The sources are the python folders and stats json reports of shards,
+                merge them to python_folder and the stats of this run. Defaults to False.
+            gc (bool, optional): The sources are python folders, remove the scripts of deleted nodes,
+                and the old scripts of renamed nodes, instead of updating. Scripts with edits not in their node
+                are only removed with gc_archive or force. Nodes are read from the index, if it's given. Defaults to False.
+            gc_archive (pathlib.Path | str | None, optional): Move the removed scripts to this folder,
+                instead of deleting them. Defaults to None.
+            auto_gc (bool, optional): Remove the old scripts of the deleted and renamed nodes of the extracted graphs.
+                Defaults to False.
+            config (pathlib.Path | str | None, optional): Run every root of this workspace config, a dyn2py.toml
+                or a pyproject.toml, instead of the sources. The other options override the config. Defaults to None.
+            sync_state (bool, optional): Record the synchronized code of scripts in a SYNC_STATE_FILENAME file
+                in their folder, for comparing changes like a three-way merge.
+                Existing files are always updated, merge also creates them. Defaults to False.
+            gc_missing_graphs (bool, optional): Also remove the scripts of graphs that are not found with gc.
+                Defaults to False.
+            index_only (bool, optional): Only update the index with the source graphs, instead of extracting them.
+                Defaults to False.
         """
 
         self.source = []
@@ -54,6 +192,112 @@ class Options(argparse.Namespace):
         else:
             self.python_folder = python_folder
 
+        self.deterministic = deterministic
+
+        if stream < 0:
+            raise ValueError("Invalid stream window!")
+        self.stream = stream
+
+        self.stats = self.sanitize_option_string("stats", stats)
+        if isinstance(stats_output, str):
+            self.stats_output = pathlib.Path(stats_output)
+        else:
+            self.stats_output = stats_output
+
+        if isinstance(profile_output, str):
+            self.profile_output = pathlib.Path(profile_output)
+        else:
+            self.profile_output = profile_output
+        self.profile = profile or bool(profile_output)
+        self.profile_per_file = profile_per_file
+        self.output = self.sanitize_option_string("output", output)
+        self.numbers = self.sanitize_option_string("numbers", numbers)
+        self.json_codec = self.sanitize_option_string("json_codec", json_codec)
+        self.graph_root = [pathlib.Path(r) if isinstance(r, str) else r
+                           for r in graph_root]
+        self.relink = relink
+
+        if isinstance(backup_store, str):
+            self.backup_store = pathlib.Path(backup_store)
+        else:
+            self.backup_store = backup_store
+        self.backup = backup or bool(backup_store)
+        self.backup_compress = backup_compress
+        if backup_keep < 0 or backup_days < 0:
+            raise ValueError("Invalid backup retention!")
+        self.backup_keep = backup_keep
+        self.backup_days = backup_days
+        self.restore = restore
+        self.dedup = dedup
+        self.history = history
+        if isinstance(history_output, str):
+            self.history_output = pathlib.Path(history_output)
+        else:
+            self.history_output = history_output
+
+        if io_threads < 0:
+            raise ValueError("Invalid number of io threads!")
+        self.io_threads = io_threads
+        self.layout = self.sanitize_option_string("layout", layout)
+        self.node_id = list(node_id)
+        self.node_name = list(node_name)
+        self.engine = [self.sanitize_option_string("engine", e) for e in engine]
+        if isinstance(bundle, str):
+            self.bundle = pathlib.Path(bundle)
+        else:
+            self.bundle = bundle
+        self.bundle_import = bundle_import
+        if isinstance(index, str):
+            self.index = pathlib.Path(index)
+        else:
+            self.index = index
+        self.search = search
+        if search_limit < 1:
+            raise ValueError("Invalid search limit!")
+        self.search_limit = search_limit
+        if lock_timeout < 0:
+            raise ValueError("Invalid lock timeout!")
+        self.lock_timeout = lock_timeout
+        self.shard = self.sanitize_option_string("shard", shard)
+        self.shard_by = self.sanitize_option_string("shard_by", shard_by)
+        self.merge = merge
+        self.gc = gc
+        if isinstance(gc_archive, str):
+            self.gc_archive = pathlib.Path(gc_archive)
+        else:
+            self.gc_archive = gc_archive
+        self.auto_gc = auto_gc
+        if isinstance(config, str):
+            self.config = pathlib.Path(config)
+        else:
+            self.config = config
+        self.sync_state = sync_state
+        self.gc_missing_graphs = gc_missing_graphs
+        if index_only and not index:
+            raise ValueError("No search index to update!")
+        self.index_only = index_only
+
+    @staticmethod
+    def parse_shard(value: str) -> tuple[int, int]:
+        """Parse a shard given as INDEX/COUNT
+
+        Args:
+            value (str): The shard, like 2/4. The index starts from 1
+
+        Raises:
+            ValueError: if the shard is invalid
+
+        Returns:
+            tuple[int, int]: The index and the number of shards
+        """
+        try:
+            index, count = (int(part) for part in value.split("/"))
+        except ValueError:
+            raise ValueError("Invalid shard!")
+        if not 1 <= index <= count:
+            raise ValueError("Invalid shard!")
+        return index, count
+
     @staticmethod
     def sanitize_option_string(arg: str, value: str) -> str:
         """Sanitize string option values
@@ -79,21 +323,170 @@ class Options(argparse.Namespace):
                 sanitized_value = value
             else:
                 raise ValueError("Invalid filter!")
+        elif arg == "stats":
+            if not value or value in STATS_FORMATS:
+                sanitized_value = value
+            else:
+                raise ValueError("Invalid stats format!")
+        elif arg == "output":
+            if not value or value in OUTPUT_FORMATS:
+                sanitized_value = value
+            else:
+                raise ValueError("Invalid output format!")
+        elif arg == "numbers":
+            if value in NUMBER_MODES:
+                sanitized_value = value
+            else:
+                raise ValueError("Invalid number mode!")
+        elif arg == "json_codec":
+            if value in JSON_CODECS:
+                sanitized_value = value
+            else:
+                raise ValueError("Invalid json codec!")
+        elif arg == "layout":
+            if value in LAYOUTS:
+                sanitized_value = value
+            else:
+                raise ValueError("Invalid layout!")
+        elif arg == "shard":
+            if value:
+                Options.parse_shard(value)
+            sanitized_value = value
+        elif arg == "shard_by":
+            if value in SHARD_MODES:
+                sanitized_value = value
+            else:
+                raise ValueError("Invalid shard mode!")
+        elif arg == "engine":
+            if value in PYTHON_ENGINES:
+                sanitized_value = value
+            else:
+                raise ValueError("Invalid engine!")
         else:
             sanitized_value = value
 
         return sanitized_value
 
+    def selects_node(self, node_id: str, engine: str, name: str | None = None) -> bool:
+        """Check if a python node is selected by the node_id, node_name and engine options.
+            Every node is selected if none of them are set
+
+        Args:
+            node_id (str): Id of the node
+            engine (str): Engine of the node
+            name (str | None, optional): Name of the node. None if it's not known yet,
+                then the name patterns are not checked. Defaults to None.
+
+        Returns:
+            bool: True if the node should be processed
+        """
+        if self.node_id and node_id not in self.node_id:
+            return False
+        if self.engine and engine not in self.engine:
+            return False
+        if self.node_name and name is not None and \
+                not any(fnmatch.fnmatchcase(name, pattern) for pattern in self.node_name):
+            return False
+        return True
+
+    def get_changed(self) -> dict:
+        """Get the options that differ from the defaults, except the sources and the config
+
+        Returns:
+            dict: Options arguments
+        """
+        defaults = Options()
+        return {key: value for key, value in vars(self).items()
+                if key not in ["source", "config"] and value != getattr(defaults, key, None)}
+
+    @classmethod
+    def from_config(cls, filepath: pathlib.Path | str, **option_args) -> list[Options]:
+        """Read the roots of a workspace config. The top level of a dyn2py.toml, or the [tool.dyn2py] table
+            of a pyproject.toml has the options of every root, the [[roots]] tables the options of a single root.
+            Option names are like the arguments of Options(), with dashes or underscores.
+            Paths are relative to the folder of the config
+
+        Args:
+            filepath (pathlib.Path | str): Path to the config file
+            **option_args: Options() arguments, they override the config
+
+        Raises:
+            FileNotFoundError: The config does not exist
+            ValueError: Invalid config
+
+        Returns:
+            list[Options]: Options of every root
+        """
+        if isinstance(filepath, str):
+            filepath = pathlib.Path(filepath)
+
+        with open(filepath, "rb") as config_file:
+            try:
+                config = tomllib.load(config_file)
+            except tomllib.TOMLDecodeError as e:
+                raise ValueError(f"Invalid config: {filepath} {e}")
+        if filepath.name == PYPROJECT_FILENAME:
+            if "dyn2py" not in config.get("tool", {}):
+                raise ValueError(f"No [tool.dyn2py] table in config: {filepath}")
+            config = config["tool"]["dyn2py"]
+
+        config = cls._read_config_table(config, filepath.parent)
+        roots = config.pop("roots", None) or [{}]
+        if not isinstance(roots, list):
+            raise ValueError("Roots should be an array of tables!")
+
+        root_options = []
+        for root in roots:
+            root = cls._read_config_table(root, filepath.parent)
+            workspace_options = set(root) & set(WORKSPACE_OPTIONS)
+            if workspace_options:
+                raise ValueError(f"Only for the whole workspace: {', '.join(sorted(workspace_options))}")
+            root_options.append(cls(**{**config, **root, **option_args}))
+        return root_options
+
+    @staticmethod
+    def _read_config_table(table: dict, folder: pathlib.Path) -> dict:
+        """Convert a table of a config to Options() arguments
+
+        Args:
+            table (dict): The table
+            folder (pathlib.Path): Folder of the config, paths are relative to this
+
+        Raises:
+            ValueError: Unknown option
+
+        Returns:
+            dict: Options() arguments, and roots
+        """
+        arguments = {}
+        parameters = inspect.signature(Options.__init__).parameters
+        for key, value in table.items():
+            key = key.replace("-", "_")
+            if key == "roots":
+                arguments[key] = value
+                continue
+            if key not in parameters or key == "config":
+                raise ValueError(f"Unknown option in config: {key}")
+            # Lists can be given as a single value:
+            if isinstance(parameters[key].default, list) and not isinstance(value, list):
+                value = [value]
+            if key in PATH_OPTIONS:
+                if isinstance(value, list):
+                    value = [folder.joinpath(v) for v in value]
+                else:
+                    value = folder.joinpath(value)
+            arguments[key] = value
+        return arguments
+
     @classmethod
     def from_kwargs(cls, **kwargs) -> Options:
-        """Initialize an Options object from kwargs
+        """Initialize an Options object from kwargs. Paths and defaults are handled like in __init__
+
+        Raises:
+            TypeError: Unknown option
+            ValueError: Invalid option value
 
         Returns:
             Options: The initialized object
         """
-        o = cls()
-        for key, value in kwargs.items():
-            if isinstance(value, str):
-                value = cls.sanitize_option_string(key, value)
-            setattr(o, key, value)
-        return o
+        return cls(**kwargs)
@@ -0,0 +1,173 @@
+from __future__ import annotations
+import cProfile
+import contextlib
+import os
+import pathlib
+import pstats
+import time
+from typing import ContextManager, Iterator
+
+
+DEFAULT_PROFILE_OUTPUT = "dyn2py.pstats"
+COLLAPSED_MAX_DEPTH = 200
+"""Deeper stacks are cut in the collapsed output"""
+COLLAPSED_MIN_TIME = 1e-6
+"""Paths with less time are left out of the collapsed output, in seconds"""
+
+
+class Profiler():
+    """Run the pipeline under cProfile, and save the results"""
+
+    def __init__(self) -> None:
+        self.enabled: bool = False
+        """If a profiling is running"""
+        self.per_file: bool = False
+        """Measure the time spent on every source file"""
+        self.profile: cProfile.Profile | None = None
+        """The running profiler"""
+        self.file_times: dict[str, float] = {}
+        """Seconds spent on every source file, if per_file is enabled"""
+
+    def start(self, per_file: bool = False) -> None:
+        """Start profiling
+
+        Args:
+            per_file (bool, optional): Measure the time spent on every source file. Defaults to False.
+        """
+        self.enabled = True
+        self.per_file = per_file
+        self.file_times = {}
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self) -> None:
+        """Stop profiling"""
+        if self.profile:
+            self.profile.disable()
+        self.enabled = False
+
+    def file(self, filepath: pathlib.Path) -> ContextManager:
+        """Attribute the time spent in a with block to a source file
+
+        Args:
+            filepath (pathlib.Path): The source file
+
+        Returns:
+            ContextManager: The timer. A no-op context manager, if per file profiling is disabled
+        """
+        if not (self.enabled and self.per_file):
+            return contextlib.nullcontext()
+        return self._file_timer(str(filepath))
+
+    @contextlib.contextmanager
+    def _file_timer(self, filepath: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.file_times[filepath] = self.file_times.get(filepath, 0.0) \
+                + time.perf_counter() - start
+
+    def save(self, output: pathlib.Path) -> list[pathlib.Path]:
+        """Save the results of the last profiling:
+            a .pstats file, a .collapsed file for flame graphs,
+            and a .files.tsv file with per file times, if it was enabled
+
+        Args:
+            output (pathlib.Path): Path to the .pstats file. Other files are saved next to it.
+
+        Raises:
+            RuntimeError: Profiling was not started
+
+        Returns:
+            list[pathlib.Path]: The saved files
+        """
+        if not self.profile:
+            raise RuntimeError("Profiling was not started!")
+
+        self.profile.dump_stats(output)
+        saved = [output]
+
+        collapsed_path = output.with_suffix(".collapsed")
+        with open(collapsed_path, "w", encoding="utf-8", newline="\n") as collapsed_file:
+            for stack, microseconds in collapsed_stacks(pstats.Stats(self.profile)).items():
+                collapsed_file.write(f"{stack} {microseconds}\n")
+        saved.append(collapsed_path)
+
+        if self.per_file:
+            files_path = output.with_suffix(".files.tsv")
+            with open(files_path, "w", encoding="utf-8", newline="\n") as files_file:
+                files_file.write("seconds\tfile\n")
+                for filepath, seconds in sorted(self.file_times.items(),
+                                                key=lambda i: i[1], reverse=True):
+                    files_file.write(f"{seconds:.6f}\t{filepath}\n")
+            saved.append(files_path)
+
+        return saved
+
+
+def collapsed_stacks(stats: pstats.Stats) -> dict[str, int]:
+    """Convert profile stats to collapsed stacks, the input format of flame graph tools.
+        cProfile only records caller-callee pairs, so the time of a function is
+        split between its callers by the time spent in the function from each caller.
+
+    Args:
+        stats (pstats.Stats): The stats of a profiling
+
+    Returns:
+        dict[str, int]: Semicolon separated stacks, and their own time in microseconds
+    """
+    entries = stats.stats  # type: ignore
+    callees: dict[tuple, dict[tuple, tuple]] = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, {})[func] = edge
+
+    stacks: dict[str, int] = {}
+
+    def walk(func: tuple, stack: tuple, names: tuple, scale: float) -> None:
+        own_time = entries[func][2] * scale
+        if own_time >= COLLAPSED_MIN_TIME:
+            key = ";".join(names)
+            stacks[key] = stacks.get(key, 0) + round(own_time * 1e6)
+
+        if len(stack) >= COLLAPSED_MAX_DEPTH:
+            return
+
+        for callee, edge in callees.get(func, {}).items():
+            callee_time = entries[callee][3]
+            # Skip recursion and calls without measurable time:
+            if callee in stack or callee_time <= 0:
+                continue
+            callee_scale = scale * edge[3] / callee_time
+            if callee_time * callee_scale < COLLAPSED_MIN_TIME:
+                continue
+            walk(callee, stack + (callee,), names + (_frame_name(callee),),
+                 callee_scale)
+
+    for func, (_, _, _, _, callers) in entries.items():
+        if not callers:
+            walk(func, (func,), (_frame_name(func),), 1.0)
+
+    return stacks
+
+
+def _frame_name(func: tuple) -> str:
+    """Generate the name of a frame in the collapsed output
+
+    Args:
+        func (tuple): filename, line number and function name, like in pstats
+
+    Returns:
+        str: The name, without semicolons and spaces
+    """
+    filename, lineno, funcname = func
+    if filename == "~":
+        name = funcname
+    else:
+        name = f"{os.path.basename(filename)}:{lineno}({funcname})"
+    return name.replace(";", ":").replace(" ", "_")
+
+
+PROFILER = Profiler()
+"""Profiler of the current run, started by run() with the profile option"""
@@ -0,0 +1,183 @@
+from __future__ import annotations
+import decimal
+import logging
+from typing import Any, Callable
+
+import simplejson as json
+from simplejson import encoder as json_encoder
+
+from dyn2py.options import DEFAULT_NUMBER_MODE
+
+
+class RawNumber(str):
+    """The original text of a json number, written back without quotes by dumps().
+        Other json encoders write it as a string, in quotes"""
+
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return f"RawNumber({str.__repr__(self)})"
+
+
+def _encode_string(value: str, _encode=json_encoder.encode_basestring_ascii) -> str:
+    """Encode strings for the encoder, RawNumbers are written as they are
+
+    Args:
+        value (str): The string
+
+    Returns:
+        str: The json representation
+    """
+    if type(value) is RawNumber:
+        return value
+    return _encode(value)
+
+
+class RawNumberEncoder(json.JSONEncoder):
+    """Json encoder writing RawNumbers unchanged, and Decimals like use_decimal=True"""
+
+    def __init__(self, indent: int | str | None = 2) -> None:
+        """Generate an encoder with the settings of Dynamo graphs
+
+        Args:
+            indent (int | str | None, optional): Indentation of the output. Defaults to 2.
+        """
+        super().__init__(indent=indent, use_decimal=True)
+
+    def iterencode(self, o: Any) -> Any:
+        """Encode an object, like JSONEncoder.iterencode(), but with RawNumber support
+
+        Args:
+            o (Any): The object
+
+        Returns:
+            Any: The chunks of the json string
+        """
+        if not RAW_ENCODER_SUPPORTED:
+            # The public encoder writes the value of numbers, not always their text:
+            return super().iterencode(_to_decimal(o))
+
+        markers = {} if self.check_circular else None
+        key_memo: dict = {}
+        try:
+            return self._make_iterencode(markers, key_memo)(o, 0)
+        finally:
+            key_memo.clear()
+
+    def _make_iterencode(self, markers: dict | None, key_memo: dict) -> Any:
+        """Make the internal encoder function of simplejson, with _encode_string() for strings.
+            Its signature is not public, RAW_ENCODER_SUPPORTED checks if it works with this version
+
+        Args:
+            markers (dict | None): Ids of the objects being encoded, for checking circular references
+            key_memo (dict): Cache of the encoded keys
+
+        Returns:
+            Any: The encoder function
+        """
+        int_as_string_bitcount = (
+            53 if self.bigint_as_string else self.int_as_string_bitcount)
+
+        if json_encoder.c_make_encoder is not None:
+            return json_encoder.c_make_encoder(
+                markers, self.default, _encode_string, self.indent,
+                self.key_separator, self.item_separator, self.sort_keys,
+                self.skipkeys, self.allow_nan, key_memo, self.use_decimal,
+                self.namedtuple_as_object, self.tuple_as_array,
+                int_as_string_bitcount,
+                self.item_sort_key, self.encoding, self.for_json,
+                self.ignore_nan, decimal.Decimal, self.iterable_as_array)
+        else:
+            return json_encoder._make_iterencode(
+                markers, self.default, _encode_string, self.indent, repr,
+                self.key_separator, self.item_separator, self.sort_keys,
+                self.skipkeys, self.use_decimal,
+                self.namedtuple_as_object, self.tuple_as_array,
+                int_as_string_bitcount,
+                self.item_sort_key, self.encoding, self.for_json,
+                self.iterable_as_array, Decimal=decimal.Decimal)
+
+
+def _to_decimal(o: Any) -> Any:
+    """Convert the RawNumbers of an object to Decimals, for the public encoder
+
+    Args:
+        o (Any): The object
+
+    Returns:
+        Any: The object with Decimals
+    """
+    if type(o) is RawNumber:
+        return decimal.Decimal(o)
+    elif isinstance(o, dict):
+        return {k: _to_decimal(v) for k, v in o.items()}
+    elif isinstance(o, list):
+        return [_to_decimal(v) for v in o]
+    return o
+
+
+_CHECK_OBJECT = {"a": [RawNumber("1.50E3"), decimal.Decimal("2.5"), "b"]}
+_CHECK_TEXT = '{\n  "a": [\n    1.50E3,\n    2.5,\n    "b"\n  ]\n}'
+
+
+def check_encoder(dumps: Callable[[Any], str], name: str) -> bool:
+    """Check if an encoder built on the internals of a json library writes RawNumbers unchanged.
+        The internals are not public, they may change in any version of the library
+
+    Args:
+        dumps (Callable[[Any], str]): Serializes an object with the encoder
+        name (str): Name of the library, for the log
+
+    Returns:
+        bool: True if it works
+    """
+    try:
+        output = dumps(_CHECK_OBJECT)
+    except (TypeError, ValueError, AttributeError) as e:
+        output = str(e)
+    if output != _CHECK_TEXT:
+        logging.warning(f"The installed {name} is not supported, numbers are written by their value: {output}")
+        return False
+    return True
+
+
+RAW_ENCODER_SUPPORTED = check_encoder(
+    lambda o: "".join(RawNumberEncoder()._make_iterencode({}, {})(o, 0)), "simplejson")
+"""If RawNumbers are written unchanged. Otherwise they are written as Decimals"""
+
+
+_ENCODER = RawNumberEncoder()
+
+
+def loads(text: str, numbers: str = DEFAULT_NUMBER_MODE) -> Any:
+    """Parse a json string
+
+    Args:
+        text (str): The json string
+        numbers (str, optional): Number mode, one of NUMBER_MODES. Defaults to DEFAULT_NUMBER_MODE.
+
+    Raises:
+        ValueError: Invalid number mode
+        json.JSONDecodeError: Invalid json
+
+    Returns:
+        Any: The parsed object
+    """
+    if numbers == "raw":
+        return json.loads(text, parse_float=RawNumber)
+    elif numbers == "decimal":
+        return json.loads(text, use_decimal=True)
+    else:
+        raise ValueError("Invalid number mode!")
+
+
+def dumps(obj: Any) -> str:
+    """Serialize an object the way Dynamo saves graphs, with any number mode
+
+    Args:
+        obj (Any): The object, with RawNumbers, Decimals or floats
+
+    Returns:
+        str: The json string
+    """
+    return "".join(_ENCODER.iterencode(obj))
@@ -0,0 +1,385 @@
+from __future__ import annotations
+import logging
+import os
+import pathlib
+import sqlite3
+
+from dyn2py.files import DynamoFile, File, DYNAMO_NEWLINE, content_checksum, relative_posix_path, translate_newlines
+from dyn2py.archives import Archive, split_member_path
+from dyn2py.fscache import decode_text
+from dyn2py.stats import STATS
+
+
+SEARCH_INDEX_VERSION = 1
+SEARCH_RESULT_LIMIT = 100
+"""Default number of results of a search"""
+
+
+def read_signature(filepath: pathlib.Path) -> tuple[float, int]:
+    """Get the modification time and the size of a graph, without reading it
+
+    Args:
+        filepath (pathlib.Path): Path to the graph, or a member path in an archive
+
+    Raises:
+        FileNotFoundError: The graph does not exist
+
+    Returns:
+        tuple[float, int]: Modification time and size. The size of graphs in archives is 0
+    """
+    archive_member = split_member_path(filepath)
+    if archive_member:
+        return Archive.open(archive_member[0]).get_mtime(archive_member[1]), 0
+    stat_result = os.stat(filepath)
+    return stat_result.st_mtime, stat_result.st_size
+
+
+def read_text(filepath: pathlib.Path) -> str:
+    """Read the text of a graph
+
+    Args:
+        filepath (pathlib.Path): Path to the graph, or a member path in an archive
+
+    Returns:
+        str: The text, every line ending is \\n
+    """
+    archive_member = split_member_path(filepath)
+    if archive_member:
+        data = Archive.open(archive_member[0]).read(archive_member[1])
+    else:
+        with open(filepath, "rb") as graph_file:
+            data = graph_file.read()
+        STATS.count("bytes_read", len(data))
+    return decode_text(data)
+
+
+class _TextDynamoFile(DynamoFile):
+    """A graph parsed from its text, already read for its checksum. Subclass of DynamoFile()"""
+
+    __slots__ = ("text",)
+
+    read_only = True
+
+    def __init__(self, filepath: pathlib.Path, text: str, mtime: float) -> None:
+        """Parse a graph from its text
+
+        Args:
+            filepath (pathlib.Path): Path to the graph, or a member path in an archive
+            text (str): The text of the graph
+            mtime (float): Modification time of the graph
+        """
+        self.text: str = text
+        """The text of the graph"""
+        super().__init__(filepath)
+        self.mtime = mtime
+
+    def _read_metadata(self) -> None:
+        self.exists = True
+
+    def _read_text(self) -> str:
+        return self.text
+
+    def _write_file(self) -> None:
+        raise self.Error("Indexed graphs cannot be written!", self)
+
+
+class SearchResult():
+    """A python node matching a search"""
+
+    __slots__ = ("dyn_path", "dyn_uuid", "dyn_name", "py_id", "py_name", "py_engine", "snippet")
+
+    def __init__(self, dyn_path: str, dyn_uuid: str, dyn_name: str, py_id: str, py_name: str, py_engine: str,
+                 snippet: str) -> None:
+        """Generate a search result
+
+        Args:
+            dyn_path (str): Path to the graph, relative to the folder of the index
+            dyn_uuid (str): Uuid of the graph
+            dyn_name (str): Name of the graph
+            py_id (str): Id of the node
+            py_name (str): Name of the node
+            py_engine (str): Engine of the node
+            snippet (str): The matching part of the code, the matches are between [ and ]
+        """
+        self.dyn_path: str = dyn_path
+        """Path to the graph, relative to the folder of the index"""
+        self.dyn_uuid: str = dyn_uuid
+        """Uuid of the graph"""
+        self.dyn_name: str = dyn_name
+        """Name of the graph"""
+        self.py_id: str = py_id
+        """Id of the node"""
+        self.py_name: str = py_name
+        """Name of the node"""
+        self.py_engine: str = py_engine
+        """Engine of the node"""
+        self.snippet: str = snippet
+        """The matching part of the code, the matches are between [ and ]"""
+
+    def to_dict(self) -> dict:
+        """Get the result as a json serializable dict
+
+        Returns:
+            dict: The result
+        """
+        return {
+            "dyn_path": self.dyn_path,
+            "dyn_uuid": self.dyn_uuid,
+            "dyn_name": self.dyn_name,
+            "py_id": self.py_id,
+            "py_name": self.py_name,
+            "py_engine": self.py_engine,
+            "snippet": self.snippet
+        }
+
+
+class SearchIndex():
+    """Full-text index of the code, names and engines of python nodes, and of their graphs, in an SQLite FTS5 database.
+        Only graphs with a changed modification time and content are read again"""
+
+    def __init__(self, filepath: pathlib.Path) -> None:
+        """Open or create an index
+
+        Args:
+            filepath (pathlib.Path): Path to the database file
+
+        Raises:
+            SearchIndex.Error: Not a valid index, or SQLite has no FTS5 support
+        """
+        self.filepath: pathlib.Path = filepath
+        """Path to the database file"""
+        self.folder: pathlib.Path = filepath.parent
+        """Paths of graphs are relative to this folder"""
+        self.modified: bool = False
+        """Graphs were indexed again or removed since it was opened"""
+        try:
+            self.connection: sqlite3.Connection = sqlite3.connect(filepath)
+            """The database connection"""
+            self._create_tables()
+        except sqlite3.DatabaseError as e:
+            raise self.Error(f"Cannot open search index! {e}", filepath)
+
+    def _create_tables(self) -> None:
+        """Create the tables of a new index, check the version of an existing one"""
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta(key TEXT PRIMARY KEY, value TEXT)")
+            row = self.connection.execute(
+                "SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row and row[0] != str(SEARCH_INDEX_VERSION):
+                raise sqlite3.DatabaseError(f"Unsupported index version: {row[0]}")
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(SEARCH_INDEX_VERSION),))
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS graphs("
+                "path TEXT PRIMARY KEY, uuid TEXT, name TEXT, mtime REAL, size INTEGER, checksum TEXT)")
+            self.connection.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS nodes USING fts5("
+                "code, py_name, py_engine, dyn_name, dyn_path UNINDEXED, dyn_uuid UNINDEXED, py_id UNINDEXED)")
+
+    def close(self) -> None:
+        """Close the database"""
+        self.connection.close()
+
+    def __enter__(self) -> SearchIndex:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def update_graph(self, filepath: pathlib.Path) -> bool:
+        """Index a graph, if its modification time and content changed since it was last indexed.
+            The graph is read only once, and only parsed if its content changed
+
+        Args:
+            filepath (pathlib.Path): Path to the graph
+
+        Raises:
+            FileNotFoundError: The graph does not exist
+            DynamoFile.Error: It's a Dynamo 1 file
+
+        Returns:
+            bool: True if the graph was read again
+        """
+        dyn_path = relative_posix_path(filepath, self.folder)
+        signature = read_signature(filepath)
+        checksum = self._get_checksum(dyn_path, signature)
+        if checksum is None:
+            return False
+
+        text = read_text(filepath)
+        if content_checksum(text) == checksum:
+            self._update_signature(dyn_path, signature)
+            return False
+
+        try:
+            dynamo_file = _TextDynamoFile(filepath, text, signature[0])
+        except DynamoFile.PythonNodeNotFound as e:
+            # Graphs without python nodes are indexed too, they are not read again:
+            dynamo_file = e.file
+        # Only the nodes are kept:
+        File.open_files.discard(dynamo_file)
+        self._write_graph(dyn_path, dynamo_file, signature)
+        return True
+
+    def add_graph(self, dynamo_file: DynamoFile) -> bool:
+        """Index a graph that is already read, if its modification time and content changed since it was
+            last indexed. The graph is not read again
+
+        Args:
+            dynamo_file (DynamoFile): The graph, read or just written
+
+        Returns:
+            bool: True if its nodes were indexed again
+        """
+        dyn_path = relative_posix_path(dynamo_file.filepath, self.folder)
+        try:
+            signature = read_signature(dynamo_file.filepath)
+        except FileNotFoundError:
+            return False
+        checksum = self._get_checksum(dyn_path, signature)
+        if checksum is None:
+            return False
+
+        if dynamo_file.content_checksum == checksum:
+            self._update_signature(dyn_path, signature)
+            return False
+
+        self._write_graph(dyn_path, dynamo_file, signature)
+        return True
+
+    def _get_checksum(self, dyn_path: str, signature: tuple[float, int]) -> str | None:
+        """Get the checksum of an indexed graph, if its modification time or size changed
+
+        Args:
+            dyn_path (str): Path of the graph, relative to the folder of the index
+            signature (tuple[float, int]): Modification time and size of the graph
+
+        Returns:
+            str | None: The checksum. Empty string if it's not indexed yet, None if it did not change
+        """
+        row = self.connection.execute(
+            "SELECT mtime, size, checksum FROM graphs WHERE path = ?", (dyn_path,)).fetchone()
+        if not row:
+            return ""
+        if (row[0], row[1]) == signature:
+            STATS.count("search_index_unchanged")
+            return None
+        return row[2]
+
+    def _update_signature(self, dyn_path: str, signature: tuple[float, int]) -> None:
+        """Only the modification time of a graph changed, store the new one
+
+        Args:
+            dyn_path (str): Path of the graph, relative to the folder of the index
+            signature (tuple[float, int]): Modification time and size of the graph
+        """
+        with self.connection:
+            self.connection.execute(
+                "UPDATE graphs SET mtime = ?, size = ? WHERE path = ?", (*signature, dyn_path))
+        STATS.count("search_index_unchanged")
+
+    def _write_graph(self, dyn_path: str, dynamo_file: DynamoFile, signature: tuple[float, int]) -> None:
+        """Replace the nodes of a graph in the index
+
+        Args:
+            dyn_path (str): Path of the graph, relative to the folder of the index
+            dynamo_file (DynamoFile): The read graph
+            signature (tuple[float, int]): Modification time and size of the graph
+        """
+        python_nodes = sorted(dynamo_file.python_nodes, key=lambda n: n.id)
+        with self.connection:
+            self.connection.execute("DELETE FROM nodes WHERE dyn_path = ?", (dyn_path,))
+            self.connection.execute(
+                "INSERT OR REPLACE INTO graphs VALUES (?, ?, ?, ?, ?, ?)",
+                (dyn_path, dynamo_file.uuid, dynamo_file.name, *signature, dynamo_file.content_checksum))
+            self.connection.executemany(
+                "INSERT INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(translate_newlines(n.code_text, DYNAMO_NEWLINE, "\n"), n.name, n.engine, dynamo_file.name,
+                  dyn_path, dynamo_file.uuid, n.id) for n in python_nodes])
+
+        self.modified = True
+        STATS.count("search_index_updated")
+        logging.debug(f"Indexed {len(python_nodes)} python nodes: {dynamo_file.filepath}")
+
+    def remove_missing(self, folders: list[pathlib.Path], filepaths: list[pathlib.Path]) -> int:
+        """Remove the graphs of the folders from the index, if they are not in the list anymore
+
+        Args:
+            folders (list[pathlib.Path]): Indexed folders or archives
+            filepaths (list[pathlib.Path]): The graphs in them now
+
+        Returns:
+            int: Number of removed graphs
+        """
+        prefixes = []
+        for folder in folders:
+            relative_folder = relative_posix_path(folder, self.folder)
+            if relative_folder == ".":
+                prefixes.append("")
+            else:
+                # Members of archives start with the path of the archive:
+                prefixes.extend([relative_folder + "/", relative_folder + "!/"])
+        current = {relative_posix_path(f, self.folder) for f in filepaths}
+
+        missing = [path for (path,) in self.connection.execute("SELECT path FROM graphs")
+                   if path not in current and path.startswith(tuple(prefixes))]
+        with self.connection:
+            for path in missing:
+                self.connection.execute("DELETE FROM graphs WHERE path = ?", (path,))
+                self.connection.execute("DELETE FROM nodes WHERE dyn_path = ?", (path,))
+        if missing:
+            self.modified = True
+        return len(missing)
+
+    def get_graph_nodes(self, filepath: pathlib.Path) -> tuple[str, list[tuple[str, str, str]]] | None:
+        """Get the uuid and the python nodes of an indexed graph
+
+        Args:
+            filepath (pathlib.Path): Path to the graph
+
+        Returns:
+            tuple[str, list[tuple[str, str, str]]] | None: The uuid, and the id, name and code of every node,
+                with LF line endings. None, if the graph is not indexed
+        """
+        dyn_path = relative_posix_path(filepath, self.folder)
+        row = self.connection.execute(
+            "SELECT uuid FROM graphs WHERE path = ?", (dyn_path,)).fetchone()
+        if not row:
+            return None
+        nodes = self.connection.execute(
+            "SELECT py_id, py_name, code FROM nodes WHERE dyn_path = ?", (dyn_path,)).fetchall()
+        return row[0], nodes
+
+    def search(self, query: str, limit: int = SEARCH_RESULT_LIMIT) -> list[SearchResult]:
+        """Search python nodes. Searches in code, node name, engine and graph name
+
+        Args:
+            query (str): FTS5 query, like: FilteredElementCollector AND "OST_Walls"
+            limit (int, optional): Maximum number of results. Defaults to SEARCH_RESULT_LIMIT.
+
+        Raises:
+            ValueError: Invalid query
+
+        Returns:
+            list[SearchResult]: The results, the best matches first
+        """
+        try:
+            rows = self.connection.execute(
+                "SELECT dyn_path, dyn_uuid, dyn_name, py_id, py_name, py_engine, "
+                "snippet(nodes, 0, '[', ']', '...', 16) FROM nodes WHERE nodes MATCH ? ORDER BY rank LIMIT ?",
+                (query, limit)).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Invalid query: {e}")
+        return [SearchResult(*row) for row in rows]
+
+    class Error(Exception):
+        def __init__(self, message: str, filepath: pathlib.Path) -> None:
+            """There is some problem with this index
+
+            Args:
+                message (str): The message to display
+                filepath (pathlib.Path): Path to the index
+            """
+            super().__init__(message)
+            self.filepath = filepath
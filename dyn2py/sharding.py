@@ -0,0 +1,167 @@
+from __future__ import annotations
+import filecmp
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import shutil
+
+from dyn2py.files import File, PythonFile, PYTHON_EXTENSION, mirror_path
+from dyn2py.options import Options
+from dyn2py.locking import FolderLock
+from dyn2py.manifest import Manifest, MANIFEST_FILENAME
+from dyn2py.syncstate import SyncState, SYNC_STATE_FILENAME
+from dyn2py import events
+
+
+def shard_key(filepath: pathlib.Path) -> str:
+    """Get the key of a graph, the same on every machine: the path relative to the working directory
+
+    Args:
+        filepath (pathlib.Path): Path to the graph, or a member path in an archive
+
+    Returns:
+        str: The key
+    """
+    return mirror_path(pathlib.Path(os.path.realpath(filepath))).as_posix()
+
+
+def _get_graph_path(filepath: pathlib.Path, options: Options) -> pathlib.Path:
+    """Get the graph of a python file from its header, so it's in the same shard as the graph.
+        Shared scripts without header are sharded by their own path
+
+    Args:
+        filepath (pathlib.Path): Path to the python file
+        options (Options): Run options, for finding moved graphs
+
+    Returns:
+        pathlib.Path: Path to the graph
+    """
+    python_file = PythonFile(filepath)
+    File.open_files.discard(python_file)
+    if "dyn_path" not in python_file.header_data:
+        return filepath
+    return python_file.get_source_dynamo_path(options)
+
+
+def _get_size(filepath: pathlib.Path) -> int:
+    """Get the size of a file, 0 for archive members"""
+    try:
+        return os.path.getsize(filepath)
+    except OSError:
+        return 0
+
+
+def assign_shards(keys: dict[str, int], count: int, shard_by: str) -> dict[str, int]:
+    """Assign keys to shards. Every machine gets the same result from the same keys
+
+    Args:
+        keys (dict[str, int]): Keys and their sizes
+        count (int): Number of shards
+        shard_by (str): 'hash': by the hash of the key, 'size': balance the sizes of the shards
+
+    Returns:
+        dict[str, int]: Index of the shard of every key, starting from 1
+    """
+    if shard_by == "hash":
+        return {key: int(hashlib.md5(key.encode("utf-8")).hexdigest(), 16) % count + 1
+                for key in keys}
+
+    # Largest first, always to the smallest shard:
+    shard_sizes = [0] * count
+    shards = {}
+    for key in sorted(keys, key=lambda k: (-keys[k], k)):
+        index = shard_sizes.index(min(shard_sizes))
+        shard_sizes[index] += max(keys[key], 1)
+        shards[key] = index + 1
+    return shards
+
+
+def select_shard(source_files: list[pathlib.Path], options: Options) -> list[pathlib.Path]:
+    """Select the sources of the shard of the options. Python files are in the shard of their graph
+
+    Args:
+        source_files (list[pathlib.Path]): Every source
+        options (Options): Run options with the shard
+
+    Returns:
+        list[pathlib.Path]: Sources of this shard, in the original order
+    """
+    source_keys = {}
+    keys: dict[str, int] = {}
+    for source_file in source_files:
+        if source_file.suffix == PYTHON_EXTENSION:
+            key = shard_key(_get_graph_path(source_file, options))
+        else:
+            key = shard_key(source_file)
+        source_keys[source_file] = key
+        keys[key] = keys.get(key, 0) + _get_size(source_file)
+
+    index, count = Options.parse_shard(options.shard)
+    shards = assign_shards(keys, count, options.shard_by)
+    selected = [f for f in source_files if shards[source_keys[f]] == index]
+    logging.info(f"Shard {index}/{count}: {len(selected)} of {len(source_files)} files")
+    return selected
+
+
+def merge_shard_folder(folder: pathlib.Path, options: Options) -> None:
+    """Merge the python folder of a shard to options.python_folder: copy the scripts,
+        and merge the manifests and the sync states. Scripts are kept at the same relative path
+
+    Args:
+        folder (pathlib.Path): The python folder of the shard
+        options (Options): Run options
+    """
+    for source_path in sorted(folder.rglob("*")):
+        relative_path = source_path.relative_to(folder)
+        target_path = options.python_folder.joinpath(relative_path)
+
+        if source_path.name == MANIFEST_FILENAME:
+            with open(source_path, "r", encoding="utf-8") as manifest_file:
+                manifest = Manifest.for_folder(target_path.parent)
+                manifest.merge(json.load(manifest_file))
+                manifest.modified = True
+
+        elif source_path.name == SYNC_STATE_FILENAME:
+            sync_state = SyncState(source_path.parent)
+            sync_state.load()
+            for filename, checksum in sync_state.checksums.items():
+                SyncState.record(target_path.parent.joinpath(filename), checksum)
+
+        elif source_path.suffix == PYTHON_EXTENSION and source_path.is_file():
+            _copy_script(source_path, target_path, options)
+
+
+def _copy_script(source_path: pathlib.Path, target_path: pathlib.Path, options: Options) -> None:
+    """Copy a script of a shard, if it's not there yet. Keeps the modification time
+
+    Args:
+        source_path (pathlib.Path): The script of the shard
+        target_path (pathlib.Path): The merged script
+        options (Options): Run options
+    """
+    if target_path.exists():
+        if filecmp.cmp(source_path, target_path, shallow=False):
+            events.emit("skipped", target_path, "unchanged")
+        else:
+            logging.error(f"An other shard has a different script: {target_path}")
+            events.emit("failed", target_path, "conflict")
+        return
+
+    if options.dry_run:
+        logging.info(f"Should copy script, but it's a dry-run: {target_path}")
+        events.emit("skipped", target_path, "dry_run")
+        return
+
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with FolderLock(target_path.parent):
+            shutil.copy2(source_path, target_path)
+    except FolderLock.Error as e:
+        logging.error(f"{e}, not writing: {target_path}")
+        events.emit("failed", target_path, "locked")
+        return
+    events.emit("written", target_path)
+    if options.loglevel == "HEADLESS" and not options.output:
+        print(target_path, flush=True)
@@ -0,0 +1,251 @@
+from __future__ import annotations
+import contextlib
+import json
+import os
+import pathlib
+import time
+from typing import ContextManager
+
+from dyn2py.events import Event
+
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class Stats():
+    """Timers and counters of a run. Does nothing while disabled"""
+
+    def __init__(self, enabled: bool = False) -> None:
+        """Generate a Stats object
+
+        Args:
+            enabled (bool, optional): Collect timings and counters. Defaults to False.
+        """
+        self.enabled: bool = enabled
+        """If timings and counters are collected"""
+        self.timings: dict[str, float] = {}
+        """Seconds spent in each phase"""
+        self.calls: dict[str, int] = {}
+        """Number of times each phase was entered"""
+        self.counters: dict[str, int] = {}
+        """Counters, like bytes read or cache hits"""
+        self.skipped: dict[str, int] = {}
+        """Number of skipped files by the reason"""
+
+    def reset(self, enabled: bool | None = None) -> None:
+        """Clear every timer and counter
+
+        Args:
+            enabled (bool | None, optional): Enable or disable collecting. None to keep the current state. Defaults to None.
+        """
+        if enabled is not None:
+            self.enabled = enabled
+        self.timings.clear()
+        self.calls.clear()
+        self.counters.clear()
+        self.skipped.clear()
+
+    def timer(self, phase: str) -> ContextManager:
+        """Measure the time spent in a with block
+
+        Args:
+            phase (str): The name of the phase
+
+        Returns:
+            ContextManager: The timer. A shared no-op context manager, if disabled
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, phase)
+
+    def count(self, counter: str, value: int = 1) -> None:
+        """Increase a counter
+
+        Args:
+            counter (str): The name of the counter
+            value (int, optional): Increase by this. Defaults to 1.
+        """
+        if self.enabled:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def skip(self, reason: str) -> None:
+        """Count a skipped file
+
+        Args:
+            reason (str): Why was it skipped
+        """
+        if self.enabled:
+            self.skipped[reason] = self.skipped.get(reason, 0) + 1
+
+    def merge(self, stats: dict) -> None:
+        """Add the timers and counters of an other run, like the json report of a shard
+
+        Args:
+            stats (dict): The stats, in the format of to_dict()
+        """
+        if not self.enabled:
+            return
+        for phase, seconds in stats.get("timings", {}).items():
+            self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+        for phase, calls in stats.get("calls", {}).items():
+            self.calls[phase] = self.calls.get(phase, 0) + calls
+        for counter, value in stats.get("counters", {}).items():
+            self.counters[counter] = self.counters.get(counter, 0) + value
+        for reason, value in stats.get("skipped", {}).items():
+            self.skipped[reason] = self.skipped.get(reason, 0) + value
+
+    def handle_event(self, event: Event) -> None:
+        """Count written, skipped, backed up, failed and removed files, use it as an event listener
+
+        Args:
+            event (Event): The event
+        """
+        if event.kind == "skipped":
+            self.skip(event.reason)
+        elif event.kind == "written":
+            self.count("files_written")
+        elif event.kind == "backed_up":
+            self.count("backups")
+        elif event.kind == "failed":
+            self.count("files_failed")
+        elif event.kind == "removed":
+            self.count("files_removed")
+
+    def to_dict(self) -> dict:
+        """Get every timer and counter as a dict
+
+        Returns:
+            dict: The stats
+        """
+        return {
+            "timings": dict(self.timings),
+            "calls": dict(self.calls),
+            "counters": dict(self.counters),
+            "skipped": dict(self.skipped)
+        }
+
+    def to_text(self) -> str:
+        """Get a human readable summary
+
+        Returns:
+            str: The summary
+        """
+        lines = ["Run stats:",
+                 f"  {'phase':<20}{'calls':>10}{'seconds':>12}"]
+        for phase, seconds in self.timings.items():
+            lines.append(
+                f"  {phase:<20}{self.calls[phase]:>10}{seconds:>12.4f}")
+
+        if self.counters:
+            lines.append("  counters:")
+            for counter, value in self.counters.items():
+                lines.append(f"    {counter:<28}{value:>12}")
+
+        for direction, phase in [("read", "read"), ("written", "write")]:
+            size = self.counters.get(f"bytes_{direction}", 0)
+            seconds = self.timings.get(phase, 0.0)
+            if size and seconds:
+                lines.append(
+                    f"  {direction} throughput: {size / seconds / 1e6:.2f} MB/s")
+
+        if self.skipped:
+            lines.append("  skipped files:")
+            for reason, value in self.skipped.items():
+                lines.append(f"    {reason:<28}{value:>12}")
+
+        return os.linesep.join(lines)
+
+    def to_json(self) -> str:
+        """Get every timer and counter as a json string
+
+        Returns:
+            str: The json
+        """
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Get every timer and counter in the Prometheus text format, for the textfile collector
+
+        Returns:
+            str: The metrics
+        """
+        lines = [
+            "# HELP dyn2py_phase_seconds Seconds spent in each phase of the last run.",
+            "# TYPE dyn2py_phase_seconds gauge"
+        ]
+        lines.extend(f'dyn2py_phase_seconds{{phase="{phase}"}} {seconds}'
+                     for phase, seconds in self.timings.items())
+        lines.extend([
+            "# HELP dyn2py_phase_calls Number of times each phase was entered in the last run.",
+            "# TYPE dyn2py_phase_calls gauge"
+        ])
+        lines.extend(f'dyn2py_phase_calls{{phase="{phase}"}} {calls}'
+                     for phase, calls in self.calls.items())
+        for counter, value in self.counters.items():
+            lines.extend([
+                f"# TYPE dyn2py_{counter} gauge",
+                f"dyn2py_{counter} {value}"
+            ])
+        lines.extend([
+            "# HELP dyn2py_skipped_files Number of skipped files by the reason in the last run.",
+            "# TYPE dyn2py_skipped_files gauge"
+        ])
+        lines.extend(f'dyn2py_skipped_files{{reason="{reason}"}} {value}'
+                     for reason, value in self.skipped.items())
+        return "\n".join(lines) + "\n"
+
+    def report(self, stats_format: str, output: pathlib.Path | None = None) -> str:
+        """Generate a report, and optionally save it
+
+        Args:
+            stats_format (str): 'text', 'json' or 'prometheus'
+            output (pathlib.Path | None, optional): Save the report to this file. Defaults to None.
+
+        Raises:
+            ValueError: Invalid format
+
+        Returns:
+            str: The report
+        """
+        if stats_format == "text":
+            report = self.to_text()
+        elif stats_format == "json":
+            report = self.to_json()
+        elif stats_format == "prometheus":
+            report = self.to_prometheus()
+        else:
+            raise ValueError("Invalid stats format!")
+
+        if output:
+            # Replace atomically, collectors should never see a half written file:
+            temp_output = output.with_name(f".{output.name}.tmp")
+            with open(temp_output, "w", encoding="utf-8", newline="\n") as output_file:
+                output_file.write(report)
+            os.replace(temp_output, output)
+
+        return report
+
+
+class _Timer():
+    """Context manager adding the elapsed time to a phase"""
+
+    __slots__ = ("stats", "phase", "start")
+
+    def __init__(self, stats: Stats, phase: str) -> None:
+        self.stats = stats
+        self.phase = phase
+        self.start = 0.0
+
+    def __enter__(self) -> _Timer:
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        elapsed = time.perf_counter() - self.start
+        timings = self.stats.timings
+        timings[self.phase] = timings.get(self.phase, 0.0) + elapsed
+        self.stats.calls[self.phase] = self.stats.calls.get(self.phase, 0) + 1
+
+
+STATS = Stats()
+"""Stats of the current run, enabled by run() with the stats option"""
@@ -0,0 +1,138 @@
+from __future__ import annotations
+import json
+import logging
+import os
+import pathlib
+
+from dyn2py.locking import FolderLock
+
+
+SYNC_STATE_FILENAME = ".dyn2py_sync.json"
+"""Name of the sync state file in every folder of python scripts"""
+SYNC_STATE_VERSION = 1
+
+
+class SyncState():
+    """The checksum of the code of every script, when it was last synchronized with its node.
+        Extraction and update compare the script and the node with it, instead of modification times"""
+
+    states: dict[pathlib.Path, SyncState] = {}
+    """Sync states used in this process, by their folder"""
+
+    def __init__(self, folder: pathlib.Path) -> None:
+        """Generate an empty sync state. Call load() to read it from the folder
+
+        Args:
+            folder (pathlib.Path): The folder of the scripts
+        """
+        self.folder: pathlib.Path = folder
+        """The folder of the scripts"""
+        self.checksums: dict[str, str] = {}
+        """Last synchronized checksums by the filename of the scripts"""
+        self.modified: bool = False
+        """If the state should be saved"""
+        self.recorded: set[str] = set()
+        """Scripts recorded in this process, other entries of the file can be changed by other processes"""
+
+    @classmethod
+    def for_folder(cls, folder: pathlib.Path) -> SyncState:
+        """Get the sync state of a folder, read it if it's the first time
+
+        Args:
+            folder (pathlib.Path): The folder of the scripts
+
+        Returns:
+            SyncState: The sync state
+        """
+        key = folder.resolve()
+        if key not in cls.states:
+            cls.states[key] = cls(folder)
+            cls.states[key].load()
+        return cls.states[key]
+
+    @classmethod
+    def get_base(cls, filepath: pathlib.Path) -> str | None:
+        """Get the last synchronized checksum of a script
+
+        Args:
+            filepath (pathlib.Path): Path to the script
+
+        Returns:
+            str | None: The checksum. None, if the script was not synchronized yet
+        """
+        return cls.for_folder(filepath.parent).checksums.get(filepath.name)
+
+    @classmethod
+    def record(cls, filepath: pathlib.Path, checksum: str) -> None:
+        """Record that a script and its node have the same code
+
+        Args:
+            filepath (pathlib.Path): Path to the script
+            checksum (str): Checksum of the code
+        """
+        state = cls.for_folder(filepath.parent)
+        if state.checksums.get(filepath.name) != checksum:
+            state.checksums[filepath.name] = checksum
+            state.recorded.add(filepath.name)
+            state.modified = True
+
+    @classmethod
+    def forget(cls, filepath: pathlib.Path) -> None:
+        """Remove a deleted script from the sync state
+
+        Args:
+            filepath (pathlib.Path): Path to the script
+        """
+        state = cls.for_folder(filepath.parent)
+        if filepath.name in state.checksums:
+            del state.checksums[filepath.name]
+            state.recorded.add(filepath.name)
+            state.modified = True
+
+    @property
+    def filepath(self) -> pathlib.Path:
+        """Path to the sync state file"""
+        return self.folder.joinpath(SYNC_STATE_FILENAME)
+
+    def load(self) -> None:
+        """Read the sync state file. Missing or invalid files are ignored, scripts are compared by time then"""
+        try:
+            with open(self.filepath, "r", encoding="utf-8") as state_file:
+                state = json.load(state_file)
+            if state.get("version") != SYNC_STATE_VERSION:
+                return
+            self.checksums = dict(state["scripts"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+
+    def save(self) -> bool:
+        """Write the sync state file, if the folder is writable.
+            Only the scripts recorded in this process are changed, the file is read again before writing
+
+        Returns:
+            bool: True if the file was written
+        """
+        try:
+            with FolderLock(self.folder):
+                recorded = {name: self.checksums.get(name) for name in self.recorded}
+                self.load()
+                for name, checksum in recorded.items():
+                    if checksum:
+                        self.checksums[name] = checksum
+                    else:
+                        # Forgotten scripts:
+                        self.checksums.pop(name, None)
+                state = {
+                    "version": SYNC_STATE_VERSION,
+                    "scripts": dict(sorted(self.checksums.items()))
+                }
+                temp_path = self.filepath.with_name(f".{self.filepath.name}.tmp")
+                with open(temp_path, "w", encoding="utf-8", newline="\n") as state_file:
+                    json.dump(state, state_file, indent=1)
+                os.replace(temp_path, self.filepath)
+        except (OSError, FolderLock.Error) as e:
+            logging.debug(f"Cannot save sync state: {self.filepath} {e}")
+            return False
+        self.modified = False
+        self.recorded.clear()
+        return True
@@ -0,0 +1,91 @@
+import unittest
+import dyn2py
+import pathlib
+import tarfile
+import tempfile
+import zipfile
+
+from dyn2py.archives import Archive, member_path, split_member_path
+from tests.support import *
+
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        dyn2py.File.open_files.clear()
+        dyn2py.PythonFile.source_dynamo_files.clear()
+        self.addCleanup(Archive.close_all)
+
+    def make_archives(self, folder: pathlib.Path) -> list[pathlib.Path]:
+        zip_path = folder.joinpath("delivery.zip")
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.write(f"{INPUT_DIR}/single_node.dyn", "graphs/single_node.dyn")
+            zip_file.write(f"{INPUT_DIR}/no_python.dyn", "no_python.dyn")
+            zip_file.writestr("readme.txt", "not a graph")
+
+        tar_path = folder.joinpath("delivery.tar.gz")
+        with tarfile.open(tar_path, "w:gz") as tar_file:
+            tar_file.add(f"{INPUT_DIR}/single_node.dyn", "./graphs/single_node.dyn")
+            tar_file.add(f"{INPUT_DIR}/no_python.dyn", "no_python.dyn")
+
+        return [zip_path, tar_path]
+
+    def test_member_path(self):
+        archive_path = pathlib.Path("folder/delivery.zip")
+        path = member_path(archive_path, "graphs/graph.dyn")
+        self.assertEqual(path.as_posix(), "folder/delivery.zip!/graphs/graph.dyn")
+        self.assertEqual(path.suffix, ".dyn")
+        self.assertEqual(split_member_path(path), (archive_path, "graphs/graph.dyn"))
+        self.assertIsNone(split_member_path(pathlib.Path("folder/graph!/graph.dyn")))
+        self.assertIsNone(split_member_path(archive_path))
+
+    def test_read_member(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for archive_path in self.make_archives(pathlib.Path(temp_dir)):
+                with self.subTest(archive=archive_path.name):
+                    archive = Archive.open(archive_path)
+                    self.assertIs(Archive.open(archive_path), archive)
+                    self.assertEqual(archive.get_member_names(dyn2py.DYNAMO_EXTENSIONS),
+                                     ["graphs/single_node.dyn", "no_python.dyn"])
+
+                    dyn = dyn2py.File(member_path(archive_path, "graphs/single_node.dyn"))
+                    self.assertIsInstance(dyn, dyn2py.ArchiveDynamoFile)
+                    self.assertTrue(dyn.exists)
+                    self.assertTrue(dyn.read_only)
+                    self.assertEqual(dyn.uuid, "76de5c79-17c5-4c74-9f90-ad99a213d339")
+                    self.assertEqual(dyn.dirpath, archive_path.parent)
+
+                    with self.assertRaises(FileNotFoundError):
+                        dyn2py.DynamoFile(member_path(archive_path, "missing.dyn"))
+
+    def test_run(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            folder = pathlib.Path(temp_dir)
+            scripts = folder.joinpath("scripts")
+            scripts.mkdir()
+
+            for archive_path in self.make_archives(folder):
+                with self.subTest(archive=archive_path.name):
+                    dyn2py.File.open_files.clear()
+                    for f in scripts.iterdir():
+                        f.unlink()
+
+                    result = dyn2py.run(dyn2py.Options(source=[archive_path], python_folder=scripts))
+                    script_path = scripts.joinpath("single_node_1c5d99792882409e97e132b3e9f814b0.py")
+                    self.assertEqual(result.written, [script_path])
+                    self.assertEqual(result.skipped, [
+                        (member_path(archive_path, "no_python.dyn"), "no_python_nodes")])
+
+                    # The header points into the archive:
+                    dyn2py.File.open_files.clear()
+                    py = dyn2py.PythonFile(script_path)
+                    self.assertEqual(py.header_data["dyn_path"],
+                                     f"../{archive_path.name}!/graphs/single_node.dyn")
+                    self.assertEqual(py.get_source_dynamo_file().uuid, py.header_data["dyn_uuid"])
+
+                    # Graphs in archives are not updated:
+                    script_path.write_text(py.text + "\n# changed\n")
+                    dyn2py.File.open_files.clear()
+                    result = dyn2py.run(dyn2py.Options(source=[script_path], force=True))
+                    self.assertEqual(result.skipped, [(script_path, "read_only")])
+                    self.assertEqual(result.written, [])
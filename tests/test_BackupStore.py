@@ -0,0 +1,97 @@
+import unittest
+import dyn2py
+import pathlib
+import shutil
+import tempfile
+import time
+
+from dyn2py.backup import BackupStore, DEFAULT_BACKUP_STORE
+from tests.support import *
+
+
+class TestBackupStore(unittest.TestCase):
+
+    def test_backup_and_restore(self):
+        for compress in [False, True]:
+            with self.subTest(compress=compress), tempfile.TemporaryDirectory() as temp_dir:
+                folder = pathlib.Path(temp_dir)
+                store = BackupStore(folder.joinpath("store"), compress=compress)
+                filepath = folder.joinpath("graph.dyn")
+
+                filepath.write_bytes(b"first")
+                first_path = store.backup(filepath, 1000.0)
+                self.assertFalse(filepath.exists())
+                self.assertEqual(first_path.suffix == ".gz", compress)
+
+                # Same content is stored once:
+                filepath.write_bytes(b"first")
+                self.assertEqual(store.backup(filepath, 2000.0), first_path)
+                filepath.write_bytes(b"second")
+                second_path = store.backup(filepath, 3000.0)
+                self.assertNotEqual(second_path, first_path)
+                self.assertEqual(len(list(folder.joinpath("store/objects").glob("*/*"))), 2)
+                self.assertEqual([e.mtime for e in store.entries(filepath)],
+                                 [1000.0, 2000.0, 3000.0])
+
+                # Restore the newest, the current file is backed up:
+                filepath.write_bytes(b"third")
+                third_mtime = filepath.stat().st_mtime
+                entry = store.restore(filepath)
+                self.assertEqual(entry.mtime, 3000.0)
+                self.assertEqual(filepath.read_bytes(), b"second")
+                self.assertEqual(filepath.stat().st_mtime, 3000.0)
+                self.assertEqual(len(store.entries(filepath)), 4)
+
+                self.assertIsNone(store.restore(folder.joinpath("other.dyn")))
+
+                # Keep the newest 2:
+                self.assertEqual(store.prune(keep=2), 2)
+                self.assertEqual([e.mtime for e in store.entries(filepath)],
+                                 [3000.0, third_mtime])
+                self.assertFalse(first_path.exists())
+                self.assertTrue(second_path.exists())
+
+                # Every backup is from the last day:
+                self.assertEqual(store.prune(days=1), 0)
+                self.assertEqual(len(store.entries()), 2)
+
+    def test_run(self):
+        cleanup_dirs()
+        dyn2py.File.open_files.clear()
+        shutil.copy(f"{INPUT_DIR}/single_node.dyn", f"{OUTPUT_DIR}/single_node.dyn")
+        script_path = pathlib.Path(
+            f"{OUTPUT_DIR}/single_node_1c5d99792882409e97e132b3e9f814b0.py")
+        store_path = pathlib.Path(OUTPUT_DIR, DEFAULT_BACKUP_STORE)
+        self.addCleanup(shutil.rmtree, store_path, ignore_errors=True)
+
+        options = dyn2py.Options(source=[f"{OUTPUT_DIR}/single_node.dyn"],
+                                 force=True, backup_store=DEFAULT_BACKUP_STORE)
+        self.assertTrue(options.backup)
+        dyn2py.run(options)
+        original_text = script_path.read_text()
+
+        for _ in range(3):
+            dyn2py.File.open_files.clear()
+            time.sleep(0.01)
+            result = dyn2py.run(options)
+            self.assertEqual(len(result.backed_up), 1)
+
+        store = BackupStore(store_path.resolve())
+        self.assertEqual(len(store.entries(script_path)), 3)
+        # The extraction times differ, every content is different:
+        self.assertEqual(len(list(store_path.glob("objects/*/*"))), 3)
+
+        # Retention:
+        dyn2py.File.open_files.clear()
+        dyn2py.run(dyn2py.Options(source=[f"{OUTPUT_DIR}/single_node.dyn"],
+                                  force=True, backup_store=DEFAULT_BACKUP_STORE, backup_keep=2))
+        self.assertEqual(len(store.entries(script_path)), 2)
+
+        # Restore:
+        script_path.write_text("broken")
+        dyn2py.File.open_files.clear()
+        result = dyn2py.run(dyn2py.Options(source=[script_path], restore=True))
+        self.assertEqual(result.written, [script_path])
+        self.assertNotEqual(script_path.read_text(), "broken")
+        self.assertEqual(original_text.splitlines()[-1],
+                         script_path.read_text().splitlines()[-1])
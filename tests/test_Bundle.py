@@ -0,0 +1,99 @@
+import unittest
+import dyn2py
+import json
+import pathlib
+import shutil
+import tempfile
+
+from dyn2py.bundle import Bundle, SOURCE_MAP_FILENAME
+from tests.support import *
+
+
+class TestBundle(unittest.TestCase):
+
+    def setUp(self):
+        dyn2py.File.open_files.clear()
+        dyn2py.PythonFile.source_dynamo_files.clear()
+
+    def make_graphs(self, folder: pathlib.Path) -> list[pathlib.Path]:
+        graphs = folder.joinpath("graphs")
+        graphs.mkdir()
+        graph_paths = []
+        for name in ["python_nodes.dyn", "single_node.dyn"]:
+            graph_paths.append(graphs.joinpath(name))
+            shutil.copy(f"{INPUT_DIR}/{name}", graph_paths[-1])
+        return graph_paths
+
+    def test_jsonl(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            folder = pathlib.Path(temp_dir)
+            graph_paths = self.make_graphs(folder)
+            bundle_path = folder.joinpath("bundle.jsonl")
+
+            result = dyn2py.run(dyn2py.Options(source=[graph_paths[0].parent], bundle=bundle_path))
+            self.assertEqual(result.written, [bundle_path])
+
+            records = [json.loads(line) for line in bundle_path.read_text().splitlines()]
+            self.assertEqual(len(records), 7)
+            self.assertEqual(records[-1]["dyn_path"], "graphs/single_node.dyn")
+            self.assertEqual(records[-1]["py_id"], "1c5d99792882409e97e132b3e9f814b0")
+
+            # Edit a node, every other node is unchanged:
+            records[-1]["code"] += "\n# bundle edit"
+            bundle_path.write_text("".join(json.dumps(r) + "\n" for r in records))
+            dyn2py.File.open_files.clear()
+            result = dyn2py.run(dyn2py.Options(source=[bundle_path], bundle_import=True))
+            self.assertEqual(result.written, [graph_paths[1]])
+            self.assertIn("# bundle edit", graph_paths[1].read_text())
+            self.assertEqual(len(result.skipped), 6)
+
+            # The graph changed since the export:
+            dyn2py.File.open_files.clear()
+            records[-1]["code"] += "\n# second edit"
+            bundle_path.write_text("".join(json.dumps(r) + "\n" for r in records))
+            result = dyn2py.run(dyn2py.Options(source=[bundle_path], bundle_import=True))
+            self.assertEqual(result.failed, [(graph_paths[1], "conflict")])
+            self.assertEqual(result.written, [])
+
+    def test_modules(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            folder = pathlib.Path(temp_dir)
+            graph_paths = self.make_graphs(folder)
+            bundle_path = folder.joinpath("bundle")
+
+            result = dyn2py.run(dyn2py.Options(
+                source=[graph_paths[0].parent], bundle=bundle_path, engine=["CPython3"]))
+            self.assertEqual(result.written, [bundle_path.joinpath("CPython3.py"),
+                                              bundle_path.joinpath(SOURCE_MAP_FILENAME)])
+
+            # Diagnostics map back to the nodes:
+            bundle = Bundle.load(bundle_path)
+            self.assertEqual(len(bundle.entries), 5)
+            entry = bundle.entries[-1]
+            self.assertEqual(bundle.lookup("CPython3.py", entry.start + 2),
+                             ("../graphs/single_node.dyn", "76de5c79-17c5-4c74-9f90-ad99a213d339",
+                              "1c5d99792882409e97e132b3e9f814b0", 3))
+            self.assertIsNone(bundle.lookup("CPython3.py", 1))
+
+            # Code is the same after a round trip:
+            dyn = dyn2py.DynamoFile(graph_paths[1])
+            self.assertEqual(entry.code_text, dyn.get_python_node_by_id(entry.py_id).code_text)
+
+            # Add lines to the first node, the next ones move:
+            module_path = bundle_path.joinpath("CPython3.py")
+            lines = module_path.read_text().split("\n")
+            lines.insert(bundle.entries[0].start - 1, "import json")
+            module_path.write_text("\n".join(lines))
+
+            dyn2py.File.open_files.clear()
+            result = dyn2py.run(dyn2py.Options(source=[bundle_path], bundle_import=True))
+            self.assertEqual(result.written, [graph_paths[0]])
+            dyn = dyn2py.DynamoFile(graph_paths[0])
+            self.assertTrue(dyn.get_python_node_by_id(
+                bundle.entries[0].py_id).code_text.startswith("import json\r\n"))
+
+    def test_invalid_bundle(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            bundle_path = pathlib.Path(temp_dir, "missing")
+            result = dyn2py.run(dyn2py.Options(source=[bundle_path], bundle_import=True))
+            self.assertEqual(result.failed, [(bundle_path, "invalid_bundle")])
@@ -0,0 +1,125 @@
+import unittest
+import dyn2py
+import json
+import pathlib
+import shutil
+import tempfile
+
+from dyn2py.syncstate import SyncState
+from tests.support import *
+
+
+class TestCleanup(unittest.TestCase):
+
+    def setUp(self):
+        dyn2py.File.open_files.clear()
+        dyn2py.PythonFile.source_dynamo_files.clear()
+        self.addCleanup(dyn2py.File.open_files.clear)
+        self.addCleanup(SyncState.states.clear)
+
+    def extract(self, folder: pathlib.Path) -> tuple[pathlib.Path, pathlib.Path]:
+        graphs = folder.joinpath("graphs")
+        graphs.mkdir()
+        python_folder = folder.joinpath("python")
+        python_folder.mkdir()
+        for name in ["python_nodes.dyn", "single_node.dyn"]:
+            shutil.copy(f"{INPUT_DIR}/{name}", graphs.joinpath(name))
+        dyn2py.run(dyn2py.Options(source=[graphs], python_folder=python_folder))
+        dyn2py.File.open_files.clear()
+        return graphs, python_folder
+
+    def rename_node(self, graph_path: pathlib.Path, node_id: str, name: str) -> None:
+        graph = json.loads(graph_path.read_text())
+        next(v for v in graph["View"]["NodeViews"] if v["Id"] == node_id)["Name"] = name
+        graph_path.write_text(json.dumps(graph))
+
+    def test_gc(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            graphs, python_folder = self.extract(pathlib.Path(temp_dir))
+            scripts = sorted(python_folder.glob("*.py"))
+            self.assertEqual(len(scripts), 7)
+
+            # Deleted graph:
+            graphs.joinpath("single_node.dyn").unlink()
+            single_script = python_folder.joinpath("single_node_1c5d99792882409e97e132b3e9f814b0.py")
+            # Renamed node, extracted again:
+            renamed_script = python_folder.joinpath("python_nodes_2047ce859d424496963582fbb7b6417f.py")
+            self.rename_node(graphs.joinpath("python_nodes.dyn"), "2047ce859d424496963582fbb7b6417f", "New name")
+            dyn2py.run(dyn2py.Options(source=[graphs], python_folder=python_folder))
+            dyn2py.File.open_files.clear()
+            # Deleted node:
+            deleted_script = python_folder.joinpath("python_nodes_ff087a3611b0478b95252f67e87be507.py")
+            deleted_script.write_text(deleted_script.read_text().replace(
+                "py_id:ff087a3611b0478b95252f67e87be507", "py_id:00000000000000000000000000000000") + "# Edit\n")
+
+            result = dyn2py.run(dyn2py.Options(source=[python_folder], gc=True, dry_run=True))
+            self.assertEqual(sorted(result.skipped), sorted([
+                (single_script, "graph_missing"),
+                (renamed_script, "dry_run"),
+                (deleted_script, "unsynced")]))
+            self.assertEqual(len(list(python_folder.glob("*.py"))), 8)
+
+            # Scripts of missing graphs and scripts with edits are kept:
+            result = dyn2py.run(dyn2py.Options(source=[python_folder], gc=True))
+            self.assertEqual(result.removed, [(renamed_script, "renamed")])
+            self.assertEqual(len(list(python_folder.glob("*.py"))), 7)
+
+            archive = pathlib.Path(temp_dir, "archive")
+            result = dyn2py.run(dyn2py.Options(source=[python_folder], gc=True, gc_archive=archive,
+                                               gc_missing_graphs=True))
+            self.assertEqual(sorted(result.removed), sorted([
+                (single_script, "graph_missing"),
+                (deleted_script, "node_missing")]))
+            self.assertEqual(len(list(python_folder.glob("*.py"))), 5)
+            self.assertEqual(len(list(archive.rglob("*.py"))), 2)
+            self.assertIsNone(SyncState.get_base(single_script))
+
+            # Nothing left to remove:
+            result = dyn2py.run(dyn2py.Options(source=[python_folder], gc=True, gc_missing_graphs=True))
+            self.assertEqual(result.removed, [])
+
+    def test_gc_index(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            graphs, python_folder = self.extract(pathlib.Path(temp_dir))
+            renamed_script = python_folder.joinpath("python_nodes_2047ce859d424496963582fbb7b6417f.py")
+            self.rename_node(graphs.joinpath("python_nodes.dyn"), "2047ce859d424496963582fbb7b6417f", "New name")
+            dyn2py.run(dyn2py.Options(source=[graphs], python_folder=python_folder))
+            dyn2py.File.open_files.clear()
+
+            # Nodes are read from the index, graphs are only read to update it:
+            index = pathlib.Path(temp_dir, "index.sqlite")
+            result = dyn2py.run(dyn2py.Options(source=[python_folder], gc=True, index=index, stats="json"))
+            self.assertEqual(result.removed, [(renamed_script, "renamed")])
+            result = dyn2py.run(dyn2py.Options(source=[python_folder], gc=True, index=index, stats="json"))
+            self.assertEqual(result.removed, [])
+            self.assertEqual(result.stats["counters"].get("dynamo_files_read", 0), 0)
+
+    def test_auto_gc(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            graphs, python_folder = self.extract(pathlib.Path(temp_dir))
+            old_script = python_folder.joinpath("python_nodes_2047ce859d424496963582fbb7b6417f.py")
+            self.rename_node(graphs.joinpath("python_nodes.dyn"), "2047ce859d424496963582fbb7b6417f", "New name")
+
+            result = dyn2py.run(dyn2py.Options(
+                source=[graphs.joinpath("python_nodes.dyn")], python_folder=python_folder, auto_gc=True))
+            self.assertEqual(result.removed, [(old_script, "renamed")])
+            self.assertTrue(python_folder.joinpath(
+                "python_nodes_2047ce859d424496963582fbb7b6417f_New name.py").exists())
+            self.assertFalse(old_script.exists())
+
+    def test_auto_gc_special_names(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            graphs = pathlib.Path(temp_dir, "graphs")
+            graphs.mkdir()
+            python_folder = pathlib.Path(temp_dir, "python")
+            python_folder.mkdir()
+            for name in ["graph1.dyn", "graph[1].dyn"]:
+                shutil.copy(f"{INPUT_DIR}/python_nodes.dyn", graphs.joinpath(name))
+            dyn2py.run(dyn2py.Options(source=[graphs], python_folder=python_folder))
+            dyn2py.File.open_files.clear()
+
+            # Scripts of graph1.dyn do not match the name of graph[1].dyn as a pattern:
+            result = dyn2py.run(dyn2py.Options(
+                source=[graphs.joinpath("graph[1].dyn")], python_folder=python_folder, auto_gc=True))
+            self.assertEqual(result.removed, [])
+            self.assertEqual(len(list(python_folder.glob("*.py"))), 12)
@@ -3,6 +3,7 @@ import unittest
 import subprocess
 import shutil
 import pathlib
+import json
 
 from tests.support import *
 
@@ -214,6 +215,49 @@ class TestCommandLine(unittest.TestCase):
                     file_backup["python_file_mtimes"][p] > file_force["python_file_mtimes"][p]
                 )
 
+    def test_dyn_stream(self):
+        for stream_args in [["-s"], ["--stream"], ["--stream-window", "2"]]:
+            cleanup_dirs()
+
+            for s in self.dyn_sources:
+                shutil.copy(f"{INPUT_DIR}/{s['filename']}",
+                            f"{OUTPUT_DIR}/{s['filename']}")
+
+            file_open = self.run_command(stream_args + [OUTPUT_DIR])
+
+            self.assertFalse(
+                bool(file_open["stderr"]), msg=file_open["stderr"])
+            self.assertEqual(len(file_open["python_file_mtimes"]),
+                             sum(s["output_file_count"] for s in self.dyn_sources))
+
+            # Headless output should list the written files:
+            process = subprocess.run(
+                f"dyn2py -l HEADLESS --force {' '.join(stream_args)} {OUTPUT_DIR}",
+                capture_output=True, shell=True)
+            written = process.stdout.decode().splitlines()
+            self.assertEqual(len(written),
+                             sum(s["output_file_count"] for s in self.dyn_sources))
+
+            # Update from the same scripts, nothing changed:
+            file_update = self.run_command(
+                ["--update"] + stream_args + [OUTPUT_DIR])
+            self.assertFalse(
+                bool(file_update["stderr"]), msg=file_update["stderr"])
+
+    def test_output_jsonl(self):
+        cleanup_dirs()
+
+        shutil.copy(f"{INPUT_DIR}/single_node.dyn",
+                    f"{OUTPUT_DIR}/single_node.dyn")
+
+        process = subprocess.run(f"dyn2py --output jsonl {OUTPUT_DIR}/single_node.dyn",
+                                 capture_output=True, shell=True)
+        lines = [json.loads(l) for l in process.stdout.decode().splitlines()]
+
+        self.assertEqual([l["event"] for l in lines], ["written", "finished"])
+        self.assertTrue(pathlib.Path(lines[0]["path"]).exists())
+        self.assertEqual(lines[1]["written"], 1)
+
     # def test_py(self):
     #     py_tests = self.generate_test_args(self.py_sources)
 
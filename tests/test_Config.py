@@ -0,0 +1,91 @@
+import unittest
+import dyn2py
+import pathlib
+import shutil
+import tempfile
+
+from tests.support import *
+
+
+WORKSPACE_CONFIG = """
+loglevel = "WARNING"
+deterministic = true
+
+[[roots]]
+source = "graphs/a"
+python-folder = "python/a"
+layout = "graph"
+
+[[roots]]
+source = ["graphs/b"]
+python_folder = "python/b"
+engine = "CPython3"
+"""
+
+
+class TestConfig(unittest.TestCase):
+
+    def setUp(self):
+        dyn2py.File.open_files.clear()
+        dyn2py.PythonFile.source_dynamo_files.clear()
+        self.addCleanup(dyn2py.File.open_files.clear)
+
+    def make_workspace(self, folder: pathlib.Path) -> pathlib.Path:
+        for name, graph in [("a", "single_node.dyn"), ("b", "python_nodes.dyn")]:
+            folder.joinpath("graphs", name).mkdir(parents=True)
+            folder.joinpath("python", name).mkdir(parents=True)
+            shutil.copy(f"{INPUT_DIR}/{graph}", folder.joinpath("graphs", name, graph))
+        config_path = folder.joinpath("dyn2py.toml")
+        config_path.write_text(WORKSPACE_CONFIG)
+        return config_path
+
+    def test_from_config(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            folder = pathlib.Path(temp_dir)
+            config_path = self.make_workspace(folder)
+
+            roots = dyn2py.Options.from_config(config_path, force=True)
+            self.assertEqual(len(roots), 2)
+            self.assertEqual(roots[0].source, [folder.joinpath("graphs", "a")])
+            self.assertEqual(roots[0].python_folder, folder.joinpath("python", "a"))
+            self.assertEqual(roots[0].layout, "graph")
+            self.assertEqual(roots[1].engine, ["CPython3"])
+            self.assertEqual(roots[1].layout, "flat")
+            for root in roots:
+                self.assertEqual(root.loglevel, "WARNING")
+                self.assertTrue(root.deterministic)
+                self.assertTrue(root.force)
+
+            # In a pyproject.toml:
+            pyproject_path = folder.joinpath("pyproject.toml")
+            pyproject_path.write_text(WORKSPACE_CONFIG.replace("[[roots]]", "[[tool.dyn2py.roots]]").replace(
+                'loglevel = "WARNING"', '[tool.dyn2py]\nloglevel = "WARNING"'))
+            self.assertEqual([r.source for r in dyn2py.Options.from_config(pyproject_path)],
+                             [r.source for r in roots])
+
+            for config in ["[project]\nname = 'other'",
+                           "[tool.dyn2py]\nunknown = 1",
+                           "[[tool.dyn2py.roots]]\nsource = 'graphs'\nstats = 'json'",
+                           "[tool.dyn2py]\nlayout = 'nested'",
+                           "not toml"]:
+                with self.subTest(config=config):
+                    pyproject_path.write_text(config)
+                    with self.assertRaises(ValueError):
+                        dyn2py.Options.from_config(pyproject_path)
+
+    def test_run(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            folder = pathlib.Path(temp_dir)
+            config_path = self.make_workspace(folder)
+
+            result = dyn2py.run(dyn2py.Options(config=config_path, dry_run=True))
+            self.assertEqual(result.written, [])
+            self.assertEqual(len(result.skipped), 1 + 4)
+
+            result = dyn2py.run(dyn2py.Options(config=config_path))
+            self.assertEqual(len(result.written), 1 + 4)
+            self.assertEqual(len(list(folder.joinpath("python", "a", "single_node").glob("*.py"))), 1)
+            self.assertEqual(len(list(folder.joinpath("python", "b").glob("*.py"))), 4)
+
+            with self.assertRaises(ValueError):
+                dyn2py.run(dyn2py.Options(source=[folder], config=config_path))
@@ -3,6 +3,7 @@ import dyn2py
 import pathlib
 import shutil
 import simplejson as json
+import tempfile
 
 from tests.support import *
 
@@ -37,7 +38,7 @@ class TestDynamoFile(unittest.TestCase):
         self.assertEqual(len(dyn.python_nodes), 6)
         self.assertTrue(py_node)
         self.assertIn(py_node, dyn.python_nodes)
-        self.assertEqual(py_node.checksum, "e830a6ae6b395bcfd4e5a40da48f3bfc")
+        self.assertEqual(py_node.checksum, "1f3d9e6153804fe1ed37571a9cda8e26")
 
         with self.assertRaises(dyn2py.DynamoFile.PythonNodeNotFound):
             dyn.get_python_node_by_id("wrongid")
@@ -57,6 +58,72 @@ class TestDynamoFile(unittest.TestCase):
         output_dir = pathlib.Path(OUTPUT_DIR)
         self.assertEqual(len(list(output_dir.iterdir())), 6)
 
+    def test_extract_python_kwargs(self):
+        cleanup_dirs()
+        dyn2py.PythonFile.open_files.clear()
+
+        # String paths are converted like in Options():
+        dyn = dyn2py.DynamoFile(f"{INPUT_DIR}/python_nodes.dyn")
+        python_files = dyn.extract_python(python_folder=OUTPUT_DIR)
+        self.assertEqual(len(python_files), 6)
+        self.assertTrue(all(p.dirpath == pathlib.Path(OUTPUT_DIR) for p in python_files))
+        self.assertEqual(dyn.get_python_folder(python_folder=OUTPUT_DIR), pathlib.Path(OUTPUT_DIR))
+        self.assertEqual(len(dyn.get_related_python_files(python_folder=OUTPUT_DIR)), 0)
+
+        with self.assertRaises(ValueError):
+            dyn.extract_python(python_folder=OUTPUT_DIR, stream=-1)
+        dyn2py.PythonFile.open_files.clear()
+
+    def test_extract_python_deterministic(self):
+        cleanup_dirs()
+        dyn2py.File.open_files.clear()
+
+        opt = dyn2py.Options(python_folder=OUTPUT_DIR,
+                             deterministic=True, force=True)
+        dyn = dyn2py.DynamoFile(f"{INPUT_DIR}/python_nodes.dyn")
+        python_files = dyn.extract_python(options=opt)
+        self.assertEqual(len(python_files), 6)
+
+        for python_file in python_files:
+            for key in dyn2py.files.VOLATILE_HEADER_KEYS:
+                self.assertNotIn(key, python_file.header_data)
+
+        dyn2py.PythonFile.write_open_files()
+        dyn2py.PythonFile.close_open_files()
+
+        mtimes = {p: p.stat().st_mtime for p in pathlib.Path(OUTPUT_DIR).iterdir()}
+
+        # Nothing changed, nothing should be written, even with force:
+        self.assertFalse(dyn.extract_python(options=opt))
+        self.assertFalse(dyn2py.PythonFile.get_open_files())
+
+        for p in pathlib.Path(OUTPUT_DIR).iterdir():
+            self.assertEqual(p.stat().st_mtime, mtimes[p])
+
+    def test_extract_python_selected(self):
+        selections = [
+            ({"engine": ["IronPython2"]}, 2),
+            ({"node_name": ["Renamed*", "*Renamed"]}, 2),
+            ({"node_id": ["d7704617c75e4bf1a5c387b7c3f001ea"], "engine": ["IronPython2"]}, 0),
+            ({"node_id": ["d7704617c75e4bf1a5c387b7c3f001ea", "ff087a3611b0478b95252f67e87be507"]}, 2),
+        ]
+        for selection, count in selections:
+            with self.subTest(**selection):
+                cleanup_dirs()
+                dyn2py.File.open_files.clear()
+
+                opt = dyn2py.Options(python_folder=OUTPUT_DIR, **selection)
+                dyn = dyn2py.DynamoFile(f"{INPUT_DIR}/python_nodes.dyn")
+                python_files = dyn.extract_python(options=opt)
+
+                self.assertEqual(len(python_files), count)
+                for python_file in python_files:
+                    self.assertTrue(opt.selects_node(
+                        python_file.header_data["py_id"], python_file.header_data["py_engine"]))
+
+        with self.assertRaises(ValueError):
+            dyn2py.Options(engine=["Python3"])
+
     def test_get_open_file_by_uuid(self):
         dyn2py.DynamoFile.open_files.clear()
 
@@ -86,10 +153,71 @@ class TestDynamoFile(unittest.TestCase):
         self.assertEqual(len(python_files1), 6)
         self.assertEqual(len(python_files2), 1)
 
+        # Only the headers of other scripts are read, their graphs are not opened:
+        dyn2py.File.open_files.clear()
+        dyn1 = dyn2py.DynamoFile(f"{INPUT_DIR}/python_nodes.dyn")
+        self.assertEqual(len(dyn1.get_related_python_files(options=opt)), 6)
+        self.assertEqual(dyn2py.DynamoFile.get_open_files(), {dyn1})
+
         no_python_files = dyn1.get_related_python_files()
 
         self.assertFalse(no_python_files)
 
+    def test_get_python_folder(self):
+        dyn = dyn2py.DynamoFile(f"{INPUT_DIR}/python_nodes.dyn")
+        scripts = pathlib.Path("scripts")
+
+        self.assertEqual(dyn.get_python_folder(), dyn.dirpath)
+        self.assertEqual(dyn.get_python_folder(layout="graph"),
+                         dyn.dirpath.joinpath("python_nodes"))
+        self.assertEqual(dyn.get_python_folder(python_folder=scripts, layout="hash"),
+                         scripts.joinpath("3c"))
+        self.assertEqual(dyn.get_python_folder(python_folder=scripts, layout="mirror"),
+                         scripts.joinpath(INPUT_DIR))
+        # Mirror needs a python folder:
+        self.assertEqual(dyn.get_python_folder(layout="mirror"), dyn.dirpath)
+
+        with self.assertRaises(ValueError):
+            dyn2py.Options(layout="tree")
+
+    def test_layouts(self):
+        for layout in dyn2py.LAYOUTS:
+            with self.subTest(layout=layout), tempfile.TemporaryDirectory() as temp_dir:
+                dyn2py.File.open_files.clear()
+                graphs = pathlib.Path(temp_dir, "graphs")
+                scripts = pathlib.Path(temp_dir, "scripts")
+                graphs.mkdir()
+                scripts.mkdir()
+                for name in ["python_nodes.dyn", "single_node.dyn"]:
+                    shutil.copy(f"{INPUT_DIR}/{name}", graphs.joinpath(name))
+
+                opt = dyn2py.Options(source=[graphs], python_folder=scripts, layout=layout)
+                result = dyn2py.run(opt)
+                self.assertEqual(len(result.written), 7)
+
+                dyn = dyn2py.DynamoFile.get_open_file_by_uuid("76de5c79-17c5-4c74-9f90-ad99a213d339")
+                python_folder = dyn.get_python_folder(opt)
+                script_path = python_folder.joinpath("single_node_1c5d99792882409e97e132b3e9f814b0.py")
+                self.assertEqual(script_path.exists(), True)
+                if layout != "flat":
+                    self.assertNotEqual(python_folder, scripts)
+                    self.assertEqual(len(dyn.get_related_python_files(opt)), 1)
+
+                # Update the graph from its own shard:
+                script_path.write_text(script_path.read_text() + "\n# layout edit\n")
+                dyn2py.File.open_files.clear()
+                result = dyn2py.run(dyn2py.Options(
+                    source=[graphs.joinpath("single_node.dyn")], python_folder=scripts,
+                    layout=layout, update=True))
+                self.assertEqual(result.written, [graphs.joinpath("single_node.dyn")])
+                self.assertIn("# layout edit", graphs.joinpath("single_node.dyn").read_text())
+
+                # Source folders are read recursively:
+                dyn2py.File.open_files.clear()
+                result = dyn2py.run(dyn2py.Options(source=[scripts], layout=layout))
+                self.assertEqual(result.written, [])
+                self.assertEqual(result.failed, [])
+
     def test_write_same(self):
         cleanup_dirs()
 
@@ -107,6 +235,40 @@ class TestDynamoFile(unittest.TestCase):
 
             self.assertEqual(json1, json2)
 
+    def test_write_numbers(self):
+        cleanup_dirs()
+        dyn2py.DynamoFile.open_files.clear()
+
+        # Numbers in the forms Dynamo may write them:
+        with open(f"{INPUT_DIR}/single_node.dyn", "r", encoding="utf-8", newline="") as input_file:
+            text = input_file.read().replace(
+                '"Uuid": "76de5c79-17c5-4c74-9f90-ad99a213d339",',
+                '"Uuid": "76de5c79-17c5-4c74-9f90-ad99a213d339",\n  "Numbers": [\n    1E-05,\n    2.50,\n    -0.0,\n    1e+16,\n    12345678901234567890.5\n  ],', 1)
+        self.assertIn("1E-05", text)
+
+        for number_mode in dyn2py.NUMBER_MODES:
+            dyn2py.DynamoFile.number_mode = number_mode
+            with open(f"{OUTPUT_DIR}/numbers.dyn", "w", encoding="utf-8", newline="") as output_file:
+                output_file.write(text)
+
+            dyn = dyn2py.DynamoFile(f"{OUTPUT_DIR}/numbers.dyn")
+            dyn.modified = True
+            dyn.write()
+            dyn2py.DynamoFile.open_files.clear()
+
+            with open(f"{OUTPUT_DIR}/numbers.dyn", "r", encoding="utf-8", newline="") as output_file:
+                written_text = output_file.read()
+
+            if number_mode == "raw":
+                self.assertIsInstance(
+                    dyn.full_dict["Numbers"][0], dyn2py.rawjson.RawNumber)
+                self.assertEqual(text, written_text)
+            else:
+                self.assertEqual(json.loads(text, use_decimal=True),
+                                 json.loads(written_text, use_decimal=True))
+
+        dyn2py.DynamoFile.number_mode = dyn2py.DEFAULT_NUMBER_MODE
+
     def test_update_and_write(self):
 
         extract_single_node_dyn(modify_py=True)
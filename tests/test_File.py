@@ -27,6 +27,8 @@ class TestFile(unittest.TestCase):
                              pathlib.Path(f"{INPUT_DIR}/python_nodes.dyn"))
             self.assertEqual(the_file.basename, "python_nodes")
             self.assertEqual(the_file.dirpath, pathlib.Path(INPUT_DIR))
+            # Only resolved when it's needed:
+            self.assertIsNone(the_file._realpath)
             self.assertEqual(the_file.realpath, pathlib.Path(path).resolve())
 
             self.assertTrue(the_file.exists)
@@ -34,6 +36,7 @@ class TestFile(unittest.TestCase):
             self.assertFalse(the_file.modified)
 
             self.assertIs(type(the_file), dyn2py.DynamoFile)
+            self.assertFalse(hasattr(the_file, "__dict__"))
 
     def test_init_newfile(self):
         paths = [
@@ -63,6 +66,17 @@ class TestFile(unittest.TestCase):
             self.assertFalse(the_file.modified)
 
             self.assertEqual(the_file.__class__, dyn2py.PythonFile)
+            self.assertFalse(hasattr(the_file, "__dict__"))
+
+    def test_init_metadata_only(self):
+        dyn2py.File.open_files.clear()
+
+        the_file = dyn2py.File(f"{INPUT_DIR}/new_file.py", read_from_disk=False)
+        self.assertIs(type(the_file), dyn2py.PythonFile)
+        self.assertNotIn(the_file, dyn2py.File.open_files)
+
+        the_file = dyn2py.File("README.md")
+        self.assertIs(type(the_file), dyn2py.File)
 
     def test_newer(self):
         older_file = dyn2py.File(f"{INPUT_DIR}/single_node.dyn")
@@ -0,0 +1,76 @@
+import unittest
+import dyn2py
+import pathlib
+import shutil
+import tempfile
+
+from dyn2py.fscache import FS_CACHE, FileSystemCache, decode_text
+from dyn2py.stats import STATS
+from tests.support import *
+
+
+class TestFileSystemCache(unittest.TestCase):
+
+    def setUp(self):
+        dyn2py.File.open_files.clear()
+        self.addCleanup(FS_CACHE.stop)
+        self.addCleanup(STATS.reset, enabled=False)
+
+    def test_decode_text(self):
+        self.assertEqual(decode_text(b"a\r\nb\rc\n"), "a\nb\nc\n")
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            folder = pathlib.Path(temp_dir)
+            paths = [folder.joinpath(f"{i}.txt") for i in range(5)]
+            for i, path in enumerate(paths):
+                path.write_bytes(b"x" * i)
+
+            cache = FileSystemCache()
+            STATS.reset(enabled=True)
+            self.assertIsNone(cache.stat(folder.joinpath("missing")))
+
+            # Disabled, nothing is cached:
+            cache.stat(paths[0])
+            cache.stat(paths[0])
+            self.assertEqual(STATS.counters["stat_calls"], 3)
+
+            cache.start(io_threads=2)
+            self.addCleanup(cache.stop)
+            self.assertEqual(sorted(cache.list_folder(folder)), paths)
+            self.assertEqual(cache.stat(paths[3]).st_size, 3)
+            self.assertEqual(STATS.counters["stat_calls"], 3)
+            self.assertEqual(STATS.counters["stat_cache_hits"], 1)
+
+            cache.invalidate(paths[3])
+            paths[3].write_bytes(b"changed")
+            self.assertEqual(cache.stat(paths[3]).st_size, 7)
+
+            cache.prefetch(paths)
+            self.assertEqual([cache.read_bytes(p) for p in paths],
+                             [b"", b"x", b"xx", b"changed", b"xxxx"])
+            self.assertEqual(STATS.counters["prefetch_hits"], 5)
+
+    def test_run(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            outputs = []
+            for io_threads in [0, 3]:
+                folder = pathlib.Path(temp_dir, str(io_threads))
+                folder.mkdir()
+                for filename in ["python_nodes.dyn", "single_node.dyn", "no_python.dyn"]:
+                    shutil.copy(f"{INPUT_DIR}/{filename}", folder)
+
+                dyn2py.File.open_files.clear()
+                result = dyn2py.run(dyn2py.Options(
+                    source=[folder], deterministic=True, io_threads=io_threads))
+                self.assertEqual(len(result.written), 7)
+                outputs.append({p.name: p.read_bytes() for p in folder.iterdir()})
+
+                # Update from the scripts found by the graphs:
+                dyn2py.File.open_files.clear()
+                result = dyn2py.run(dyn2py.Options(
+                    source=[folder.joinpath("python_nodes.dyn")], update=True, io_threads=io_threads))
+                self.assertEqual(len(result.skipped), 6)
+
+            self.assertEqual(outputs[0], outputs[1])
+            self.assertFalse(FS_CACHE.enabled)
@@ -0,0 +1,163 @@
+import unittest
+import dyn2py
+import os
+import pathlib
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from dyn2py import events
+from dyn2py.backup import BackupStore
+from dyn2py.locking import FolderLock, write_atomic
+from dyn2py.manifest import Manifest, SharedScript, NodeReference
+from dyn2py.syncstate import SyncState
+from tests.support import *
+
+
+HOLD_LOCK_SCRIPT = """
+import pathlib, sys, time
+from dyn2py.locking import FolderLock
+FolderLock(pathlib.Path(sys.argv[1])).acquire()
+print("locked", flush=True)
+time.sleep(60)
+"""
+
+
+class TestFolderLock(unittest.TestCase):
+
+    def setUp(self):
+        dyn2py.File.open_files.clear()
+        dyn2py.PythonFile.source_dynamo_files.clear()
+        self.addCleanup(dyn2py.File.open_files.clear)
+        SyncState.states.clear()
+        self.addCleanup(SyncState.states.clear)
+        self.addCleanup(Manifest.manifests.clear)
+
+    def hold_lock(self, folder: pathlib.Path) -> None:
+        """Lock the folder from an other process, until the end of the test"""
+        process = subprocess.Popen([sys.executable, "-c", HOLD_LOCK_SCRIPT, str(folder)],
+                                   stdout=subprocess.PIPE, text=True)
+        self.addCleanup(process.wait)
+        self.addCleanup(process.kill)
+        self.assertEqual(process.stdout.readline().strip(), "locked")
+        process.stdout.close()
+
+    def test_lock(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            folder = pathlib.Path(temp_dir)
+
+            # Reentrant in the process:
+            with FolderLock(folder):
+                with FolderLock(folder):
+                    pass
+                self.assertIn(pathlib.Path(os.path.realpath(folder)), FolderLock.held)
+            self.assertEqual(FolderLock.held, {})
+
+            self.hold_lock(folder)
+            FolderLock.timeout = 0.2
+            self.addCleanup(setattr, FolderLock, "timeout", dyn2py.DEFAULT_LOCK_TIMEOUT)
+            with self.assertRaises(FolderLock.Error):
+                FolderLock(folder).acquire()
+            self.assertEqual(FolderLock.held, {})
+
+    def test_run_locked(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            folder = pathlib.Path(temp_dir)
+            shutil.copy(f"{INPUT_DIR}/single_node.dyn", folder)
+            self.hold_lock(folder)
+
+            result = dyn2py.run(dyn2py.Options(source=[folder], lock_timeout=0.2))
+            self.assertEqual(result.written, [])
+            self.assertEqual([reason for _, reason in result.failed], ["locked"])
+            self.assertEqual(list(folder.glob("*.py")), [])
+
+    def test_lock_reads(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            folder = pathlib.Path(temp_dir)
+            shutil.copy(f"{INPUT_DIR}/single_node.dyn", folder)
+            dyn2py.File.lock_reads = True
+            self.addCleanup(setattr, dyn2py.File, "lock_reads", False)
+            self.addCleanup(dyn2py.File.release_read_locks)
+
+            # Locked from reading until the files are closed:
+            dyn2py.DynamoFile(folder.joinpath("single_node.dyn"))
+            self.assertIn(pathlib.Path(os.path.realpath(folder)), FolderLock.held)
+            dyn2py.File.close_open_files()
+            self.assertEqual(FolderLock.held, {})
+
+    def test_backup_store_locked(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = BackupStore(pathlib.Path(temp_dir, "store"))
+            source = pathlib.Path(temp_dir, "file.py")
+            source.write_text("a")
+            store.backup(source, 0.0)
+
+            self.hold_lock(store.root)
+            FolderLock.timeout = 0.2
+            self.addCleanup(setattr, FolderLock, "timeout", dyn2py.DEFAULT_LOCK_TIMEOUT)
+            source.write_text("b")
+            with self.assertRaises(FolderLock.Error):
+                store.backup(source, 0.0)
+            with self.assertRaises(FolderLock.Error):
+                store.prune(keep=1)
+            self.assertEqual(len(store.entries()), 1)
+
+    def test_write_atomic(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filepath = pathlib.Path(temp_dir, "file.py")
+            filepath.write_text("a")
+            os.chmod(filepath, 0o640)
+            write_atomic(filepath, b"b")
+            self.assertEqual(filepath.read_text(), "b")
+            if os.name != "nt":
+                self.assertEqual(filepath.stat().st_mode & 0o777, 0o640)
+            self.assertEqual(os.listdir(temp_dir), ["file.py"])
+
+    def test_changed_on_disk(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            graph_path = pathlib.Path(temp_dir, "single_node.dyn")
+            shutil.copy(f"{INPUT_DIR}/single_node.dyn", graph_path)
+            dyn = dyn2py.DynamoFile(graph_path)
+            dyn.modified = True
+
+            # An other process writes the graph after it was read:
+            graph_path.write_text(graph_path.read_text().replace("import sys", "import other", 1))
+            os.utime(graph_path, (dyn.mtime + 10, dyn.mtime + 10))
+
+            result = dyn2py.RunResult()
+            events.add_listener(result.handle_event)
+            self.addCleanup(events.remove_listener, result.handle_event)
+            dyn.write()
+            self.assertEqual(result.failed, [(graph_path, "changed")])
+            self.assertIn("import other", graph_path.read_text())
+
+    def test_merge(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            folder = pathlib.Path(temp_dir)
+
+            # Two processes record different scripts of the same folder:
+            first = SyncState(folder)
+            second = SyncState(folder)
+            SyncState.states[folder.resolve()] = first
+            SyncState.record(folder.joinpath("first.py"), "a" * 32)
+            SyncState.states[folder.resolve()] = second
+            SyncState.record(folder.joinpath("second.py"), "b" * 32)
+            self.assertTrue(first.save())
+            self.assertTrue(second.save())
+            SyncState.states.clear()
+            self.assertEqual(SyncState.get_base(folder.joinpath("first.py")), "a" * 32)
+            self.assertEqual(SyncState.get_base(folder.joinpath("second.py")), "b" * 32)
+
+            first = Manifest.for_folder(folder)
+            second = Manifest(folder)
+            second.load()
+            first._add_script(SharedScript("code_a.py", "a" * 32, [
+                NodeReference("uuid", "graph", "graph.dyn", "first", "CPython3")]))
+            second._add_script(SharedScript("code_a.py", "a" * 32, [
+                NodeReference("uuid", "graph", "graph.dyn", "second", "CPython3")]))
+            self.assertTrue(first.save())
+            self.assertTrue(second.save())
+            Manifest.manifests.clear()
+            merged = Manifest.for_folder(folder)
+            self.assertEqual(sorted(n.py_id for n in merged.scripts["code_a.py"].nodes), ["first", "second"])
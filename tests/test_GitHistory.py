@@ -0,0 +1,103 @@
+import unittest
+import dyn2py
+import json
+import pathlib
+import shutil
+import subprocess
+import tempfile
+
+from dyn2py.history import GitHistory
+from dyn2py.stats import STATS
+from tests.support import *
+
+
+class TestGitHistory(unittest.TestCase):
+
+    def setUp(self):
+        dyn2py.File.open_files.clear()
+
+    def git(self, repo: pathlib.Path, *args: str) -> str:
+        return subprocess.run(["git", "-C", str(repo), "-c", "user.name=test", "-c", "user.email=test@example.com",
+                               *args], check=True, capture_output=True, text=True).stdout
+
+    def make_repo(self, repo: pathlib.Path) -> list[str]:
+        self.git(repo, "init", "-q")
+        graphs = repo.joinpath("graphs")
+        graphs.mkdir()
+
+        shutil.copy(f"{INPUT_DIR}/single_node.dyn", graphs.joinpath("graph.dyn"))
+        repo.joinpath("readme.txt").write_text("not a graph")
+        self.git(repo, "add", ".")
+        self.git(repo, "commit", "-q", "-m", "first")
+
+        # Change the code:
+        graph_path = graphs.joinpath("graph.dyn")
+        graph_path.write_text(graph_path.read_text().replace("OUT = ", "OUT = 0 or "))
+        self.git(repo, "commit", "-q", "-am", "second")
+
+        # Copy, and only change something else:
+        shutil.copy(graph_path, graphs.joinpath("copy.dyn"))
+        repo.joinpath("readme.txt").write_text("changed")
+        self.git(repo, "add", ".")
+        self.git(repo, "commit", "-q", "-m", "third")
+
+        return self.git(repo, "rev-list", "--reverse", "HEAD").split()
+
+    def test_node_versions(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo = pathlib.Path(temp_dir)
+            commits = self.make_repo(repo)
+
+            STATS.reset(enabled=True)
+            versions = list(GitHistory([repo.joinpath("graphs")]).iter_node_versions())
+            self.assertEqual([v.commit for v in versions], commits[:2])
+            self.assertEqual({v.py_id for v in versions}, {"1c5d99792882409e97e132b3e9f814b0"})
+            self.assertNotEqual(versions[0].checksum, versions[1].checksum)
+            self.assertEqual(versions[1].dyn_path, "graphs/graph.dyn")
+            self.assertIn("OUT = 0 or ", versions[1].to_dict()["code"])
+            # The copy has the same content, it's not parsed again:
+            self.assertEqual(STATS.counters["history_blobs"], 2)
+            self.assertEqual(STATS.counters["history_blobs_skipped"], 2)
+            STATS.reset(enabled=False)
+            self.assertEqual(dyn2py.File.open_files, set())
+
+            # Only a range:
+            versions = list(GitHistory([repo], f"{commits[0]}..HEAD").iter_node_versions())
+            self.assertEqual([v.commit for v in versions], [commits[1]])
+
+            # Path outside of graphs:
+            self.assertEqual(list(GitHistory([repo.joinpath("readme.txt")]).iter_node_versions()), [])
+
+    def test_revert(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo = pathlib.Path(temp_dir)
+            commits = self.make_repo(repo)
+
+            # Revert to the first version, the blob was already read:
+            graph_path = repo.joinpath("graphs", "graph.dyn")
+            graph_path.write_text(graph_path.read_text().replace("OUT = 0 or ", "OUT = "))
+            self.git(repo, "commit", "-q", "-am", "revert")
+            commits.append(self.git(repo, "rev-parse", "HEAD").strip())
+
+            STATS.reset(enabled=True)
+            versions = list(GitHistory([repo.joinpath("graphs")]).iter_node_versions())
+            self.assertEqual([(v.commit, v.dyn_path) for v in versions], [
+                (commits[0], "graphs/graph.dyn"),
+                (commits[1], "graphs/graph.dyn"),
+                (commits[3], "graphs/graph.dyn")])
+            self.assertEqual(versions[0].checksum, versions[2].checksum)
+            self.assertEqual(STATS.counters["history_blobs"], 2)
+            STATS.reset(enabled=False)
+
+    def test_run(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo = pathlib.Path(temp_dir)
+            commits = self.make_repo(repo)
+            output_path = repo.joinpath("history.jsonl")
+
+            dyn2py.run(dyn2py.Options(
+                source=[repo.joinpath("graphs")], history="HEAD", history_output=output_path))
+            lines = [json.loads(l) for l in output_path.read_text().splitlines()]
+            self.assertEqual([(l["commit"], l["dyn_uuid"], l["py_id"]) for l in lines], [
+                (commits[0], "76de5c79-17c5-4c74-9f90-ad99a213d339", "1c5d99792882409e97e132b3e9f814b0"),
+                (commits[1], "76de5c79-17c5-4c74-9f90-ad99a213d339", "1c5d99792882409e97e132b3e9f814b0")])
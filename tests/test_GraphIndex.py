@@ -0,0 +1,95 @@
+import unittest
+import dyn2py
+import pathlib
+import shutil
+import tempfile
+
+from dyn2py.graph_index import GraphIndex, scan_uuid, GRAPH_INDEX_FILENAME
+from dyn2py.stats import STATS
+from tests.support import *
+
+
+class TestGraphIndex(unittest.TestCase):
+
+    def setUp(self):
+        dyn2py.File.open_files.clear()
+        dyn2py.PythonFile.source_dynamo_files.clear()
+        GraphIndex.indexes.clear()
+
+    def test_scan_uuid(self):
+        self.assertEqual(scan_uuid(pathlib.Path(f"{INPUT_DIR}/single_node.dyn")),
+                         "76de5c79-17c5-4c74-9f90-ad99a213d339")
+        self.assertIsNone(scan_uuid(pathlib.Path(f"{INPUT_DIR}/dynamo1file.dyn")))
+        self.assertIsNone(scan_uuid(pathlib.Path(f"{INPUT_DIR}/not_existing.dyn")))
+
+    def test_find(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = pathlib.Path(temp_dir)
+            root.joinpath("sub").mkdir()
+            root.joinpath(".hidden").mkdir()
+            shutil.copy(f"{INPUT_DIR}/python_nodes.dyn", root.joinpath("sub/a.dyn"))
+            shutil.copy(f"{INPUT_DIR}/python_nodes.dyn", root.joinpath(".hidden/b.dyn"))
+            shutil.copy(f"{INPUT_DIR}/dynamo1file.dyn", root.joinpath("c.dyn"))
+
+            index = GraphIndex([root], dyn2py.DYNAMO_EXTENSIONS)
+            self.assertEqual(index.find("3c3b4c05-9716-4e93-9360-ca0637cb5486"),
+                             [root.resolve().joinpath("sub/a.dyn")])
+            self.assertEqual(index.find("not-existing-uuid"), [])
+            self.assertTrue(root.joinpath(GRAPH_INDEX_FILENAME).exists())
+
+            # A new index should only read the changed graphs:
+            STATS.reset(enabled=True)
+            root.joinpath("sub/a.dyn").rename(root.joinpath("d.dyn"))
+            index = GraphIndex([root], dyn2py.DYNAMO_EXTENSIONS)
+            self.assertEqual(index.find("3c3b4c05-9716-4e93-9360-ca0637cb5486"),
+                             [root.resolve().joinpath("d.dyn")])
+            self.assertEqual(STATS.counters["index_scanned"], 1)
+            self.assertEqual(STATS.counters["index_cache_hits"], 1)
+            STATS.reset(enabled=False)
+
+            # Moved again, after the scan:
+            root.joinpath("d.dyn").rename(root.joinpath("sub/e.dyn"))
+            self.assertEqual(index.find("3c3b4c05-9716-4e93-9360-ca0637cb5486"),
+                             [root.resolve().joinpath("sub/e.dyn")])
+
+    def test_moved_graph(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            graphs = pathlib.Path(temp_dir, "graphs")
+            scripts = pathlib.Path(temp_dir, "scripts")
+            graphs.mkdir()
+            scripts.mkdir()
+            shutil.copy(f"{INPUT_DIR}/single_node.dyn", graphs)
+
+            dyn2py.run(dyn2py.Options(source=[graphs.joinpath("single_node.dyn")],
+                                      python_folder=scripts))
+            script_path = next(scripts.glob("*.py"))
+
+            graphs.joinpath("moved").mkdir()
+            moved_path = graphs.joinpath("moved/renamed.dyn")
+            graphs.joinpath("single_node.dyn").rename(moved_path)
+            dyn2py.File.open_files.clear()
+
+            py = dyn2py.PythonFile(script_path)
+            with self.assertRaises(FileNotFoundError):
+                py.get_source_dynamo_file()
+
+            options = dyn2py.Options(graph_root=[graphs])
+            dyn = py.get_source_dynamo_file(options)
+            self.assertEqual(dyn.filepath, moved_path.resolve())
+
+            # Relink the script:
+            dyn2py.File.open_files.clear()
+            result = dyn2py.run(dyn2py.Options(
+                source=[scripts], graph_root=[graphs], relink=True))
+            self.assertEqual(result.written, [script_path])
+
+            dyn2py.File.open_files.clear()
+            py = dyn2py.PythonFile(script_path)
+            self.assertEqual(py.header_data["dyn_path"],
+                             "../graphs/moved/renamed.dyn")
+            self.assertTrue(py.get_source_dynamo_file().filepath.samefile(moved_path))
+
+            dyn2py.File.open_files.clear()
+            result = dyn2py.run(dyn2py.Options(
+                source=[scripts], graph_root=[graphs], relink=True))
+            self.assertEqual(result.skipped, [(script_path, "unchanged")])
@@ -0,0 +1,112 @@
+import unittest
+import dyn2py
+import pathlib
+import simplejson as json
+import json as stdlib_json
+from unittest import mock
+
+from dyn2py import json_codecs
+from tests.support import *
+
+
+# Numbers and strings in the forms that are easy to change on a round-trip:
+EDGE_CASES = """{
+  "Numbers": [
+    1.0,
+    -0.0,
+    0.1,
+    1E-05,
+    2.50,
+    1e+16,
+    -7312.715117751975,
+    12345678901234567890,
+    12345678901234567890.5
+  ],
+  "Strings": [
+    "\\u00e9\\u00e1 \\ud83d\\ude00",
+    "line\\r\\nbreak\\ttab \\"quote\\" \\\\",
+    "1.50"
+  ],
+  "Empty": {
+    "List": [],
+    "Dict": {}
+  },
+  "Other": [
+    true,
+    false,
+    null
+  ]
+}"""
+
+
+class TestJsonCodecs(unittest.TestCase):
+
+    def test_round_trip(self):
+        texts = {p.name: p.read_text(encoding="utf-8")
+                 for p in pathlib.Path(INPUT_DIR).glob("*.dyn")
+                 if p.name != "dynamo1file.dyn"}
+        texts["edge_cases"] = EDGE_CASES
+
+        for name, text in texts.items():
+            for number_mode in dyn2py.NUMBER_MODES:
+                reference = json_codecs.CODECS["simplejson"].dumps(
+                    json_codecs.CODECS["simplejson"].loads(text, number_mode))
+
+                for json_codec in dyn2py.JSON_CODECS:
+                    with self.subTest(file=name, numbers=number_mode, codec=json_codec):
+                        output = json_codecs.dumps(
+                            json_codecs.loads(text, number_mode, json_codec), json_codec)
+                        self.assertEqual(reference, output)
+
+                        if number_mode == "raw" and not "\r" in text:
+                            self.assertEqual(text, output)
+
+    def test_codecs(self):
+        for name, codec in json_codecs.CODECS.items():
+            self.assertIn(name, dyn2py.JSON_CODECS)
+            if not codec.available():
+                continue
+
+            parsed = codec.loads(EDGE_CASES, "raw")
+            self.assertIsInstance(parsed["Numbers"][3], dyn2py.rawjson.RawNumber)
+            self.assertEqual(codec.dumps(parsed), EDGE_CASES)
+
+    def test_fallback(self):
+        # Invalid json is always reported by the reference codec:
+        for json_codec in dyn2py.JSON_CODECS:
+            with self.assertRaises(json.JSONDecodeError):
+                json_codecs.loads("<Workspace Version=", "raw", json_codec)
+
+        with self.assertRaises(ValueError):
+            json_codecs.loads("{}", "raw", "not_a_codec")
+
+        with self.assertRaises(ValueError):
+            dyn2py.Options(json_codec="not_a_codec")
+
+    def test_raw_number_outside_codecs(self):
+        # Other encoders write RawNumbers as strings:
+        number = dyn2py.rawjson.RawNumber("1.50")
+        self.assertEqual(json.dumps([number]), '["1.50"]')
+        self.assertEqual(stdlib_json.dumps([number]), '["1.50"]')
+        self.assertEqual(dyn2py.rawjson.dumps([number]), "[\n  1.50\n]")
+
+    def test_decimal_is_lossy(self):
+        # Decimals keep the value of numbers, but not always their text:
+        for json_codec in dyn2py.JSON_CODECS:
+            with self.subTest(codec=json_codec):
+                output = json_codecs.dumps(json_codecs.loads(EDGE_CASES, "decimal", json_codec), json_codec)
+                self.assertNotEqual(output, EDGE_CASES)
+                self.assertIn("0.00001,", output)
+                self.assertEqual(json.loads(output, use_decimal=True), json.loads(EDGE_CASES, use_decimal=True))
+
+    def test_unsupported_encoder(self):
+        # Without the internal encoders numbers are written by their value:
+        with mock.patch.object(dyn2py.rawjson, "RAW_ENCODER_SUPPORTED", False), \
+                mock.patch.object(json_codecs, "STDLIB_RAW_ENCODER_SUPPORTED", False):
+            for json_codec in dyn2py.JSON_CODECS:
+                with self.subTest(codec=json_codec):
+                    output = json_codecs.dumps(json_codecs.loads(EDGE_CASES, "raw", json_codec), json_codec)
+                    self.assertEqual(json.loads(output, use_decimal=True), json.loads(EDGE_CASES, use_decimal=True))
+
+        self.assertFalse(dyn2py.rawjson.check_encoder(lambda o: json.dumps(o, indent=2), "simplejson"))
+        self.assertTrue(dyn2py.rawjson.check_encoder(dyn2py.rawjson.dumps, "simplejson"))
@@ -0,0 +1,141 @@
+import unittest
+import dyn2py
+import json
+import pathlib
+import shutil
+import tempfile
+
+from dyn2py.manifest import Manifest, NodeReference, MANIFEST_FILENAME
+from tests.support import *
+
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        dyn2py.File.open_files.clear()
+        dyn2py.PythonFile.source_dynamo_files.clear()
+
+    def test_add_and_remove(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manifest = Manifest(pathlib.Path(temp_dir))
+            script, new = manifest.add_node(
+                "a" * 32, NodeReference("uuid", "graph", "graph.dyn", "node1", "CPython3"))
+            self.assertTrue(new)
+            self.assertEqual(script.filename, "code_aaaaaaaaaaaa.py")
+
+            same_script, new = manifest.add_node(
+                "a" * 32, NodeReference("uuid", "copy", "copy.dyn", "node1", "CPython3"))
+            self.assertFalse(new)
+            self.assertIs(same_script, script)
+
+            # Same prefix, different code:
+            other_script, new = manifest.add_node(
+                "a" * 12 + "b" * 20, NodeReference("uuid", "graph", "graph.dyn", "node2", "CPython3"))
+            self.assertTrue(new)
+            self.assertEqual(other_script.filename, "code_aaaaaaaaaaaabbbb.py")
+
+            # Copies have the same uuid, graphs are removed by path:
+            manifest.remove_graph("graph.dyn")
+            self.assertEqual([n.dyn_path for n in script.nodes], ["copy.dyn"])
+            self.assertTrue(manifest.save())
+            self.assertFalse(manifest.save())
+
+            loaded = Manifest.for_folder(pathlib.Path(temp_dir))
+            self.assertEqual(list(loaded.scripts), ["code_aaaaaaaaaaaa.py"])
+            self.assertEqual(loaded.get_scripts_of_graph("uuid")[0].nodes[0].dyn_name, "copy")
+            Manifest.manifests.clear()
+
+    def test_run(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            graphs = pathlib.Path(temp_dir, "graphs")
+            scripts = pathlib.Path(temp_dir, "scripts")
+            graphs.mkdir()
+            scripts.mkdir()
+            graph_paths = [graphs.joinpath(f"copy{i}.dyn") for i in range(3)]
+            for graph_path in graph_paths:
+                shutil.copy(f"{INPUT_DIR}/python_nodes.dyn", graph_path)
+
+            result = dyn2py.run(dyn2py.Options(
+                source=[graphs], python_folder=scripts, dedup=True))
+            manifest_path = scripts.joinpath(MANIFEST_FILENAME)
+            self.assertIn(manifest_path, result.written)
+
+            # 6 nodes in every graph, 4 unique code:
+            manifest = json.loads(manifest_path.read_text())
+            self.assertEqual(len(manifest["scripts"]), 4)
+            self.assertEqual(sum(len(s["nodes"]) for s in manifest["scripts"].values()), 18)
+            self.assertEqual(len(list(scripts.glob("*.py"))), 4)
+
+            # Edit a shared script, every graph is updated:
+            shared_path = scripts.joinpath(next(
+                f for f, s in manifest["scripts"].items() if len(s["nodes"]) == 6))
+            shared_path.write_text(shared_path.read_text() + "\n# shared edit")
+            dyn2py.File.open_files.clear()
+            result = dyn2py.run(dyn2py.Options(source=[scripts]))
+            self.assertEqual(sorted(result.written), sorted(graph_paths + [manifest_path]))
+            for graph_path in graph_paths:
+                self.assertEqual(graph_path.read_text().count("# shared edit"), 2)
+
+            # Everything is synchronized:
+            dyn2py.File.open_files.clear()
+            result = dyn2py.run(dyn2py.Options(source=[scripts]))
+            self.assertEqual(result.written, [])
+            dyn2py.File.open_files.clear()
+            result = dyn2py.run(dyn2py.Options(
+                source=[graphs], python_folder=scripts, dedup=True))
+            self.assertEqual(result.written, [])
+
+    def test_invalid_manifest(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            graph_path = pathlib.Path(temp_dir, "single_node.dyn")
+            shutil.copy(f"{INPUT_DIR}/single_node.dyn", graph_path)
+            scripts = pathlib.Path(temp_dir, "scripts")
+            scripts.mkdir()
+            dyn2py.run(dyn2py.Options(source=[graph_path], python_folder=scripts))
+            scripts.joinpath(MANIFEST_FILENAME).write_text(json.dumps({"version": 999, "scripts": {}}))
+            script_path = next(scripts.glob("*.py"))
+            script_path.write_text(script_path.read_text() + "\n# edit")
+            dyn2py.File.open_files.clear()
+
+            # Only deduplicated extraction needs the manifest:
+            result = dyn2py.run(dyn2py.Options(source=[graph_path], python_folder=scripts, update=True))
+            self.assertEqual(result.written, [graph_path])
+            self.assertEqual(Manifest.manifests, {})
+            dyn2py.File.open_files.clear()
+
+            with self.assertRaises(ValueError):
+                dyn2py.run(dyn2py.Options(source=[graph_path], python_folder=scripts, dedup=True))
+            Manifest.manifests.clear()
+
+    def test_node_removed_from_graph(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            graphs = pathlib.Path(temp_dir, "graphs")
+            scripts = pathlib.Path(temp_dir, "scripts")
+            graphs.mkdir()
+            scripts.mkdir()
+            graph_paths = [graphs.joinpath(f"copy{i}.dyn") for i in range(3)]
+            for graph_path in graph_paths:
+                shutil.copy(f"{INPUT_DIR}/single_node.dyn", graph_path)
+            dyn2py.run(dyn2py.Options(source=[graphs], python_folder=scripts, dedup=True))
+            manifest_path = scripts.joinpath(MANIFEST_FILENAME)
+            filename, shared_script = next(iter(json.loads(manifest_path.read_text())["scripts"].items()))
+
+            # The manifest still lists the node of the first graph:
+            removed = shared_script["nodes"][0]
+            removed_path = scripts.joinpath(removed["dyn_path"]).resolve()
+            graph = json.loads(removed_path.read_text())
+            graph["Nodes"] = [n for n in graph["Nodes"] if n["Id"] != removed["py_id"]]
+            graph["Nodes"].append({"Id": "0" * 32, "NodeType": "PythonScriptNode",
+                                   "Code": "OUT = 0", "Engine": "CPython3"})
+            removed_path.write_text(json.dumps(graph))
+
+            shared_path = scripts.joinpath(filename)
+            shared_path.write_text(shared_path.read_text() + "\n# shared edit")
+            dyn2py.File.open_files.clear()
+            result = dyn2py.run(dyn2py.Options(source=[scripts]))
+            self.assertEqual(result.failed, [(shared_path, "source_not_found")])
+            self.assertEqual(sorted(result.written), sorted(p for p in graph_paths if p != removed_path))
+            # Not synchronized, the manifest keeps the old checksum:
+            self.assertEqual(json.loads(manifest_path.read_text())["scripts"][filename]["checksum"],
+                             shared_script["checksum"])
+            Manifest.manifests.clear()
@@ -0,0 +1,57 @@
+import unittest
+import dyn2py
+import pathlib
+import pstats
+import shutil
+
+from dyn2py.profiling import collapsed_stacks
+from tests.support import *
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_run(self):
+        cleanup_dirs()
+
+        shutil.copy(f"{INPUT_DIR}/python_nodes.dyn",
+                    f"{OUTPUT_DIR}/python_nodes.dyn")
+
+        profile_path = pathlib.Path(f"{TEMP_DIR}/run.pstats")
+        opt = dyn2py.Options(source=[f"{OUTPUT_DIR}/python_nodes.dyn"],
+                             profile_output=profile_path,
+                             profile_per_file=True)
+        self.assertTrue(opt.profile)
+        dyn2py.run(opt)
+
+        # pstats should be readable, and contain the reading of the graph:
+        stats = pstats.Stats(str(profile_path))
+        self.assertTrue(any(func[2] == "read_file" for func in stats.stats))  # type: ignore
+
+        collapsed_lines = profile_path.with_suffix(
+            ".collapsed").read_text().splitlines()
+        self.assertTrue(collapsed_lines)
+        for line in collapsed_lines:
+            stack, microseconds = line.rsplit(" ", maxsplit=1)
+            self.assertTrue(stack)
+            self.assertGreaterEqual(int(microseconds), 0)
+
+        files_lines = profile_path.with_suffix(
+            ".files.tsv").read_text().splitlines()
+        self.assertEqual(len(files_lines), 2)
+        self.assertTrue(files_lines[1].endswith("python_nodes.dyn"))
+
+    def test_collapsed_stacks(self):
+        import cProfile
+
+        def inner():
+            return sum(range(100000))
+
+        def outer():
+            return inner() + inner()
+
+        profile = cProfile.Profile()
+        profile.runcall(outer)
+        stacks = collapsed_stacks(pstats.Stats(profile))
+
+        self.assertTrue(any(s.endswith("(inner);<built-in_method_builtins.sum>")
+                            for s in stacks))
@@ -3,6 +3,8 @@ import dyn2py
 import shutil
 from time import sleep
 import os
+import pathlib
+from unittest import mock
 
 from tests.support import *
 
@@ -29,6 +31,35 @@ class TestPythonFile(unittest.TestCase):
             self.assertIs(type(py.header_data), dict)
             self.assertTrue(py in dyn2py.PythonFile.get_open_files())
 
+    def test_scan_header(self):
+        extract_single_node_dyn()
+        dyn2py.File.open_files.clear()
+
+        filepath = pathlib.Path(f"{OUTPUT_DIR}/single_node_1c5d99792882409e97e132b3e9f814b0.py")
+        py = dyn2py.PythonFile(filepath)
+        self.assertEqual(dyn2py.files.scan_header(filepath), py.header_data)
+        self.assertEqual(dyn2py.files.scan_header(pathlib.Path(f"{INPUT_DIR}/single_node.dyn")), {})
+        self.assertEqual(dyn2py.files.scan_header(pathlib.Path(f"{OUTPUT_DIR}/missing.py")), {})
+
+    def test_read_file_newlines(self):
+        extract_single_node_dyn()
+        dyn2py.File.open_files.clear()
+
+        py1 = dyn2py.PythonFile(
+            f"{OUTPUT_DIR}/single_node_1c5d99792882409e97e132b3e9f814b0.py")
+
+        # Save with different line endings, with a newline at the end:
+        for newline in ["\n", "\r\n"]:
+            with open(f"{OUTPUT_DIR}/single_node_newline.py", "w", encoding="utf-8", newline="") as output_py:
+                output_py.write(newline.join(py1.text.splitlines()) + newline)
+
+            py2 = dyn2py.PythonFile(f"{OUTPUT_DIR}/single_node_newline.py")
+            py2.read_file(reread=True)
+
+            self.assertEqual(py1.code_text, py2.code_text)
+            self.assertEqual(py1.header_data, py2.header_data)
+            self.assertNotIn("\n", py2.code_text.replace("\r\n", ""))
+
     def test_update_dynamo(self):
         extract_single_node_dyn(modify_py=True)
 
@@ -68,6 +99,42 @@ class TestPythonFile(unittest.TestCase):
         py2.update_dynamo(options=opt)
         self.assertTrue(dyn2.modified)
 
+    def test_update_dynamo_selected(self):
+        extract_single_node_dyn(modify_py=True)
+
+        dyn2py.DynamoFile.open_files.clear()
+        dyn2py.PythonFile.open_files.clear()
+
+        py = dyn2py.PythonFile(f"{OUTPUT_DIR}/single_node_mod.py")
+        dyn = dyn2py.DynamoFile(f"{INPUT_DIR}/single_node.dyn")
+
+        # Not selected by engine or by name:
+        py.update_dynamo(engine=["IronPython2"])
+        self.assertFalse(dyn.modified)
+        py.update_dynamo(node_name=["Renamed*"])
+        self.assertFalse(dyn.modified)
+
+        py.update_dynamo(engine=["CPython3"], node_name=["Python *"])
+        self.assertTrue(dyn.modified)
+
+    def test_update_dynamo_twice(self):
+        # Two scripts of the same node, the second updates the node replaced by the first:
+        extract_single_node_dyn(modify_py=True)
+        mod_path = pathlib.Path(f"{OUTPUT_DIR}/single_node_mod.py")
+        mod2_path = pathlib.Path(f"{OUTPUT_DIR}/single_node_mod2.py")
+        mod2_path.write_text(mod_path.read_text().replace("qwe_string", "zxc_string"))
+
+        dyn2py.File.open_files.clear()
+        py1 = dyn2py.PythonFile(mod_path)
+        py2 = dyn2py.PythonFile(mod2_path)
+        dyn = dyn2py.DynamoFile(f"{INPUT_DIR}/single_node.dyn")
+
+        py1.update_dynamo(force=True, node_name=["Python *"])
+        py2.update_dynamo(force=True, node_name=["Python *"])
+        node = dyn.get_python_node_by_id("1c5d99792882409e97e132b3e9f814b0")
+        self.assertEqual(node.name, "Python Script")
+        self.assertIn("zxc_string", node.code_text)
+
     def test_get_source_dynamo_file(self):
         extract_single_node_dyn()
         dyn2py.File.open_files.clear()
@@ -82,7 +149,17 @@ class TestPythonFile(unittest.TestCase):
         dyn2 = py1.get_source_dynamo_file()
         self.assertIs(dyn1, dyn2)
 
-        dyn2py.DynamoFile.open_files.clear()
+        # Resolved without changing the working directory:
+        with mock.patch("os.chdir", side_effect=AssertionError):
+            dyn2py.DynamoFile.open_files.clear()
+            dyn3 = py1.get_source_dynamo_file()
+        self.assertIsNot(dyn1, dyn3)
+        self.assertEqual(dyn3.filepath,
+                         pathlib.Path(f"{INPUT_DIR}/single_node.dyn").resolve())
+
+        # Closed graphs are not cached:
+        dyn2py.DynamoFile.close_open_files()
+        self.assertNotIn(dyn3, dyn2py.PythonFile.source_dynamo_files.values())
 
         with self.assertRaises(dyn2py.DynamoFile.Error):
             py1.header_data["dyn_uuid"] = "wrong-uuid"
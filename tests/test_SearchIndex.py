@@ -0,0 +1,120 @@
+import unittest
+import dyn2py
+import contextlib
+import io
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+
+from dyn2py.search import SearchIndex
+from dyn2py.stats import STATS
+from tests.support import *
+
+
+class TestSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        dyn2py.File.open_files.clear()
+        dyn2py.PythonFile.source_dynamo_files.clear()
+
+    def test_update_and_search(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            folder = pathlib.Path(temp_dir)
+            graphs = folder.joinpath("graphs")
+            graphs.mkdir()
+            for name in ["python_nodes.dyn", "single_node.dyn", "no_python.dyn"]:
+                shutil.copy(f"{INPUT_DIR}/{name}", graphs.joinpath(name))
+
+            with SearchIndex(folder.joinpath("index.sqlite")) as search_index:
+                for graph_path in sorted(graphs.iterdir()):
+                    self.assertTrue(search_index.update_graph(graph_path))
+                    self.assertFalse(search_index.update_graph(graph_path))
+
+                results = search_index.search("ProtoGeometry AND CPython3")
+                self.assertEqual(len(results), 5)
+                self.assertIn("[ProtoGeometry]", results[0].snippet)
+                self.assertEqual(search_index.search('py_name:"Renamed Cpython"')[0].py_id,
+                                 "d7704617c75e4bf1a5c387b7c3f001ea")
+                single = search_index.search("single_node")
+                self.assertEqual([(r.dyn_path, r.dyn_uuid, r.py_id) for r in single], [(
+                    "graphs/single_node.dyn", "76de5c79-17c5-4c74-9f90-ad99a213d339", "1c5d99792882409e97e132b3e9f814b0")])
+                with self.assertRaises(ValueError):
+                    search_index.search("AND AND")
+
+                # Only the time changed, the graph is not parsed:
+                os.utime(graphs.joinpath("single_node.dyn"), (1, 1))
+                STATS.reset(enabled=True)
+                self.assertFalse(search_index.update_graph(graphs.joinpath("single_node.dyn")))
+                self.assertNotIn("dynamo_files_read", STATS.counters)
+                STATS.reset(enabled=False)
+
+                # Changed content is indexed again:
+                graph_path = graphs.joinpath("single_node.dyn")
+                graph_path.write_text(graph_path.read_text().replace("import sys", "import searched", 1))
+                self.assertTrue(search_index.update_graph(graph_path))
+                self.assertEqual(len(search_index.search("searched")), 1)
+
+                # Deleted graphs are removed:
+                graph_path.unlink()
+                self.assertEqual(search_index.remove_missing(
+                    [graphs], [graphs.joinpath("python_nodes.dyn"), graphs.joinpath("no_python.dyn")]), 1)
+                self.assertEqual(search_index.search("searched"), [])
+
+    def test_run(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            folder = pathlib.Path(temp_dir)
+            shutil.copy(f"{INPUT_DIR}/single_node.dyn", folder)
+            index_path = folder.joinpath("index.sqlite")
+
+            result = dyn2py.run(dyn2py.Options(source=[folder], index=index_path, index_only=True))
+            self.assertEqual(result.written, [index_path])
+            result = dyn2py.run(dyn2py.Options(source=[folder], index=index_path, index_only=True))
+            self.assertEqual(result.written, [])
+
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                result = dyn2py.run(dyn2py.Options(source=[index_path], search="ProtoGeometry"))
+            lines = [json.loads(line) for line in output.getvalue().splitlines()]
+            self.assertEqual([line["py_id"] for line in lines], ["1c5d99792882409e97e132b3e9f814b0"])
+            self.assertEqual(lines[0]["dyn_path"], "single_node.dyn")
+
+            result = dyn2py.run(dyn2py.Options(source=[index_path], search="ProtoGeometry AND"))
+            self.assertEqual(result.failed, [(index_path, "invalid_query")])
+
+    def test_extract_and_update(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            folder = pathlib.Path(temp_dir)
+            graph_path = folder.joinpath("single_node.dyn")
+            shutil.copy(f"{INPUT_DIR}/single_node.dyn", graph_path)
+            shutil.copy(f"{INPUT_DIR}/no_python.dyn", folder)
+            index_path = folder.joinpath("index.sqlite")
+
+            # Graphs are indexed from the same read as the extraction:
+            result = dyn2py.run(dyn2py.Options(source=[folder], index=index_path, stats="json"))
+            self.assertEqual(result.stats["counters"]["dynamo_files_read"], 2)
+            self.assertIn(index_path, result.written)
+            script_path = next(folder.glob("*.py"))
+            self.assertIn(script_path, result.written)
+
+            # Written graphs are indexed from memory:
+            script_path.write_text(script_path.read_text().replace("import sys", "import searched", 1))
+            dyn2py.File.open_files.clear()
+            result = dyn2py.run(dyn2py.Options(source=[script_path], index=index_path))
+            self.assertEqual(sorted(result.written), sorted([graph_path, index_path]))
+            with SearchIndex(index_path) as search_index:
+                self.assertEqual([r.py_id for r in search_index.search("searched")],
+                                 ["1c5d99792882409e97e132b3e9f814b0"])
+                # Both graphs are up to date:
+                STATS.reset(enabled=True)
+                for path in [graph_path, folder.joinpath("no_python.dyn")]:
+                    self.assertFalse(search_index.update_graph(path))
+                self.assertNotIn("dynamo_files_read", STATS.counters)
+                STATS.reset(enabled=False)
+
+            # Only the index is updated:
+            result = dyn2py.run(dyn2py.Options(source=[folder], index=index_path, index_only=True))
+            self.assertEqual(result.written, [])
+            with self.assertRaises(ValueError):
+                dyn2py.Options(source=[folder], index_only=True)
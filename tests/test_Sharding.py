@@ -0,0 +1,105 @@
+import unittest
+import dyn2py
+import json
+import pathlib
+import shutil
+import tempfile
+
+from dyn2py.manifest import Manifest, MANIFEST_FILENAME
+from dyn2py.sharding import assign_shards, select_shard
+from dyn2py.syncstate import SyncState
+from tests.support import *
+
+
+class TestSharding(unittest.TestCase):
+
+    def setUp(self):
+        dyn2py.File.open_files.clear()
+        dyn2py.PythonFile.source_dynamo_files.clear()
+        self.addCleanup(dyn2py.File.open_files.clear)
+        self.addCleanup(SyncState.states.clear)
+        self.addCleanup(Manifest.manifests.clear)
+
+    def make_graphs(self, folder: pathlib.Path) -> list[pathlib.Path]:
+        graphs = folder.joinpath("graphs")
+        graphs.mkdir()
+        graph_paths = []
+        for i in range(6):
+            graph_paths.append(graphs.joinpath(f"graph{i}.dyn"))
+            shutil.copy(f"{INPUT_DIR}/{['python_nodes.dyn', 'single_node.dyn'][i % 2]}", graph_paths[-1])
+        return graph_paths
+
+    def test_parse_shard(self):
+        self.assertEqual(dyn2py.Options.parse_shard("2/4"), (2, 4))
+        for shard in ["0/4", "5/4", "1", "a/b", "1/0"]:
+            with self.subTest(shard=shard):
+                with self.assertRaises(ValueError):
+                    dyn2py.Options(shard=shard)
+
+    def test_assign_shards(self):
+        keys = {"a": 100, "b": 60, "c": 50, "d": 10}
+        self.assertEqual(assign_shards(keys, 2, "size"), {"a": 1, "b": 2, "c": 2, "d": 1})
+        self.assertEqual(assign_shards(keys, 3, "hash"), assign_shards(dict(reversed(keys.items())), 3, "hash"))
+
+    def test_select_shard(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            graph_paths = self.make_graphs(pathlib.Path(temp_dir))
+            python_folder = pathlib.Path(temp_dir, "python")
+            python_folder.mkdir()
+            dyn2py.run(dyn2py.Options(source=graph_paths, python_folder=python_folder))
+            python_paths = sorted(python_folder.glob("*.py"))
+
+            for shard_by in ["hash", "size"]:
+                with self.subTest(shard_by=shard_by):
+                    shards = [select_shard(graph_paths + python_paths,
+                                           dyn2py.Options(shard=f"{i}/3", shard_by=shard_by))
+                              for i in range(1, 4)]
+                    # Every file is in exactly one shard:
+                    self.assertEqual(sorted(f for shard in shards for f in shard),
+                                     sorted(graph_paths + python_paths))
+                    # Python files are in the shard of their graph:
+                    for shard in shards:
+                        graph_names = {f.stem for f in shard if f.suffix == ".dyn"}
+                        self.assertTrue(all(f.name.split("_")[0] in graph_names
+                                            for f in shard if f.suffix == ".py"))
+
+    def test_run_and_merge(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            folder = pathlib.Path(temp_dir)
+            self.make_graphs(folder)
+
+            merge_sources = []
+            for i in [1, 2]:
+                shard_folder = folder.joinpath(f"shard{i}")
+                shard_folder.mkdir()
+                stats_output = folder.joinpath(f"stats{i}.json")
+                dyn2py.run(dyn2py.Options(source=[folder.joinpath("graphs")], python_folder=shard_folder,
+                                          dedup=True, shard=f"{i}/2", shard_by="size",
+                                          stats="json", stats_output=stats_output))
+                merge_sources.extend([shard_folder, stats_output])
+            shard_scripts = sorted(p.name for p in folder.glob("shard*/*.py"))
+            SyncState.record(folder.joinpath("shard1", "script.py"), "a" * 32)
+            SyncState.for_folder(folder.joinpath("shard1")).save()
+            SyncState.states.clear()
+
+            merged = folder.joinpath("merged")
+            result = dyn2py.run(dyn2py.Options(source=merge_sources, python_folder=merged, merge=True,
+                                               stats="json"))
+            self.assertEqual(result.failed, [])
+            self.assertEqual(result.stats["counters"]["dynamo_files_read"], 6)
+
+            # Shared scripts of both shards are copied once:
+            merged_scripts = sorted(p.name for p in merged.glob("*.py"))
+            self.assertEqual(merged_scripts, sorted(set(shard_scripts)))
+            manifest = json.loads(merged.joinpath(MANIFEST_FILENAME).read_text())
+            self.assertEqual(sum(len(s["nodes"]) for s in manifest["scripts"].values()), 3 * 6 + 3)
+            SyncState.states.clear()
+            self.assertEqual(SyncState.get_base(merged.joinpath("script.py")), "a" * 32)
+
+            # Merging again changes nothing:
+            result = dyn2py.run(dyn2py.Options(source=merge_sources[::2], python_folder=merged, merge=True))
+            self.assertEqual(result.written, [])
+            self.assertEqual(len(result.skipped), len(shard_scripts))
+
+        result = dyn2py.run(dyn2py.Options(source=[pathlib.Path(temp_dir)], merge=True))
+        self.assertEqual(result.failed, [(pathlib.Path(temp_dir), "invalid_merge_source")])
@@ -0,0 +1,68 @@
+import unittest
+import dyn2py
+import json
+import pathlib
+import shutil
+
+from dyn2py.stats import Stats, STATS
+from tests.support import *
+
+
+class TestStats(unittest.TestCase):
+
+    def test_disabled(self):
+        stats = Stats()
+
+        with stats.timer("phase"):
+            stats.count("counter")
+            stats.skip("reason")
+
+        self.assertFalse(stats.timings)
+        self.assertFalse(stats.counters)
+        self.assertFalse(stats.skipped)
+
+    def test_enabled(self):
+        stats = Stats(enabled=True)
+
+        for _ in range(3):
+            with stats.timer("phase"):
+                stats.count("counter", 2)
+        stats.skip("reason")
+
+        self.assertEqual(stats.calls["phase"], 3)
+        self.assertGreaterEqual(stats.timings["phase"], 0.0)
+        self.assertEqual(stats.counters["counter"], 6)
+        self.assertEqual(stats.skipped["reason"], 1)
+
+        self.assertIn("phase", stats.report("text"))
+        self.assertEqual(json.loads(stats.report("json")), stats.to_dict())
+        self.assertIn('dyn2py_skipped_files{reason="reason"} 1',
+                      stats.report("prometheus"))
+
+        with self.assertRaises(ValueError):
+            stats.report("wrong_format")
+
+        stats.reset()
+        self.assertFalse(stats.to_dict()["calls"])
+
+    def test_run(self):
+        cleanup_dirs()
+
+        for filename in ["single_node.dyn", "no_python.dyn"]:
+            shutil.copy(f"{INPUT_DIR}/{filename}", f"{OUTPUT_DIR}/{filename}")
+
+        stats_path = pathlib.Path(f"{TEMP_DIR}/stats.json")
+        opt = dyn2py.Options(source=[OUTPUT_DIR], stats="json",
+                             stats_output=stats_path)
+        dyn2py.run(opt)
+
+        stats = json.loads(stats_path.read_text())
+        self.assertEqual(stats["counters"]["files_written"], 1)
+        self.assertEqual(stats["counters"]["dynamo_files_read"], 2)
+        self.assertEqual(stats["skipped"]["no_python_nodes"], 1)
+        self.assertIn("parse_json", stats["timings"])
+
+        # The next run without stats shouldn't collect anything:
+        dyn2py.run(dyn2py.Options(source=[OUTPUT_DIR]))
+        self.assertFalse(STATS.enabled)
+        self.assertFalse(STATS.timings)
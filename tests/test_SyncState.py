@@ -0,0 +1,94 @@
+import unittest
+import dyn2py
+import os
+import pathlib
+import shutil
+import tempfile
+import time
+
+from dyn2py.syncstate import SyncState, SYNC_STATE_FILENAME
+from tests.support import *
+
+
+class TestSyncState(unittest.TestCase):
+
+    def setUp(self):
+        dyn2py.File.open_files.clear()
+        dyn2py.PythonFile.source_dynamo_files.clear()
+        SyncState.states.clear()
+        self.addCleanup(SyncState.states.clear)
+
+    def test_record(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            script_path = pathlib.Path(temp_dir, "script.py")
+            self.assertIsNone(SyncState.get_base(script_path))
+
+            SyncState.record(script_path, "a" * 32)
+            self.assertEqual(SyncState.get_base(script_path), "a" * 32)
+            state = SyncState.for_folder(pathlib.Path(temp_dir))
+            self.assertTrue(state.modified)
+            self.assertTrue(state.save())
+
+            SyncState.states.clear()
+            self.assertEqual(SyncState.get_base(script_path), "a" * 32)
+
+            # Invalid files are ignored:
+            state.filepath.write_text("not json")
+            SyncState.states.clear()
+            self.assertIsNone(SyncState.get_base(script_path))
+
+    def test_run(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            graphs = pathlib.Path(temp_dir, "graphs")
+            scripts = pathlib.Path(temp_dir, "scripts")
+            graphs.mkdir()
+            scripts.mkdir()
+            graph_path = graphs.joinpath("single_node.dyn")
+            shutil.copy(f"{INPUT_DIR}/single_node.dyn", graph_path)
+            script_path = scripts.joinpath("single_node_1c5d99792882409e97e132b3e9f814b0.py")
+            future = time.time() + 100
+
+            def run(**option_args):
+                dyn2py.File.open_files.clear()
+                return dyn2py.run(dyn2py.Options(**option_args))
+
+            # Only created if it was asked for:
+            result = run(source=[graph_path], python_folder=scripts)
+            self.assertEqual(result.written, [script_path])
+            self.assertFalse(scripts.joinpath(SYNC_STATE_FILENAME).exists())
+            script_path.unlink()
+            result = run(source=[graph_path], python_folder=scripts, sync_state=True)
+            self.assertEqual(result.written, [script_path])
+            self.assertTrue(scripts.joinpath(SYNC_STATE_FILENAME).exists())
+
+            # The script was edited, the graph has a later mtime:
+            script_path.write_text(script_path.read_text() + "\n# script edit\n")
+            os.utime(graph_path, (future, future))
+            result = run(source=[script_path])
+            self.assertEqual(result.written, [graph_path])
+            self.assertIn("# script edit", graph_path.read_text())
+
+            # The graph was edited, the script has a later mtime:
+            graph_path.write_text(graph_path.read_text().replace("import sys", "import os", 1))
+            os.utime(script_path, (future + 10, future + 10))
+            result = run(source=[script_path])
+            self.assertEqual(result.skipped, [(script_path, "newer")])
+            result = run(source=[graph_path], python_folder=scripts)
+            self.assertEqual(result.written, [script_path])
+            self.assertIn("import os", script_path.read_text())
+
+            # Both were edited:
+            graph_path.write_text(graph_path.read_text().replace("import clr", "import json", 1))
+            script_path.write_text(script_path.read_text() + "\n# second edit\n")
+            result = run(source=[graph_path], python_folder=scripts)
+            self.assertEqual(result.failed, [(script_path, "conflict")])
+            result = run(source=[script_path])
+            self.assertEqual(result.failed, [(script_path, "conflict")])
+            self.assertNotIn("# second edit", graph_path.read_text())
+
+            # Force overwrites:
+            result = run(source=[script_path], force=True)
+            self.assertEqual(result.written, [graph_path])
+            self.assertIn("# second edit", graph_path.read_text())
+            result = run(source=[script_path])
+            self.assertEqual(result.skipped, [(script_path, "unchanged")])
@@ -0,0 +1,45 @@
+import unittest
+import dyn2py
+import pathlib
+import shutil
+
+from tests.support import *
+
+
+class TestRun(unittest.TestCase):
+
+    def test_result(self):
+        cleanup_dirs()
+        dyn2py.File.open_files.clear()
+
+        for filename in ["python_nodes.dyn", "single_node.dyn", "no_python.dyn"]:
+            shutil.copy(f"{INPUT_DIR}/{filename}", f"{OUTPUT_DIR}/{filename}")
+
+        received = []
+        result = dyn2py.run(dyn2py.Options(source=[OUTPUT_DIR]),
+                            on_event=received.append)
+
+        self.assertIsInstance(result, dyn2py.RunResult)
+        self.assertEqual(len(result.written), 7)
+        self.assertIn((pathlib.Path(f"{OUTPUT_DIR}/no_python.dyn"), "no_python_nodes"),
+                      result.skipped)
+        self.assertFalse(result.failed)
+        self.assertGreater(result.elapsed, 0)
+        self.assertEqual([e.kind for e in received],
+                         [e.kind for e in result.events])
+
+        # Extracted files are newer, they should be skipped:
+        dyn2py.File.open_files.clear()
+        result = dyn2py.run(dyn2py.Options(
+            source=[f"{OUTPUT_DIR}/single_node.dyn"]))
+        self.assertFalse(result.written)
+        self.assertEqual(result.skipped[0][1], "newer")
+
+        # Backups:
+        dyn2py.File.open_files.clear()
+        result = dyn2py.run(dyn2py.Options(
+            source=[f"{OUTPUT_DIR}/single_node.dyn"], force=True, backup=True))
+        self.assertEqual(len(result.written), 1)
+        self.assertEqual(len(result.backed_up), 1)
+        self.assertTrue(result.backed_up[0][1].exists())
+        self.assertEqual(result.to_dict()["written"], [str(result.written[0])])